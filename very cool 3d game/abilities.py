@@ -1,96 +1,135 @@
+from direct.showbase.MessengerGlobal import messenger
+import heapq
 import time
 
+# Событие messenger: (система способностей, ключ способности)
+ABILITY_UNLOCKED = "ability-unlocked"
+
+
+class Ability:
+    """Описание способности, общее для всех игроков. bit - ее бит в масках AbilitySystem."""
+    __slots__ = ("key", "id", "bit", "name", "description", "type", "cooldown", "duration", "icon")
+
+    def __init__(self, key, name, description, type="passive", cooldown=0.0, duration=0.0, icon=None):
+        self.key = key
+        self.id = -1
+        self.bit = 0
+        self.name = name
+        self.description = description
+        self.type = type
+        self.cooldown = cooldown
+        self.duration = duration
+        self.icon = icon
+
+
+ABILITY_LIST = [
+    # --- БАЗОВЫЕ ДВИЖЕНИЯ ---
+    Ability("move_forward", "Move Forward", "Your legs respond. You can walk forward."),
+    Ability("move_backward", "Move Backward", "You can step back from danger."),
+    Ability("move_left", "Step Left", "Sidestep to the left."),
+    Ability("move_right", "Step Right", "Sidestep to the right."),
+    Ability("jump", "Jump", "Defy gravity briefly."),
+    # --- АТАКА ---
+    Ability("shoot", "Void Bolt", "Fire projectiles of raw energy."),
+
+    # --- АКТИВНЫЕ СПОСОБНОСТИ ---
+    Ability("blink", "Blink", "Teleport forward instantly.",
+            type="active", cooldown=10.0, icon="blink_icon"),
+    Ability("shield", "Divine Shield", "Invulnerability for 5 seconds.",
+            type="active", cooldown=20.0, duration=5.0, icon="shield_icon"),
+]
+for index, ability in enumerate(ABILITY_LIST):
+    ability.id = index
+    ability.bit = 1 << index
+
+# Ключи интернированы: ключ -> описание и ключ -> бит (неизвестный ключ -> 0)
+ABILITIES = {ability.key: ability for ability in ABILITY_LIST}
+BITS = {ability.key: ability.bit for ability in ABILITY_LIST}
+
+
 class AbilitySystem:
-    def __init__(self):
-        self.abilities = {
-            # --- БАЗОВЫЕ ДВИЖЕНИЯ ---
-            "move_forward": {
-                "name": "Move Forward",
-                "description": "Your legs respond. You can walk forward.",
-                "type": "passive",
-                "unlocked": False
-            },
-            "move_backward": {
-                "name": "Move Backward",
-                "description": "You can step back from danger.",
-                "type": "passive",
-                "unlocked": False
-            },
-            "move_left": {
-                "name": "Step Left",
-                "description": "Sidestep to the left.",
-                "type": "passive",
-                "unlocked": False
-            },
-            "move_right": {
-                "name": "Step Right",
-                "description": "Sidestep to the right.",
-                "type": "passive",
-                "unlocked": False
-            },
-            "jump": {
-                "name": "Jump",
-                "description": "Defy gravity briefly.",
-                "type": "passive",
-                "unlocked": False
-            },
-            # --- НОВОЕ: АТАКА ---
-            "shoot": {
-                "name": "Void Bolt",
-                "description": "Fire projectiles of raw energy.",
-                "type": "passive", 
-                "unlocked": False
-            },
-            
-            # --- АКТИВНЫЕ СПОСОБНОСТИ ---
-            "blink": {
-                "name": "Blink",
-                "description": "Teleport forward instantly.",
-                "type": "active",
-                "cooldown": 10.0,
-                "duration": 0.0,
-                "last_used": 0.0,
-                "active": False,
-                "unlocked": False,
-                "icon": "blink_icon"
-            },
-            "shield": {
-                "name": "Divine Shield",
-                "description": "Invulnerability for 5 seconds.",
-                "type": "active",
-                "cooldown": 20.0,
-                "duration": 5.0,
-                "last_used": 0.0,
-                "active": False,
-                "unlocked": False,
-                "icon": "shield_icon"
-            }
-        }
-    
+    """
+    Состояние способностей одного игрока: открытые и действующие - битовые
+    маски, перезарядки и длительности - по часам clock() (время симуляции
+    планировщика, поэтому пауза и ускоренная симуляция учитываются сами).
+    Действующие эффекты снимает update() по куче таймеров.
+    """
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.abilities = ABILITIES
+        self.unlocked_mask = 0
+        self.active_mask = 0
+        self.ready_at = [0.0] * len(ABILITY_LIST)      # когда закончится перезарядка
+        self.active_until = [0.0] * len(ABILITY_LIST)  # когда закончится эффект
+        self.timers = []    # куча (время окончания эффекта, id)
+        self.unlocked = []  # ключи открытых способностей в порядке открытия
+
+    def unlock(self, name):
+        bit = BITS[name]
+        if self.unlocked_mask & bit: return False
+        self.unlocked_mask |= bit
+        self.unlocked.append(name)
+        messenger.send(ABILITY_UNLOCKED, [self, name])
+        return True
+
+    def locked(self):
+        return [a.key for a in ABILITY_LIST if not self.unlocked_mask & a.bit]
+
     def is_unlocked(self, name):
-        return self.abilities.get(name, {}).get("unlocked", False)
+        return (self.unlocked_mask & BITS.get(name, 0)) != 0
 
     def can_use(self, name):
-        now = time.time()
-        ability = self.abilities.get(name)
+        ability = ABILITIES.get(name)
         if not ability: return False
-        if not ability.get("unlocked", False): return False
-        if ability.get("type") == "passive": return True
-        return (now - ability["last_used"]) >= ability["cooldown"]
+        if not self.unlocked_mask & ability.bit: return False
+        if ability.type == "passive": return True
+        return self.clock() >= self.ready_at[ability.id]
 
     def use(self, name):
-        if self.can_use(name):
-            self.abilities[name]["last_used"] = time.time()
-            if self.abilities[name]["duration"] > 0:
-                self.abilities[name]["active"] = True
+        if not self.can_use(name):
+            return False
+        ability = ABILITIES[name]
+        if ability.type == "passive":
             return True
-        return False
+        now = self.clock()
+        self.ready_at[ability.id] = now + ability.cooldown
+        if ability.duration > 0:
+            until = now + ability.duration
+            self.active_until[ability.id] = until
+            self.active_mask |= ability.bit
+            heapq.heappush(self.timers, (until, ability.id))
+        return True
 
     def is_active(self, name):
-        ability = self.abilities.get(name)
-        if not ability or not ability.get("active", False):
-            return False
-        if time.time() - ability["last_used"] > ability["duration"]:
-            ability["active"] = False
-            return False
-        return True
\ No newline at end of file
+        return (self.active_mask & BITS.get(name, 0)) != 0
+
+    def update(self, dt):
+        """Система планировщика: снимает эффекты, у которых вышло время."""
+        timers = self.timers
+        if not timers: return
+        now = self.clock()
+        while timers and timers[0][0] <= now:
+            until, ability_id = heapq.heappop(timers)
+            # Эффект могли продлить повторным use - тогда в куче есть запись позже
+            if self.active_until[ability_id] <= now:
+                self.active_mask &= ~(1 << ability_id)
+
+    def reset(self):
+        """Все закрыто, ничего не действует (новая игра)."""
+        self.restore((), 0, [0.0] * len(ABILITY_LIST), [0.0] * len(ABILITY_LIST))
+
+    def restore(self, unlocked, active_mask, ready_at, active_until):
+        """
+        Состояние из сохранения (savestate.py): ключи открытых в порядке
+        открытия, маска действующих и времена по часам clock (их надо
+        восстановить раньше). Об открытых снова сообщается через messenger.
+        """
+        self.unlocked_mask = 0
+        self.unlocked = []
+        for key in unlocked:
+            self.unlock(key)
+        self.active_mask = active_mask
+        self.ready_at = list(ready_at)
+        self.active_until = list(active_until)
+        self.timers = [(self.active_until[a.id], a.id) for a in ABILITY_LIST if active_mask & a.bit]
+        heapq.heapify(self.timers)
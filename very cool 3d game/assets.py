@@ -0,0 +1,163 @@
+from panda3d.core import NodePath, Filename, TexturePool
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Все ассеты игры. Модели models/* встроены в Panda3D и ищутся по model-path,
+# свои файлы лежат рядом с кодом и не зависят от текущей папки.
+MODELS = {
+    "smiley": "models/smiley",
+    "box": "models/box",
+}
+TEXTURES = {
+    "enemy": "textures/enemy.png",
+    "floor": "textures/floor.png",
+    "skybox": "textures/skybox.jpg",
+}
+
+
+def resolve(path):
+    """Путь относительно папки игры, если файл там есть; иначе как есть (model-path)."""
+    local = os.path.join(BASE_DIR, path)
+    if os.path.exists(local):
+        return Filename.fromOsSpecific(local)
+    return Filename(path)
+
+
+class AssetRegistry:
+    """
+    Загружает каждую модель и текстуру ровно один раз и раздает общие
+    ссылки. Пока висит главное меню, preload() грузит все заранее:
+    модели - через асинхронный API загрузчика, текстуры - в фоновом потоке
+    (TexturePool.loadTexture отпускает GIL). Если ассет понадобился раньше,
+    он грузится синхронно (это видно в timings как "sync"); спавны во время
+    игры вместо этого ждут модель через request() (см. pool.ObjectPool).
+    """
+    def __init__(self, game):
+        self.game = game
+        self.models = {}     # имя -> NodePath-шаблон
+        self.textures = {}   # имя -> Texture или None, если файла нет / битый
+        self.pending = {}    # имя модели -> время запроса
+        self.waiting = {}    # имя модели -> вызвать, когда загрузится (request)
+        self.pending_textures = {}  # имя -> (время запроса, Future)
+        self.timings = {}    # имя -> (секунды, "async" | "sync")
+        self.failed = {}     # имя -> текст ошибки
+
+    # --- Предзагрузка ---
+    def preload(self):
+        for name, path in MODELS.items():
+            if name not in self.models:
+                self.request_model(name)
+        executor = None
+        for name, path in TEXTURES.items():
+            if name in self.textures or name in self.pending_textures:
+                continue
+            executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="AssetLoader")
+            self.pending_textures[name] = (time.perf_counter(), executor.submit(self.read_texture, name))
+        if executor:
+            executor.shutdown(wait=False)
+            self.game.taskMgr.add(self.collect_textures, "AssetPreload")
+
+    def request_model(self, name):
+        """Асинхронная загрузка модели name, если она еще не запрошена."""
+        if name in self.pending:
+            return
+        self.pending[name] = time.perf_counter()
+        self.game.loader.loadModel(resolve(MODELS[name]), callback=self.on_model_loaded, extraArgs=[name])
+
+    def on_model_loaded(self, model, name):
+        started = self.pending.pop(name, None)
+        if name in self.models or started is None:
+            return
+        self.models[name] = model
+        self.timings[name] = (time.perf_counter() - started, "async")
+        self.notify(name)
+
+    def request(self, name, callback):
+        """
+        callback() вызывается, когда шаблон модели name загружен: сразу,
+        если он уже есть, иначе из кадра, где закончилась асинхронная
+        загрузка. Возвращает True, если модель уже была.
+        """
+        if name in self.models:
+            callback()
+            return True
+        self.waiting.setdefault(name, []).append(callback)
+        self.request_model(name)
+        return False
+
+    def notify(self, name):
+        for callback in self.waiting.pop(name, ()):
+            callback()
+
+    def finish(self):
+        """Догружает все ассеты синхронно (прогоны, не зависящие от скорости диска)."""
+        for name in MODELS:
+            if name not in self.models:
+                self.load_model(name)
+        for name in TEXTURES:
+            self.texture(name)
+
+    def collect_textures(self, task):
+        for name, (started, future) in list(self.pending_textures.items()):
+            if future.done():
+                del self.pending_textures[name]
+                self.store_texture(name, future.result(), started, "async")
+        return task.cont if self.pending_textures else task.done
+
+    @property
+    def ready(self):
+        return not self.pending and not self.pending_textures
+
+    def has_model(self, name):
+        return name in self.models
+
+    # --- Выдача ---
+    def model(self, name):
+        """Новый экземпляр модели (копия шаблона, без обращения к диску)."""
+        template = self.models.get(name)
+        if template is None:
+            template = self.load_model(name)
+        return NodePath(template.node().copySubgraph())
+
+    def texture(self, name):
+        """Общая текстура или None, если ее не удалось загрузить."""
+        if name not in self.textures:
+            started, future = self.pending_textures.pop(name, (time.perf_counter(), None))
+            result = future.result() if future else self.read_texture(name)
+            self.store_texture(name, result, started, "sync")
+        return self.textures[name]
+
+    def load_model(self, name):
+        # Асинхронный запрос мог не успеть - грузим сами, ответ загрузчика проигнорируем
+        self.pending.pop(name, None)
+        started = time.perf_counter()
+        model = self.game.loader.loadModel(resolve(MODELS[name]))
+        self.models[name] = model
+        self.timings[name] = (time.perf_counter() - started, "sync")
+        self.notify(name)
+        return model
+
+    def read_texture(self, name):
+        """Чтение файла текстуры; может идти в рабочем потоке. Возвращает (Texture, ошибка)."""
+        path = resolve(TEXTURES[name])
+        if not os.path.exists(path.toOsSpecific()):
+            return None, f"not found: {path}"
+        tex = TexturePool.loadTexture(path)
+        if tex is None:
+            return None, f"could not read: {path}"
+        return tex, None
+
+    def store_texture(self, name, result, started, mode):
+        tex, error = result
+        if error:
+            self.failed[name] = error
+        self.textures[name] = tex
+        self.timings[name] = (time.perf_counter() - started, mode)
+
+    def report(self):
+        lines = [f"{name:>8}: {secs * 1000:7.2f} ms ({mode})" for name, (secs, mode) in sorted(self.timings.items())]
+        lines += [f"{name:>8}: FAILED {err}" for name, err in sorted(self.failed.items())]
+        return "\n".join(lines)
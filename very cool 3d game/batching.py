@@ -0,0 +1,121 @@
+from panda3d.core import RigidBodyCombiner, PandaNode
+import math
+
+
+class BatchGroup:
+    """
+    Узел-контейнер для подвижных однотипных объектов. В режиме батчинга
+    это RigidBodyCombiner: все дети рисуются несколькими Geom, но каждый
+    остается отдельным NodePath, который можно двигать и удалять.
+    Состав группы пересобирается в flush(), не чаще раза в кадр, и только
+    после attach: hide() не убирает ребенка из комбинера, а сжимает его
+    в точку, так что спавн и смерть объектов из пула обходятся без сборки.
+    """
+    def __init__(self, parent, name, batched=True):
+        self.batched = batched
+        node = RigidBodyCombiner(name) if batched else PandaNode(name)
+        self.root = parent.attachNewNode(node)
+        self.dirty = False
+
+    def attach(self, np_):
+        np_.reparentTo(self.root)
+        self.dirty = True
+
+    def hide(self, np_):
+        if not self.batched:
+            np_.stash()
+        elif not np_.hasPythonTag("batch_scale"):
+            np_.setPythonTag("batch_scale", np_.getScale())
+            np_.setScale(0)
+
+    def show(self, np_):
+        if not self.batched:
+            np_.unstash()
+        elif np_.hasPythonTag("batch_scale"):
+            np_.setScale(np_.getPythonTag("batch_scale"))
+            np_.clearPythonTag("batch_scale")
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def flush(self):
+        if self.dirty:
+            if self.batched:
+                self.root.node().collect()
+            self.dirty = False
+
+    def remove(self):
+        self.root.removeNode()
+
+
+class StaticRegion:
+    """
+    Регион статичных объектов. Сами объекты (с коллизиями) остаются в
+    сцене, но скрыты; рисуется их копия, слитая flattenStrong в пару Geom.
+    """
+    def __init__(self, parent, name, batched=True):
+        self.batched = batched
+        self.root = parent.attachNewNode(name)
+        self.flat = None
+        self.dirty = False
+
+    def attach(self, np_):
+        np_.reparentTo(self.root)
+        if self.batched:
+            np_.hide()
+        self.dirty = True
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        if not self.batched:
+            return
+        if self.flat:
+            self.flat.removeNode()
+        self.flat = self.root.attachNewNode("flattened")
+        # Копируем только GeomNode с их трансформом и состоянием относительно
+        # региона: коллизии остаются у оригиналов, а ModelRoot не мешает слиянию
+        for geom_np in self.root.findAllMatches("**/+GeomNode"):
+            copy = geom_np.copyTo(self.flat)
+            copy.setTransform(geom_np.getTransform(self.root))
+            copy.setState(geom_np.getState(self.root))
+            copy.show()
+        self.flat.flattenStrong()
+
+
+class RegionBatcher:
+    """
+    Статичные объекты, разбитые на квадратные регионы. Удаление одного
+    объекта пересобирает только его регион.
+    """
+    def __init__(self, parent, name, region_size=64.0, batched=True):
+        self.root = parent.attachNewNode(name)
+        self.name = name
+        self.region_size = region_size
+        self.batched = batched
+        self.regions = {}
+
+    def region_for(self, x, y):
+        key = (math.floor(x / self.region_size), math.floor(y / self.region_size))
+        region = self.regions.get(key)
+        if region is None:
+            region = StaticRegion(self.root, f"{self.name}_{key[0]}_{key[1]}", self.batched)
+            self.regions[key] = region
+        return region
+
+    def attach(self, np_):
+        region = self.region_for(np_.getX(), np_.getY())
+        region.attach(np_)
+        return region
+
+    def flush(self):
+        for region in self.regions.values():
+            region.flush()
+
+    def remove(self):
+        self.root.removeNode()
+        self.regions = {}
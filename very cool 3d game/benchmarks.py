@@ -0,0 +1,1107 @@
+"""
+Микробенчмарки подсистем игры. Окно не открывается.
+
+Запуск: python benchmarks.py [имя ...]   (без аргументов - все)
+Бенчмарки со ShowBase идут каждый в своем процессе (showbase_benchmark).
+"""
+from panda3d.core import GeomVertexFormat, GeomVertexData, Geom, GeomTriangles, GeomNode, GeomVertexWriter
+import numpy as np
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from panda3d.core import ModelPool, NodePath, PandaNode, Point3, Vec3, PStatClient, RigidBodyCombiner, loadPrcFileData
+from panda3d.core import BitMask32, CollisionTraverser, CollisionHandlerQueue, CollisionNode, CollisionPolygon, CollisionRay
+from batching import BatchGroup, RegionBatcher
+from assets import TEXTURES, resolve
+from spatial import SpatialHash
+from terrain import HeightGrid, TerrainCache, analytic_height, terrain_heights, build_grid_node, build_collision_tree, load_or_build_terrain
+
+BENCHMARKS = {}
+SHOWBASE_BENCHMARKS = {}
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__.replace("bench_", "")] = fn
+    return fn
+
+
+def showbase_benchmark(fn):
+    """
+    Бенчмарк со своим ShowBase. ShowBase в процессе может быть только один,
+    поэтому в BENCHMARKS такой бенчмарк попадает запуском в свежем процессе.
+    """
+    name = fn.__name__.replace("bench_", "")
+    SHOWBASE_BENCHMARKS[name] = fn
+    BENCHMARKS[name] = lambda *args, **kwargs: run_in_process(name, args, kwargs)
+    return fn
+
+
+def showbase_part(fn):
+    """Часть бенчмарка (один режим, один размер) для run_in_process: свой ShowBase, свежий процесс."""
+    SHOWBASE_BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+def run_in_process(name, args, kwargs):
+    import multiprocessing
+    # Process, а не Pool: bench_enemy_worker сам запускает процесс worker
+    sys.stdout.flush()
+    process = multiprocessing.get_context("spawn").Process(target=showbase_run, args=(name, args, kwargs))
+    process.start()
+    process.join()
+    if process.exitcode:
+        raise RuntimeError(f"benchmark {name} failed with exit code {process.exitcode}")
+
+
+def showbase_run(name, args, kwargs):
+    SHOWBASE_BENCHMARKS[name](*args, **kwargs)
+
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+# --- Эталонная (старая) сборка террейна по одной вершине ---
+def legacy_terrain_node(size, scale):
+    get_height = analytic_height
+    vdata = GeomVertexData('terrain', GeomVertexFormat.getV3n3t2(), Geom.UHStatic)
+    vertex = GeomVertexWriter(vdata, 'vertex')
+    normal = GeomVertexWriter(vdata, 'normal')
+    texcoord = GeomVertexWriter(vdata, 'texcoord')
+
+    offset = (size * scale) / 2
+    for y in range(size):
+        for x in range(size):
+            px = (x * scale) - offset
+            py = (y * scale) - offset
+            vertex.addData3(px, py, get_height(px, py))
+            normal.addData3(0, 0, 1)
+            texcoord.addData2(x / 10.0, y / 10.0)
+
+    prim = GeomTriangles(Geom.UHStatic)
+    for y in range(size - 1):
+        for x in range(size - 1):
+            v1 = y * size + x
+            v2 = y * size + (x + 1)
+            v3 = (y + 1) * size + (x + 1)
+            v4 = (y + 1) * size + x
+            prim.addVertices(v1, v2, v3)
+            prim.addVertices(v1, v3, v4)
+
+    geom = Geom(vdata)
+    geom.addPrimitive(prim)
+    node = GeomNode('TerrainMesh')
+    node.addGeom(geom)
+    return node
+
+
+def numpy_terrain_node(size, scale):
+    idx = np.arange(size)
+    coords = idx * scale - (size * scale) / 2
+    return build_grid_node('TerrainMesh', coords, coords, idx / 10.0, idx / 10.0)[0]
+
+
+def geom_bytes(node):
+    geom = node.getGeom(0)
+    vertices = bytes(memoryview(geom.getVertexData().getArray(0)))
+    prim = geom.getPrimitive(0)
+    indices = np.asarray(memoryview(prim.getVertices()), dtype=np.uint32) if prim.isIndexed() \
+        else np.arange(prim.getNumVertices(), dtype=np.uint32)
+    return vertices, indices
+
+
+@benchmark
+def bench_terrain_build(sizes=(256, 512, 1024), scale=2.0):
+    print(f"{'size':>6} {'legacy, s':>10} {'numpy, s':>10} {'speedup':>8}  same mesh")
+    for size in sizes:
+        legacy_t, legacy = best_of(lambda: legacy_terrain_node(size, scale), repeat=1)
+        fast_t, fast = best_of(lambda: numpy_terrain_node(size, scale))
+        same = geom_bytes(legacy)[0] == geom_bytes(fast)[0] and \
+            np.array_equal(geom_bytes(legacy)[1], geom_bytes(fast)[1])
+        print(f"{size:>6} {legacy_t:>10.3f} {fast_t:>10.3f} {legacy_t / fast_t:>7.1f}x  {same}")
+
+
+@benchmark
+def bench_terrain_height(size=256, scale=2.0, n=100000, rounds=10):
+    idx = np.arange(size)
+    coords = idx * scale - (size * scale) / 2
+    heights = build_grid_node('TerrainMesh', coords, coords, idx / 10.0, idx / 10.0)[1]
+    grid = HeightGrid(heights.astype(np.float32), (coords[0], coords[0]), scale)
+
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(-250, 250, n)
+    ys = rng.uniform(-250, 250, n)
+    pts = list(zip(xs.tolist(), ys.tolist()))
+
+    def per_call(fn):
+        return lambda: [fn(x, y) for x, y in pts]
+
+    # Раунды чередуются, чтобы шум машины одинаково ложился на оба варианта
+    analytic_t = grid_t = math.inf
+    for _ in range(rounds):
+        analytic_t = min(analytic_t, best_of(per_call(analytic_height), repeat=1)[0])
+        grid_t = min(grid_t, best_of(per_call(grid.get_height), repeat=1)[0])
+    grid_vals = per_call(grid.get_height)()
+    batch_t, batch_vals = best_of(lambda: grid.get_heights(xs, ys))
+
+    # Высоты в узлах сетки должны совпадать с вершинами меша
+    gx, gy = np.meshgrid(coords[::7], coords[::5])
+    node_err = np.abs(grid.get_heights(gx, gy) - heights[::5, ::7].astype(np.float32)).max()
+
+    print(f"{n} lookups")
+    print(f"  analytic get_height : {analytic_t / n * 1e9:8.1f} ns/call")
+    print(f"  grid get_height     : {grid_t / n * 1e9:8.1f} ns/call ({grid_t / analytic_t:.2f}x analytic)")
+    print(f"  grid get_heights    : {batch_t / n * 1e9:8.1f} ns/point")
+    print(f"  batch == scalar     : {np.allclose(batch_vals, grid_vals)}")
+    print(f"  max error at vertices: {node_err:.2e}")
+
+
+
+@benchmark
+def bench_terrain_cache(sizes=(256, 512, 1024), scale=2.0):
+    cache_dir = tempfile.mkdtemp(prefix="terrain_cache_")
+    cache = TerrainCache(cache_dir)
+    try:
+        print(f"{'size':>6} {'no cache, s':>12} {'cold, s':>8} {'warm, s':>8}")
+        for size in sizes:
+            nocache_t, _ = best_of(lambda: load_or_build_terrain(size, scale))
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            cold_t, _ = best_of(lambda: load_or_build_terrain(size, scale, cache), repeat=1)
+
+            def warm():
+                # Сбрасываем RAM-кэш загрузчика, чтобы честно читать файл
+                ModelPool.releaseAllModels()
+                return load_or_build_terrain(size, scale, cache)
+            warm_t, (node, heights, collision) = best_of(warm)
+            assert node.getTag("cache_key"), "warm run did not hit the cache"
+            print(f"{size:>6} {nocache_t:>12.3f} {cold_t:>8.3f} {warm_t:>8.3f}  warm/no cache {warm_t / nocache_t:.2f}x")
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+# --- Эталонное (старое) дерево коллизий: CollisionPolygon на каждый треугольник ---
+def legacy_collision_tree(name, xs, ys, heights, leaf_cells=8):
+    cols, rows = len(xs), len(ys)
+    pts = np.empty((rows, cols, 3))
+    pts[..., 0] = np.asarray(xs, dtype=np.float32)[None, :]
+    pts[..., 1] = np.asarray(ys, dtype=np.float32)[:, None]
+    pts[..., 2] = heights
+    pts = [[Point3(*p) for p in row] for row in pts.tolist()]
+
+    def build(x0, y0, x1, y1):
+        if x1 - x0 <= leaf_cells and y1 - y0 <= leaf_cells:
+            node = CollisionNode(f"{name}_{x0}_{y0}")
+            for y in range(y0, y1):
+                row, above = pts[y], pts[y + 1]
+                for x in range(x0, x1):
+                    node.addSolid(CollisionPolygon(row[x], row[x + 1], above[x + 1]))
+                    node.addSolid(CollisionPolygon(row[x], above[x + 1], above[x]))
+            node.setIntoCollideMask(BitMask32.bit(2))
+            node.setFromCollideMask(BitMask32.allOff())
+            return node
+
+        node = PandaNode(f"{name}_{x0}_{y0}_{x1}_{y1}")
+        xm = (x0 + x1) // 2 if x1 - x0 > leaf_cells else x1
+        ym = (y0 + y1) // 2 if y1 - y0 > leaf_cells else y1
+        for cx0, cx1 in ((x0, xm), (xm, x1)):
+            for cy0, cy1 in ((y0, ym), (ym, y1)):
+                if cx1 > cx0 and cy1 > cy0:
+                    node.addChild(build(cx0, cy0, cx1, cy1))
+        return node
+
+    return build(0, 0, cols - 1, rows - 1)
+
+
+def legacy_build_chunk(key, lod, cells, scale, skirt):
+    """build_chunk со старым деревом коллизий."""
+    cx, cy = key
+    idx = np.arange(0, cells + 1, 1 << lod)
+    xs = cx * cells * scale + idx * scale
+    ys = cy * cells * scale + idx * scale
+    node, heights = build_grid_node(f'TerrainChunk_{cx}_{cy}_{lod}', xs, ys,
+                                    xs / (scale * 10.0), ys / (scale * 10.0), skirt=skirt)
+    collision = legacy_collision_tree(f'TerrainChunkCollision_{cx}_{cy}', xs, ys, heights)
+    return key, lod, node, heights, collision
+
+
+@benchmark
+def bench_terrain_collision(size=256, scale=2.0, rays=200):
+    idx = np.arange(size)
+    coords = idx * scale - (size * scale) / 2
+    mesh, heights = build_grid_node('TerrainMesh', coords, coords, idx / 10.0, idx / 10.0)
+    legacy_t, legacy = best_of(lambda: legacy_collision_tree('TerrainCollision', coords, coords, heights), repeat=1)
+    build_t, tree = best_of(lambda: build_collision_tree('TerrainCollision', mesh, size, size))
+
+    rng = np.random.default_rng(2)
+    pts = list(zip(rng.uniform(-250, 250, rays).tolist(), rng.uniform(-250, 250, rays).tolist()))
+
+    def traverse_all(ground):
+        # Как луч гравитации игрока: из точки над землей вниз, маска Bit 2
+        scene = NodePath("scene")
+        scene.attachNewNode(ground)
+        ray_np = scene.attachNewNode(CollisionNode("playerRay"))
+        ray_np.node().addSolid(CollisionRay(0, 0, 0.5, 0, 0, -1))
+        ray_np.node().setFromCollideMask(BitMask32.bit(2))
+        ray_np.node().setIntoCollideMask(BitMask32.allOff())
+        trav = CollisionTraverser()
+        queue = CollisionHandlerQueue()
+        trav.addCollider(ray_np, queue)
+
+        def run():
+            zs = []
+            for x, y in pts:
+                ray_np.setPos(x, y, 20)
+                trav.traverse(scene)
+                queue.sortEntries()
+                zs.append(queue.getEntry(0).getSurfacePoint(scene).z if queue.getNumEntries() else None)
+            return zs
+        return run
+
+    mesh.setIntoCollideMask(BitMask32.bit(2))
+    mesh_t, mesh_z = best_of(traverse_all(mesh), repeat=1)
+    legacy_ray_t, legacy_z = best_of(traverse_all(legacy))
+    tree_t, tree_z = best_of(traverse_all(tree))
+    same = all(a is not None and b is not None and abs(a - b) < 1e-3 for a, b in zip(legacy_z, tree_z))
+
+    print(f"{size}x{size} grid, {2 * (size - 1) ** 2} triangles, {rays} ray traversals")
+    print(f"  build, CollisionPolygon tree : {legacy_t:8.3f} s")
+    print(f"  build, GeomNode tile tree    : {build_t:8.3f} s ({legacy_t / build_t:.0f}x)")
+    print(f"  ray vs whole mesh            : {mesh_t / rays * 1e6:8.1f} us/traverse")
+    print(f"  ray vs CollisionPolygon tree : {legacy_ray_t / rays * 1e6:8.1f} us/traverse")
+    print(f"  ray vs GeomNode tile tree    : {tree_t / rays * 1e6:8.1f} us/traverse")
+    print(f"  same ground z: {same}")
+
+
+@benchmark
+def bench_terrain_streaming(sizes=(256, 512), chunks=24, chunk_cells=32, scale=2.0, frame=0.002):
+    from concurrent.futures import ThreadPoolExecutor
+    from terrain import build_chunk
+
+    def legacy_startup(size):
+        idx = np.arange(size)
+        coords = idx * scale - (size * scale) / 2
+        node, heights = build_grid_node('TerrainMesh', coords, coords, idx / 10.0, idx / 10.0)
+        return legacy_collision_tree('TerrainCollision', coords, coords, heights)
+
+    print(f"{'size':>6} {'startup old, s':>15} {'startup new, s':>15}")
+    for size in sizes:
+        old_t, _ = best_of(lambda: legacy_startup(size), repeat=1)
+        new_t, _ = best_of(lambda: load_or_build_terrain(size, scale))
+        print(f"{size:>6} {old_t:>15.3f} {new_t:>15.3f}")
+
+    # Стриминг: чанки строятся в фоновом потоке, как в ChunkedTerrain, а
+    # главный поток крутит "кадры" по frame секунд. Пока рабочий поток
+    # держит GIL, кадр затягивается.
+    keys = [(i % 6 - 3, i // 6 - 2) for i in range(chunks)]
+    print(f"{chunks} chunks of {chunk_cells}x{chunk_cells} cells, {frame * 1000:.0f} ms frames on the main thread")
+    print(f"{'builder':>16} {'build, s':>9} {'p50, ms':>8} {'p99, ms':>8} {'max, ms':>8} {'slow frames':>12}")
+    for label, builder in (("CollisionPolygon", legacy_build_chunk), ("GeomNode tiles", build_chunk)):
+        executor = ThreadPoolExecutor(max_workers=1)
+        t0 = time.perf_counter()
+        futures = [executor.submit(builder, key, 0, chunk_cells, scale, 4.0 * scale) for key in keys]
+        frames = []
+        while not all(f.done() for f in futures):
+            start = time.perf_counter()
+            while time.perf_counter() - start < frame:
+                pass
+            frames.append(time.perf_counter() - start)
+        build_t = time.perf_counter() - t0
+        executor.shutdown()
+        p50, p99 = np.percentile(frames, (50, 99)) * 1000
+        slow = sum(f > 1.5 * frame for f in frames)
+        print(f"{label:>16} {build_t:>9.3f} {p50:>8.2f} {p99:>8.2f} {max(frames) * 1000:>8.2f} {slow:>5}/{len(frames)}")
+
+
+@showbase_benchmark
+def bench_projectile_hits(counts=((100, 100), (300, 300), (500, 1000)), frames=20):
+    from enemies import EnemyManager
+    base = make_enemy_base()
+    rng = np.random.default_rng(1)
+    print(f"{'proj':>6} {'enemies':>8} {'brute, ms':>10} {'arrays, ms':>11} {'speedup':>8}  same hits")
+    for n_proj, n_enemies in counts:
+        base.pool_sizes = {"enemy": (0, n_enemies)}
+        manager = EnemyManager(base)
+        manager.max_enemies = 0
+        for x, y in rng.uniform(-120, 120, (n_enemies, 2)).tolist():
+            manager.spawn_at(x, y)
+        enemy_xyz = manager.table.pos[:manager.table.count].copy()
+        # Часть снарядов летит рядом с врагами, чтобы были попадания
+        proj_xyz = rng.uniform((-120, -120, -5), (120, 120, 5), (n_proj, 3))
+        near = rng.choice(n_enemies, n_proj // 4)
+        proj_xyz[:len(near)] = enemy_xyz[near] + rng.uniform(-1, 1, (len(near), 3))
+
+        enemies = [NodePath(f"enemy{i}") for i in range(n_enemies)]
+        for np_, (x, y, z) in zip(enemies, enemy_xyz):
+            np_.setPos(x, y, z)
+        projs = [NodePath(f"proj{i}") for i in range(n_proj)]
+        for np_, (x, y, z) in zip(projs, proj_xyz):
+            np_.setPos(x, y, z)
+
+        # Старый вариант: каждый снаряд перебирает всех врагов через NodePath
+        def brute():
+            alive = list(enemies)
+            hits = []
+            for i, proj in enumerate(projs):
+                for enemy in alive:
+                    if (enemy.getPos() - proj.getPos()).length() < 1.5:
+                        alive.remove(enemy)
+                        hits.append(i)
+                        break
+            return hits
+
+        # Как в игре (Game.update): все снаряды разом по таблице врагов
+        brute_t, brute_hits = best_of(lambda: [brute() for _ in range(frames)], repeat=1)
+        arrays_t, array_hits = best_of(lambda: [manager.first_hits(proj_xyz, 1.5) for _ in range(frames)])
+        same = brute_hits[0] == [i for i, _ in array_hits[0]]
+        print(f"{n_proj:>6} {n_enemies:>8} {brute_t / frames * 1e3:>10.2f} {arrays_t / frames * 1e3:>11.3f} "
+              f"{brute_t / arrays_t:>7.0f}x  {same} ({len(array_hits[0])})")
+        manager.cleanup()
+
+
+@benchmark
+def bench_flow_field(counts=(100, 1000, 5000), ticks=20):
+    from navigation import FlowField
+    field = FlowField(terrain_heights)
+    rebuild_t, _ = best_of(lambda: [field.rebuild((i, 0)) for i in range(20)])
+    field.rebuild((0, 0))
+    print(f"rebuild ({field.size}x{field.size} cells): {rebuild_t / 20 * 1e3:.2f} ms, once per player cell change")
+
+    rng = np.random.default_rng(1)
+    player = NodePath("player")
+    print(f"{'enemies':>8} {'straight, ms':>13} {'flow, ms':>9}   per tick")
+    for n in counts:
+        xy = rng.uniform(-40, 40, (n, 2))
+        enemies = [NodePath(f"enemy{i}") for i in range(n)]
+        for np_, (x, y) in zip(enemies, xy):
+            np_.setPos(x, y, 0)
+
+        # Старый вариант: направление прямо на игрока и headsUp
+        def straight():
+            player_pos = player.getPos()
+            for enemy in enemies:
+                direction = player_pos - enemy.getPos()
+                direction.setZ(0)
+                direction.normalize()
+                enemy.headsUp(player_pos)
+                enemy.setP(0); enemy.setR(0)
+
+        # Как в EnemySimulation.chase: направления всех врагов одним запросом
+        def flow():
+            return field.sample_many(xy[:, 0], xy[:, 1])
+
+        straight_t, _ = best_of(lambda: [straight() for _ in range(ticks)])
+        flow_t, _ = best_of(lambda: [flow() for _ in range(ticks)])
+        print(f"{n:>8} {straight_t / ticks * 1e3:>13.2f} {flow_t / ticks * 1e3:>9.2f}")
+
+
+def make_offscreen_base():
+    """ShowBase без окна: offscreen-буфер с программным рендером."""
+    loadPrcFileData("", "window-type offscreen\n"
+                        "load-display p3tinydisplay\n"
+                        "audio-library-name null\n"
+                        "win-size 800 600\n"
+                        "notify-level error\n")
+    from direct.showbase.ShowBase import ShowBase
+    return ShowBase()
+
+
+class PStatsCapture:
+    """
+    Запускает консольный PStats-сервер (text-stats), подключает к нему
+    клиент и после отключения отдает покадровые значения верхнего уровня
+    (Cull, Draw, Geoms, ...) для потока Main.
+    """
+    FRAME_RE = re.compile(r"^Thread Main frame (\d+)")
+    VALUE_RE = re.compile(r"^  (\S[^=]*?) = ([\d.]+)")
+
+    def __init__(self, port=5185):
+        self.port = port
+        self.proc = None
+        self.out_path = None
+
+    def __enter__(self):
+        fd, self.out_path = tempfile.mkstemp(suffix=".txt", prefix="pstats_")
+        os.close(fd)
+        # Запускаем сам бинарник из panda3d_tools (у обертки text-stats свой
+        # дочерний процесс, который не получил бы сигнал завершения)
+        try:
+            import panda3d, panda3d_tools
+            exe = os.path.join(os.path.dirname(panda3d_tools.__file__), "text-stats")
+            env = dict(os.environ, LD_LIBRARY_PATH=os.path.dirname(panda3d.__file__))
+            self.proc = subprocess.Popen([exe, "-p", str(self.port), "-o", self.out_path], env=env,
+                                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL)
+        except (ImportError, OSError):
+            return self
+        loadPrcFileData("", f"pstats-port {self.port}")
+        for _ in range(50):
+            if PStatClient.connect():
+                break
+            time.sleep(0.1)
+        return self
+
+    def __exit__(self, *exc):
+        if PStatClient.isConnected():
+            PStatClient.disconnect()
+        if self.proc:
+            time.sleep(1.0)
+            self.proc.terminate()
+            self.proc.wait()
+
+    @property
+    def available(self):
+        return self.proc is not None
+
+    def frames(self):
+        frames = {}
+        current = None
+        with open(self.out_path) as f:
+            for line in f:
+                m = self.FRAME_RE.match(line)
+                if m:
+                    current = frames.setdefault(int(m.group(1)), {})
+                    continue
+                m = self.VALUE_RE.match(line)
+                if m and current is not None:
+                    current[m.group(1)] = float(m.group(2))
+        os.remove(self.out_path)
+        return frames
+
+
+def count_batched_geoms(np_):
+    """Сколько Geom реально уходит в отрисовку (у RigidBodyCombiner - внутренняя сцена)."""
+    total = 0
+    node = np_.node()
+    if np_.isHidden():
+        return 0
+    if isinstance(node, RigidBodyCombiner):
+        return count_batched_geoms(NodePath(node.getInternalScene()))
+    if isinstance(node, GeomNode):
+        total += node.getNumGeoms()
+    for child in np_.getChildren():
+        total += count_batched_geoms(child)
+    return total
+
+
+# Смена состава врагов по кадрам: None - без смены; "pool" - враг умирает и
+# появляется каждый кадр, как в игре (hide/show); "collect" - то же, но с
+# пересборкой комбинера на каждую смену, как было до hide/show
+RENDER_MODES = ((False, None), (True, None), (False, "pool"), (True, "pool"), (True, "collect"))
+
+
+@showbase_benchmark
+def bench_render_batching(books=(30, 300), enemies=(15, 150), frames=60):
+    base = make_offscreen_base()
+    base.cam.setPos(0, -250, 200)
+    base.cam.lookAt(0, 0, 0)
+    base.camLens.setFar(2000)
+    rng = np.random.default_rng(2)
+    enemy_tex = base.loader.loadTexture(resolve(TEXTURES["enemy"]))
+
+    results = []
+    with PStatsCapture() as stats:
+        for n_books, n_enemies in zip(books, enemies):
+            for batched, churn in RENDER_MODES:
+                # Та же раскладка, что делают BookManager / EnemyManager
+                regions = RegionBatcher(base.render, "Books", batched=batched)
+                regions.root.setColor(0.8, 0.7, 0.3, 1)
+                for x, y in rng.uniform(-120, 120, (n_books, 2)):
+                    book = base.loader.loadModel("models/box")
+                    book.setScale(0.4, 0.5, 0.1)
+                    book.setPos(x, y, 0)
+                    book.setH(rng.uniform(0, 360))
+                    regions.attach(book)
+                group = BatchGroup(base.render, "Enemies", batched)
+                group.root.setTexture(enemy_tex, 1)
+                models = []
+                for x, y in rng.uniform(-120, 120, (n_enemies, 2)):
+                    enemy = base.loader.loadModel("models/smiley")
+                    enemy.setPos(x, y, 1)
+                    group.attach(enemy)
+                    models.append(enemy)
+                # Свободные модели пула: спрятаны в той же группе
+                spare = []
+                for _ in range(n_enemies // 4 if churn else 0):
+                    enemy = base.loader.loadModel("models/smiley")
+                    group.attach(enemy)
+                    group.hide(enemy)
+                    spare.append(enemy)
+                regions.flush()
+                group.flush()
+
+                first = globalClock.getFrameCount()
+                times = []
+                for i in range(frames):
+                    t0 = time.perf_counter()
+                    if churn:
+                        dead = models.pop(i % len(models))
+                        group.hide(dead)
+                        born = spare.pop(0)
+                        born.setPos(*rng.uniform(-120, 120, 2), 1)
+                        group.show(born)
+                        models.append(born)
+                        spare.append(dead)
+                        if churn == "collect":
+                            group.mark_dirty()
+                    # Враги двигаются каждый кадр, как в игре
+                    for enemy in models:
+                        enemy.setX(enemy.getX() + 0.05)
+                    group.flush()
+                    base.graphicsEngine.renderFrame()
+                    times.append(time.perf_counter() - t0)
+                last = globalClock.getFrameCount()
+                results.append((n_books, n_enemies, batched, churn, count_batched_geoms(base.render),
+                                np.median(times) * 1e3, np.percentile(times, 95) * 1e3, first, last))
+                regions.remove()
+                group.remove()
+
+    frame_stats = stats.frames() if stats.available else {}
+    print(f"{'books':>6} {'enemies':>8} {'batched':>8} {'churn':>8} {'Geoms':>6} {'p50, ms':>8} {'p95, ms':>8} "
+          f"{'Cull, ms':>9} {'Draw, ms':>9}")
+    for n_books, n_enemies, batched, churn, geoms, p50, p95, first, last in results:
+        window = [frame_stats[f] for f in range(first + 5, last) if f in frame_stats]
+        if window:
+            geoms = int(np.median([f.get("Geoms", geoms) for f in window]))
+            cull = f"{np.median([f.get('Cull', 0) for f in window]):>9.3f}"
+            draw = f"{np.median([f.get('Draw', 0) for f in window]):>9.3f}"
+        else:
+            cull = draw = f"{'n/a':>9}"
+        print(f"{n_books:>6} {n_enemies:>8} {str(batched):>8} {str(churn or '-'):>8} {geoms:>6} {p50:>8.2f} {p95:>8.2f} "
+              f"{cull} {draw}")
+    if not frame_stats:
+        print("text-stats not found: Cull/Draw come from PStats only")
+
+
+
+@showbase_benchmark
+def bench_projectile_pool(shots=2000):
+    from main import Projectile, PROJECTILE_COLUMNS
+    from pool import ObjectPool
+    from ecs import ComponentTable
+    from assets import AssetRegistry
+    base = make_offscreen_base()
+    base.assets = AssetRegistry(base)
+    base.projectile_table = ComponentTable("projectiles", PROJECTILE_COLUMNS, 256)
+
+    # Без пула: новый объект на каждый выстрел и removeNode при исчезновении
+    def churn():
+        for i in range(shots):
+            p = Projectile(base)
+            p.spawn((0, 0, 0), Vec3(0, 1, 0))
+            p.destroy()
+
+    pool = ObjectPool("projectile", lambda: Projectile(base), prewarm=32, max_size=256)
+
+    def pooled():
+        for i in range(shots):
+            p = pool.acquire((0, 0, 0), Vec3(0, 1, 0))
+            pool.release(p)
+
+    churn_t, _ = best_of(churn)
+    pooled_t, _ = best_of(pooled)
+    print(f"spawn+despawn, {shots} shots")
+    print(f"  new + removeNode : {churn_t / shots * 1e6:8.1f} us/shot")
+    print(f"  pool             : {pooled_t / shots * 1e6:8.1f} us/shot")
+    print(f"  pool stats       : {pool.stats()}")
+
+
+@showbase_benchmark
+def bench_hud(frames=2000, hits=500):
+    from hud import Binding, Observable, TimedWidget
+    from direct.gui.DirectGui import DirectFrame, DirectLabel
+    base = make_offscreen_base()
+    label = DirectLabel(text="HP: 100", scale=0.07)
+    health = 100
+
+    # Раньше: текст HP присваивался каждый тик, даже без изменений
+    def per_frame():
+        for i in range(frames):
+            label['text'] = f"HP: {int(health)}"
+
+    hp = Observable(100)
+    Binding(hp, label, lambda v: f"HP: {int(v)}")
+
+    def bound():
+        for i in range(frames):
+            hp.set(health)
+
+    # Вспышка урона: новый DirectFrame на каждое попадание против одного переиспользуемого
+    def flash_new():
+        for i in range(hits):
+            f = DirectFrame(frameColor=(1, 0, 0, 0.3), frameSize=(-2, 2, -2, 2))
+            f.setTransparency(True)
+            f.destroy()
+
+    flash = TimedWidget(base, DirectFrame(frameColor=(1, 0, 0, 0.3), frameSize=(-2, 2, -2, 2)), "flash")
+
+    def flash_reused():
+        for i in range(hits):
+            flash.show(0.2)
+
+    per_frame_t, _ = best_of(per_frame)
+    bound_t, _ = best_of(bound)
+    new_t, _ = best_of(flash_new)
+    reused_t, _ = best_of(flash_reused)
+    print(f"health label, {frames} frames without change")
+    print(f"  set every frame  : {per_frame_t / frames * 1e6:8.2f} us/frame")
+    print(f"  Observable       : {bound_t / frames * 1e6:8.2f} us/frame")
+    print(f"damage flash, {hits} hits")
+    print(f"  new DirectFrame  : {new_t / hits * 1e6:8.1f} us/hit")
+    print(f"  TimedWidget      : {reused_t / hits * 1e6:8.1f} us/hit")
+    print(f"  tasks after      : {len(base.taskMgr.getTasksMatching('hud-*'))}")
+
+
+# --- Эталонные (старые) проверки способностей: вложенные dict и time.time() ---
+class LegacyAbilities:
+    def __init__(self, keys):
+        self.abilities = {key: {"name": key, "type": "passive", "unlocked": True} for key in keys}
+        self.abilities["shield"] = {"name": "shield", "type": "active", "cooldown": 20.0, "duration": 5.0,
+                                    "last_used": 0.0, "active": False, "unlocked": True}
+
+    def is_unlocked(self, name):
+        return self.abilities.get(name, {}).get("unlocked", False)
+
+    def is_active(self, name):
+        ability = self.abilities.get(name)
+        if not ability or not ability.get("active", False):
+            return False
+        if time.time() - ability["last_used"] > ability["duration"]:
+            ability["active"] = False
+            return False
+        return True
+
+
+@benchmark
+def bench_abilities(frames=200000):
+    from abilities import AbilitySystem, ABILITIES
+    keys = ("move_forward", "move_backward", "move_left", "move_right", "jump")
+    sim_time = [0.0]
+    system = AbilitySystem(clock=lambda: sim_time[0])
+    for key in ABILITIES:
+        system.unlock(key)
+    system.use("shield")
+    legacy = LegacyAbilities(keys)
+    legacy.abilities["shield"].update(active=True, last_used=time.time())
+
+    # Проверки одного тика игрока: движение и прыжок + щит в take_damage
+    def frame_checks(abilities):
+        def run():
+            is_unlocked, is_active = abilities.is_unlocked, abilities.is_active
+            for i in range(frames):
+                for key in keys:
+                    is_unlocked(key)
+                is_active("shield")
+        return run
+
+    legacy_t, _ = best_of(frame_checks(legacy))
+    new_t, _ = best_of(frame_checks(system))
+    print(f"5x is_unlocked + is_active, {frames} frames")
+    print(f"  nested dicts     : {legacy_t / frames * 1e9:8.0f} ns/frame")
+    print(f"  bitmasks         : {new_t / frames * 1e9:8.0f} ns/frame")
+
+    # Истечение эффекта по куче таймеров
+    def expiry():
+        for i in range(frames):
+            sim_time[0] += 1.0 / 60
+            system.update(1.0 / 60)
+    update_t, _ = best_of(expiry, repeat=1)
+    print(f"  update (timers)  : {update_t / frames * 1e9:8.0f} ns/tick, shield active: {system.is_active('shield')}")
+
+
+# --- Эталонные (старые) классы: состояние в атрибутах, обновление по одному ---
+def legacy_flow_sample(field, x, y):
+    """Направление поля в клетке одной точки или None (враг-объект читал его сам)."""
+    gx = math.floor((x - field.origin[0]) * field.inv_cell + 0.5)
+    gy = math.floor((y - field.origin[1]) * field.inv_cell + 0.5)
+    size = field.size
+    if 0 <= gx < size and 0 <= gy < size and field.valid[gy * size + gx]:
+        return field.flow_array[gy * size + gx]
+    return None
+
+
+def legacy_first_hits(grid, points, radius):
+    """Попадания по SpatialHash: ближайший объект на точку, каждый не больше раза."""
+    hit = set()
+    hits = []
+    positions = grid.positions
+    for i, (x, y, z) in enumerate(points):
+        best = None
+        best_d2 = radius * radius
+        for obj in grid.query(x, y, radius):
+            if obj in hit:
+                continue
+            ox, oy, oz = positions[obj]
+            d2 = (ox - x) ** 2 + (oy - y) ** 2 + (oz - z) ** 2
+            if d2 < best_d2:
+                best, best_d2 = obj, d2
+        if best is not None:
+            hit.add(best)
+            hits.append((i, best))
+    return hits
+
+
+class LegacyEnemy:
+    def __init__(self, model, grid, flow, speed=4.0):
+        self.model = model
+        self.grid = grid
+        self.flow = flow
+        self.speed = speed
+        self.chase_radius = 40.0
+        self.attack_range = 2.0
+        self.attack_cooldown = 1.5
+        self.attack_timer = 0
+        pos = model.getPos()
+        grid.insert(self, pos.x, pos.y, pos.z)
+
+    def update(self, player_node, dt):
+        if self.attack_timer > 0:
+            self.attack_timer -= dt
+        current_pos = self.model.getPos()
+        player_pos = player_node.getPos()
+        dist_to_player = (player_pos - current_pos).length()
+        if dist_to_player > self.chase_radius:
+            return
+        flow = legacy_flow_sample(self.flow, current_pos.x, current_pos.y)
+        if flow is not None:
+            direction = Vec3(flow[0], flow[1], 0)
+            self.model.setHpr(flow[2], 0, 0)
+        else:
+            direction = player_pos - current_pos
+            direction.setZ(0)
+            if direction.length() > 0.001:
+                direction.normalize()
+            self.model.setHpr(math.degrees(math.atan2(-direction.x, direction.y)), 0, 0)
+        if dist_to_player > self.attack_range:
+            new_pos = current_pos + (direction * self.speed * dt)
+            z = analytic_height(new_pos.x, new_pos.y) + 1.0
+            self.model.setPos(new_pos.x, new_pos.y, z)
+            self.grid.move(self, new_pos.x, new_pos.y, z)
+        elif self.attack_timer <= 0:
+            self.attack_timer = self.attack_cooldown
+
+
+class LegacyProjectile:
+    def __init__(self, model, pos, direction):
+        self.model = model
+        self.speed = 40.0
+        self.lifetime = 3.0
+        self.pos = Vec3(*pos)
+        self.direction = Vec3(*direction)
+
+    def update(self, dt):
+        self.lifetime -= dt
+        if self.lifetime <= 0: return False
+        self.pos += self.direction * (self.speed * dt)
+        self.model.setPos(self.pos)
+        return True
+
+
+def make_enemy_base(loaded=True):
+    """
+    Offscreen ShowBase с тем, что нужно EnemyManager: ассеты, рельеф, игрок
+    в (0, 0). loaded - модели загружены заранее, и spawn_at создает врага
+    сразу, а не откладывает до загрузки.
+    """
+    from assets import AssetRegistry
+    import types
+    base = make_offscreen_base()
+    base.assets = AssetRegistry(base)
+    base.batch_rendering = True
+    base.world_limit = None
+    base.terrain = None
+    base.enemy_worker = False
+    base.get_terrain_height = analytic_height
+    base.get_terrain_heights = terrain_heights
+    player = base.render.attachNewNode("player")
+    base.player = types.SimpleNamespace(model=player, take_damage=lambda amount: None)
+    if loaded:
+        base.assets.finish()
+    return base
+
+
+def ring_positions(rng, n, radius=(5, 38)):
+    """n точек (x, y) в кольце вокруг начала координат (по умолчанию все в радиусе преследования)."""
+    angle = rng.uniform(0, 2 * np.pi, n)
+    dist = rng.uniform(*radius, n)
+    return np.stack([np.cos(angle) * dist, np.sin(angle) * dist], axis=1)
+
+
+@showbase_benchmark
+def bench_ecs(counts=(100, 1000, 5000), ticks=30, shots=(100, 1000)):
+    from enemies import EnemyManager
+    from main import PROJECTILE_COLUMNS
+    from navigation import FlowField
+    from scheduler import SimScheduler
+    from ecs import ComponentTable, sync_nodes
+    import types
+    base = make_enemy_base()
+    player = base.player.model
+    flow = FlowField(terrain_heights)
+    flow.update(0, 0)
+    dt = 1.0 / 60
+    rng = np.random.default_rng(1)
+
+    # Тик врагов + интерполяция узлов в кадре (один тик на кадр), все в радиусе преследования
+    print(f"{'enemies':>8} {'objects, ms':>12} {'arrays, ms':>11} {'speedup':>8}   per tick, hits: objects/arrays")
+    for n in counts:
+        xy = ring_positions(rng, n)
+
+        legacy_sched = SimScheduler(base)
+        group = BatchGroup(base.render, "legacy", True)
+        grid = SpatialHash(cell_size=4.0)
+        legacy = []
+        for x, y in xy.tolist():
+            model = base.assets.model("smiley")
+            model.setPos(x, y, analytic_height(x, y) + 1.0)
+            group.attach(model)
+            legacy.append(LegacyEnemy(model, grid, flow))
+            legacy_sched.track(model)
+        group.flush()
+        legacy_sched.systems = [("enemies", lambda dt: [e.update(player, dt) for e in legacy])]
+
+        base.pool_sizes = {"enemy": (0, n)}
+        manager = EnemyManager(base)
+        manager.max_enemies = 0
+        manager.sim.flow = flow
+        for x, y in xy.tolist():
+            manager.spawn_at(x, y)
+        manager.batch.flush()
+        assert len(manager.enemies) == n, "spawns were deferred"
+        ecs_sched = SimScheduler(base)
+        ecs_sched.systems = [("enemies", manager.update)]
+
+        def run_legacy():
+            for _ in range(ticks):
+                legacy_sched.advance(dt)
+
+        def run_arrays():
+            for _ in range(ticks):
+                ecs_sched.advance(dt)
+                sync_nodes(manager.table, ecs_sched.alpha)
+
+        legacy_t, _ = best_of(run_legacy, repeat=1)
+        arrays_t, _ = best_of(run_arrays, repeat=1)
+
+        # Попадания 200 снарядов рядом с врагами: сетка против отсортированных ключей клеток
+        near = rng.choice(n, 200)
+        points = manager.table.pos[near] + rng.uniform(-1, 1, (200, 3))
+        grid_hits = legacy_first_hits(grid, points.tolist(), 1.5)
+        array_hits = manager.first_hits(points, 1.5)
+        print(f"{n:>8} {legacy_t / ticks * 1e3:>12.2f} {arrays_t / ticks * 1e3:>11.2f} "
+              f"{legacy_t / arrays_t:>7.1f}x   {len(grid_hits)}/{len(array_hits)}")
+        manager.cleanup()
+        group.remove()
+
+    # Полет снарядов с интерполяцией узлов: Vec3 в каждом объекте против столбцов таблицы
+    print(f"{'shots':>8} {'objects, ms':>12} {'arrays, ms':>11} {'speedup':>8}   per tick")
+    for n in shots:
+        directions = rng.normal(size=(n, 3))
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        models = [base.render.attachNewNode(f"shot{i}") for i in range(n)]
+        legacy = [LegacyProjectile(m, (0, 0, 1), d) for m, d in zip(models, directions.tolist())]
+        legacy_sched = SimScheduler(base)
+        for m in models:
+            legacy_sched.track(m)
+        legacy_sched.systems = [("projectiles", lambda dt: [p.update(dt) for p in legacy])]
+        owners = [types.SimpleNamespace(model=m, row=None) for m in models]
+        table = ComponentTable("projectiles", PROJECTILE_COLUMNS, n)
+        for owner, d in zip(owners, directions):
+            table.add(owner, pos=(0, 0, 1), prev=(0, 0, 1), shown=np.nan, velocity=d * 40.0, lifetime=1e9)
+
+        def run_legacy():
+            for _ in range(ticks):
+                legacy_sched.advance(dt)
+
+        def run_arrays():
+            for _ in range(ticks):
+                table.save_prev()
+                table.lifetime[:n] -= dt
+                table.pos[:n] += table.velocity[:n] * dt
+                np.flatnonzero(table.lifetime[:n] <= 0)
+                sync_nodes(table, 0.5)
+
+        legacy_t, _ = best_of(run_legacy)
+        arrays_t, _ = best_of(run_arrays)
+        print(f"{n:>8} {legacy_t / ticks * 1e3:>12.3f} {arrays_t / ticks * 1e3:>11.3f} {legacy_t / arrays_t:>7.1f}x")
+        for m in models:
+            m.removeNode()
+
+
+@showbase_benchmark
+def bench_enemy_worker(counts=(100, 1000, 10000), ticks=60):
+    from enemies import EnemyManager
+    from scheduler import SimScheduler, SystemTimes
+    from ecs import sync_nodes
+    base = make_enemy_base()
+    rng = np.random.default_rng(1)
+    dt = 1.0 / 60
+
+    # Основной поток на тик: система врагов + расстановка узлов в кадре.
+    # С worker система только забирает результат и отправляет команды, а
+    # сам тик врагов идет параллельно с расстановкой узлов
+    print(f"{'enemies':>8} {'in-process, ms':>15} {'worker, ms':>11} {'speedup':>8} {'system, ms':>16} {'waited, ms':>11}   per tick")
+    for n in counts:
+        xy = ring_positions(rng, n).tolist()
+        base.pool_sizes = {"enemy": (0, n)}
+        timings = []
+        for worker in (False, True):
+            base.enemy_worker = worker
+            manager = EnemyManager(base)
+            manager.max_enemies = 0
+            for x, y in xy:
+                manager.spawn_at(x, y)
+            manager.batch.flush()
+            assert len(manager.enemies) == n, "spawns were deferred"
+            scheduler = SimScheduler(base)
+            scheduler.systems = [("enemies", manager.update)]
+            for _ in range(3):  # первые тики: worker получает спавн, поле потока строится
+                scheduler.advance(dt)
+            waited = manager.worker.wait_time if worker else 0.0
+
+            scheduler.profile = SystemTimes()
+            started = time.perf_counter()
+            for _ in range(ticks):
+                scheduler.advance(dt)
+                sync_nodes(manager.table, scheduler.alpha)
+            elapsed = time.perf_counter() - started
+            if worker:
+                waited = manager.worker.wait_time - waited
+            timings.append((elapsed, sum(scheduler.profile["enemies"]), waited))
+            manager.cleanup()
+        (local_t, local_sys, _), (worker_t, worker_sys, waited) = timings
+        print(f"{n:>8} {local_t / ticks * 1e3:>15.2f} {worker_t / ticks * 1e3:>11.2f} {local_t / worker_t:>7.2f}x "
+              f"{local_sys / ticks * 1e3:>7.2f} -> {worker_sys / ticks * 1e3:>5.2f} {waited / ticks * 1e3:>11.2f}")
+
+
+@showbase_part
+def spawn_loading_run(mode, frames, spawn_every):
+    """Один режим bench_spawn_loading в свежем процессе: модели еще ни разу не грузились."""
+    from enemies import EnemyManager
+    base = make_enemy_base(loaded=False)
+    base.pool_sizes = {"enemy": (0, 64)}
+    for _ in range(5):
+        base.taskMgr.step()
+    # Спавн в том же кадре, что и создание менеджера (его prewarm уже запросил модель)
+    manager = EnemyManager(base)
+    manager.max_enemies = 0
+    if mode == "sync":
+        manager.pool.model = None  # пул не знает о модели - как до отложенных спавнов
+
+    spawns = []  # время вызова spawn_at
+    frames_t = []
+    first = None
+    for frame in range(frames):
+        started = time.perf_counter()
+        if frame % spawn_every == 0:
+            manager.spawn_at(frame, 10)
+            spawns.append(time.perf_counter() - started)
+        base.taskMgr.step()
+        frames_t.append(time.perf_counter() - started)
+        if first is None and manager.enemies:
+            first = frame
+    seconds, how = base.assets.timings["smiley"]
+    wait_ms = manager.pool.stats()["max_deferred_wait_ms"]
+    print(f"{mode:>8} {max(spawns) * 1e3:>14.2f} {np.median(frames_t) * 1e3:>14.2f} {max(frames_t) * 1e3:>14.2f} "
+          f"{first:>19} {wait_ms:>15.2f}   smiley: {seconds * 1e3:.2f} ms ({how})")
+
+
+@benchmark
+def bench_spawn_loading(frames=60, spawn_every=4):
+    # Игра идет, модели врага еще нет (меню закрыли до конца предзагрузки):
+    # раньше первый спавн грузил ее синхронно внутри кадра, теперь пул
+    # откладывает спавн до асинхронной загрузки
+    print(f"{'loading':>8} {'spawn max, ms':>14} {'frame p50, ms':>14} {'frame max, ms':>14} "
+          f"{'first enemy, frame':>19} {'spawn wait, ms':>15}")
+    for mode in ("sync", "async"):
+        run_in_process("spawn_loading_run", (mode, frames, spawn_every), {})
+
+
+@showbase_part
+def savestate_run(enemies, projectiles, ticks):
+    """Один размер мира bench_savestate в свежем процессе."""
+    from main import Game
+    import savestate
+    game = Game(headless="none", seed=1, pool_sizes={"enemy": (0, enemies), "projectile": (0, projectiles)})
+    manager = game.enemy_manager
+    manager.max_enemies = 0
+    rng = np.random.default_rng(1)
+    for x, y in ring_positions(rng, enemies, (5, 90)).tolist():
+        manager.spawn_at(x, y)
+    for d in rng.normal(size=(projectiles, 3)).tolist():
+        game.spawn_projectile((0, 0, 2), Vec3(*d))
+    game.simulate(ticks)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.sav")
+    save_t, _ = best_of(lambda: savestate.save(game, path), repeat=5)
+    # Загрузка в сессию без врагов (все из пула) и поверх тех же врагов (F9)
+    for e in list(manager.enemies):
+        manager.pool.release(e)
+    load_t = savestate.load(game, path)
+    reload_t, _ = best_of(lambda: savestate.load(game, path), repeat=3)
+    size = os.path.getsize(path)
+    shutil.rmtree(os.path.dirname(path))
+    print(f"{enemies:>8} {save_t * 1e3:>9.2f} {load_t * 1e3:>9.2f} {reload_t * 1e3:>11.2f} {size / 1024:>9.1f}")
+
+
+@benchmark
+def bench_savestate(counts=(100, 1000, 10000), projectiles=256, ticks=10):
+    # Полный мир headless-игры: враги в кольце до 90 м, книги, снаряды в полете
+    print(f"{'enemies':>8} {'save, ms':>9} {'load, ms':>9} {'reload, ms':>11} {'file, KB':>9}")
+    for n in counts:
+        run_in_process("savestate_run", (n, projectiles, ticks), {})
+
+
+def restart_counts(game):
+    """Ресурсы, которые не должны расти от рестарта к рестарту."""
+    from direct.showbase.InputStateGlobal import inputState
+    from panda3d.core import LightAttrib
+    lights = game.render.getAttrib(LightAttrib)
+    return {
+        "nodes": game.render.countNumDescendants(),
+        "lights": lights.getNumOnLights() if lights else 0,
+        "tasks": len(game.taskMgr.getAllTasks()),
+        "events": len(game.messenger.getEvents()),
+        "input watchers": sum(len(w) for w in inputState._watching.values()),
+    }
+
+
+@showbase_benchmark
+def bench_restart(cycles=20, ticks=60):
+    from main import Game
+    # Выход в меню и новая игра подряд, между ними - секунда игры
+    game = Game(headless="none", seed=1)
+    game.simulate(ticks)
+    exits, starts, counts = [], [], [restart_counts(game)]
+    for _ in range(cycles):
+        started = time.perf_counter()
+        game.exit_to_menu()
+        exits.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        game.start_game()
+        starts.append(time.perf_counter() - started)
+        game.simulate(ticks)
+        counts.append(restart_counts(game))
+    print(f"{cycles} cycles: exit_to_menu p50 {np.median(exits) * 1e3:.2f} ms, "
+          f"start_game p50 {np.median(starts) * 1e3:.2f} ms (first {starts[0] * 1e3:.2f} ms, max {max(starts) * 1e3:.2f} ms)")
+    for name in counts[0]:
+        print(f"  {name:>15}: {counts[0][name]:>6} -> {counts[1][name]:>6} -> {counts[-1][name]:>6}")
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -1,33 +1,48 @@
-from panda3d.core import CollisionNode, CollisionBox, BitMask32
+from batching import RegionBatcher
+from pool import ObjectPool
+import numpy as np
 import random
 import math
 
 class Book:
-    def __init__(self, game, pos):
+    interact_prompt = "[E] Read"
+    model_name = "box"
+
+    def __init__(self, game, manager):
         self.game = game
-        self.model = game.loader.loadModel("models/box")
+        self.manager = manager
+        self.batch = None
+        self.model = game.assets.model(self.model_name)
         self.model.setScale(0.4, 0.5, 0.1)
-        self.model.setColor(0.8, 0.7, 0.3, 1) # Золотой цвет
-        
+        self.model.reparentTo(manager.regions.root)
+        self.model.stash()
+
+    def spawn(self, pos, rotation=None):
+        # rotation - (курс, наклон) из сохранения, иначе случайный
         z = self.game.get_terrain_height(pos[0], pos[1]) + 0.2
         self.model.setPos(pos[0], pos[1], z)
-        self.model.setH(random.uniform(0, 360))
-        self.model.setP(random.uniform(-5, 5))
-        self.model.reparentTo(game.render)
-        
-        # Интерактивный узел - Bit 1
-        self.interact_node = self.model.attachNewNode(CollisionNode('book_interact'))
-        self.interact_node.node().addSolid(CollisionBox((0,0,0), 0.5, 0.5, 0.5))
-        self.interact_node.node().setIntoCollideMask(BitMask32.bit(1)) 
-        self.interact_node.setPythonTag("book", self)
+        if rotation is None:
+            rotation = (random.uniform(0, 360), random.uniform(-5, 5))
+        self.model.setHpr(rotation[0], rotation[1], 0)
+        self.model.unstash()
+        # Книги статичны - собираются в батчи по регионам карты
+        self.batch = self.manager.regions.attach(self.model)
+        self.game.interaction.register(self, (pos[0], pos[1], z))
+        # В список - здесь, а не у вызывающего: спавн может быть отложен пулом
+        self.manager.books.append(self)
 
     def interact(self):
         unlocked_name = self.game.player.unlock_random_ability()
-        self.game.book_manager.books.remove(self)
-        self.cleanup()
+        self.manager.pool.release(self)
         self.game.ui.show_notification(f"Unlocked: {unlocked_name}")
 
-    def cleanup(self):
+    def despawn(self):
+        self.manager.books.remove(self)
+        self.game.interaction.unregister(self)
+        self.model.stash()
+        self.batch.mark_dirty()
+
+    def destroy(self):
         self.model.removeNode()
 
 class BookManager:
@@ -35,6 +50,13 @@ class BookManager:
         self.game = game
         self.books = []
         self.max_books = 30 
+        self.spawn_radius = 120
+
+        self.regions = RegionBatcher(game.render, "Books", batched=game.batch_rendering)
+        self.regions.root.setColor(0.8, 0.7, 0.3, 1) # Золотой цвет
+
+        prewarm, max_size = game.pool_sizes["book"]
+        self.pool = ObjectPool("book", lambda: Book(game, self), prewarm, max_size, game.assets, Book.model_name)
         self.spawn_timer = 0
 
     def start_spawning(self):
@@ -42,40 +64,59 @@ class BookManager:
         self.spawn_debug_row()
         # 2. Затем заполняем остальную карту до лимита
         self.spawn_initial()
-        self.game.taskMgr.add(self.update, "BookSpawn")
 
     def spawn_debug_row(self):
         """Создает 6 книг в ряд перед игроком (X=0, Y=5..15)"""
         for i in range(8):
             x = (i - 2.5) * 2 # Расставляем по горизонтали
             y = 10            # В 10 метрах перед спавном
-            book = Book(self.game, (x, y))
-            self.books.append(book)
+            self.pool.acquire((x, y))
 
     def spawn_initial(self):
-        while len(self.books) < self.max_books:
+        while self.count() < self.max_books:
             self.spawn_one()
 
+    def count(self):
+        """Книги на карте вместе с ждущими модели."""
+        return len(self.books) + self.pool.waiting
+
     def spawn_one(self):
-        x = random.uniform(-120, 120)
-        y = random.uniform(-120, 120)
-        book = Book(self.game, (x, y))
-        self.books.append(book)
-
-    def update(self, task):
-        dt = globalClock.getDt()
-        
-        if len(self.books) < self.max_books:
+        limit = self.game.world_limit
+        if limit is not None:
+            x = random.uniform(-limit, limit)
+            y = random.uniform(-limit, limit)
+        else:
+            # Мир без границ - раскидываем книги вокруг игрока
+            p_pos = self.game.player.model.getPos()
+            x = p_pos.x + random.uniform(-self.spawn_radius, self.spawn_radius)
+            y = p_pos.y + random.uniform(-self.spawn_radius, self.spawn_radius)
+        self.pool.acquire((x, y))
+
+    def update(self, dt):
+        if self.count() < self.max_books:
             self.spawn_timer += dt
             if self.spawn_timer > 10.0:
                 self.spawn_timer = 0
                 self.spawn_one()
         else:
             self.spawn_timer = 0
-                
-        return task.cont
 
-    def cleanup(self):
-        for b in self.books:
-            b.cleanup()
-        self.books = []
\ No newline at end of file
+    def snapshot(self):
+        """Книги по порядку для сохранения (savestate.py): массив (n, 4) x, y, курс, наклон."""
+        return np.array([(b.model.getX(), b.model.getY(), b.model.getH(), b.model.getP()) for b in self.books],
+                        np.float64).reshape(-1, 4)
+
+    def restore(self, books):
+        """Заменяет все книги сохраненными (см. snapshot)."""
+        for b in list(self.books):
+            self.pool.release(b)
+        self.pool.cancel_deferred()
+        for x, y, h, p in books.tolist():
+            self.pool.acquire((x, y), (h, p))
+
+    def clear(self):
+        """Конец игры: книги возвращаются в пул, пул и батчи остаются для следующей."""
+        for b in list(self.books):
+            self.pool.release(b)
+        self.pool.cancel_deferred()
+        self.spawn_timer = 0
\ No newline at end of file
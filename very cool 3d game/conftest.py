@@ -0,0 +1,24 @@
+"""
+Общие фикстуры тестов (python -m pytest). ShowBase в процессе может быть
+только один, поэтому игра одна на все тесты, а каждый тест начинает в ней
+новую сессию.
+"""
+import pytest
+
+from main import Game
+
+
+@pytest.fixture(scope="session")
+def session_game():
+    game = Game(headless="none", seed=1)
+    yield game
+    game.destroy()
+
+
+@pytest.fixture
+def game(session_game):
+    session_game.exit_to_menu()
+    session_game.start_game()
+    session_game.assets.finish()  # спавны сразу, без ожидания моделей
+    session_game.simulate(0)      # часы - по тику на кадр
+    return session_game
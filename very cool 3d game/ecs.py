@@ -0,0 +1,103 @@
+"""
+Хранилище компонентов для массовых сущностей (враги, снаряды).
+
+Состояние лежит не в атрибутах объектов, а в столбцах numpy, по строке на
+сущность, и системы обрабатывают столбцы целиком векторными операциями.
+Объект-владелец строки остается ручкой для пула и держит модель; узлы
+сцены ставятся по столбцам раз в кадр (sync_nodes), а не в каждой системе.
+"""
+import numpy as np
+
+# Столбцы положения, которые читает sync_nodes
+TRANSFORM = {
+    "pos": (np.float64, 3),      # на текущем тике
+    "prev": (np.float64, 3),     # на прошлом тике, для интерполяции
+    "heading": (np.float64, 1),  # курс, градусы
+    "shown": (np.float64, 4),    # что сейчас на экране: x, y, z, курс
+}
+
+
+class ComponentTable:
+    """
+    Таблица одного вида сущностей: columns - имя -> (dtype, ширина),
+    каждый столбец доступен атрибутом. Занятые строки идут подряд с нуля:
+    при удалении на место строки переезжает последняя, и ее владелец
+    получает новый row. Емкость растет удвоением.
+    """
+    def __init__(self, name, columns, capacity=64):
+        self.name = name
+        self.columns = dict(columns)
+        self.capacity = max(1, capacity)
+        self.count = 0
+        self.owners = []  # владельцы строк по порядку, у каждого есть row и model
+        for column, (dtype, width) in self.columns.items():
+            setattr(self, column, self.allocate(dtype, width, self.capacity))
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def allocate(dtype, width, capacity):
+        return np.zeros((capacity,) if width == 1 else (capacity, width), dtype)
+
+    def grow(self):
+        capacity = self.capacity * 2
+        for column, (dtype, width) in self.columns.items():
+            array = self.allocate(dtype, width, capacity)
+            array[:self.count] = getattr(self, column)[:self.count]
+            setattr(self, column, array)
+        self.capacity = capacity
+
+    def add(self, owner, **values):
+        """Новая строка для owner; не указанные столбцы - нули."""
+        if self.count == self.capacity:
+            self.grow()
+        row = self.count
+        for column in self.columns:
+            getattr(self, column)[row] = values.get(column, 0)
+        self.count += 1
+        self.owners.append(owner)
+        owner.row = row
+        return row
+
+    def remove(self, owner):
+        row = owner.row
+        last = self.count - 1
+        if row != last:
+            for column in self.columns:
+                array = getattr(self, column)
+                array[row] = array[last]
+            moved = self.owners[last]
+            self.owners[row] = moved
+            moved.row = row
+        self.owners.pop()
+        self.count = last
+        owner.row = None
+
+    def save_prev(self):
+        """Начало тика: текущие позиции становятся прошлыми."""
+        self.prev[:self.count] = self.pos[:self.count]
+
+
+def sync_nodes(table, alpha):
+    """
+    Ставит модели владельцев между прошлым и текущим тиком (alpha - доля
+    шага, как в SimScheduler.blend). Узлы, чье положение на экране не
+    изменилось, не трогаются. Возвращает число переставленных узлов.
+    """
+    n = table.count
+    if not n:
+        return 0
+    prev = table.prev[:n]
+    frame = np.empty((n, 4))
+    frame[:, :3] = prev + (table.pos[:n] - prev) * alpha
+    frame[:, 3] = table.heading[:n]
+    changed = np.flatnonzero((frame != table.shown[:n]).any(axis=1))
+    if not len(changed):
+        return 0
+    frame = frame[changed]
+    table.shown[changed] = frame
+    owners = table.owners
+    for row, (x, y, z, h) in zip(changed.tolist(), frame.tolist()):
+        owners[row].model.setPosHpr(x, y, z, h, 0, 0)
+    return len(changed)
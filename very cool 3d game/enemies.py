@@ -1,135 +1,305 @@
-from panda3d.core import CollisionNode, CollisionSphere, BitMask32, Vec3
+from batching import BatchGroup
+from pool import ObjectPool
+from ecs import ComponentTable
+from enemy_sim import EnemySimulation, EnemyWorker, ENEMY_COLUMNS, SAVED_COLUMNS, TIER_NEAR, TIER_DORMANT, load_rows
+from terrain import terrain_heights
+import numpy as np
 import random
-import os
 import math
 
+# Ключ клетки в first_hits: cx * KEY_STRIDE + cy
+KEY_STRIDE = 1 << 32
+
 class Enemy:
-    def __init__(self, game, pos, speed):
+    """Ручка врага для пула: модель и номер строки в таблице менеджера."""
+    model_name = "smiley"
+
+    def __init__(self, game, manager):
         self.game = game
-        self.speed = speed
-        
-        # Логика поведения
-        self.chase_radius = 40.0
-        self.attack_range = 2.0
-        self.attack_cooldown = 1.5
-        self.attack_timer = 0
-        
-        self.model = game.loader.loadModel("models/smiley")
+        self.manager = manager
+        self.row = None
+
+        self.model = game.assets.model(self.model_name)
         self.model.setScale(1)
-        self.model.reparentTo(game.render)
-        
+        # Текстура и цвет общие - висят на узле группы (см. EnemyManager)
+        manager.batch.attach(self.model)
+        manager.batch.hide(self.model)
+
+    def spawn(self, pos, speed):
         z = self.game.get_terrain_height(pos[0], pos[1]) + 1.0
-        self.model.setPos(pos[0], pos[1], z)
-        
-        # Текстура врага
-        if os.path.exists("textures/enemy.png"):
-            try:
-                tex = game.loader.loadTexture("textures/enemy.png")
-                self.model.setTexture(tex, 1)
-                self.model.setColor(1, 1, 1, 1) # Белый, чтобы текстура была видна
-            except:
-                self.model.setColor(1, 0, 0, 1) # Красный если ошибка
-        else:
-            self.model.setColor(1, 0, 0, 1) # Красный если нет файла
-
-        # Коллизия
-        self.collider = self.model.attachNewNode(CollisionNode('enemy'))
-        self.collider.node().addSolid(CollisionSphere(0, 0, 0, 1.2))
-        self.collider.node().setFromCollideMask(BitMask32.allOff()) 
-        # Бит 0 (Враги/Стены)
-        self.collider.node().setIntoCollideMask(BitMask32.bit(0))
-        
-        # --- НОВОЕ: Чтобы работать с update logic ---
-        self.collider.setPythonTag("enemy", self)
-
-    def update(self, player_node, dt):
-        if not player_node: return
-        
-        if self.attack_timer > 0:
-            self.attack_timer -= dt
-            
-        current_pos = self.model.getPos()
-        player_pos = player_node.getPos()
-        dist_to_player = (player_pos - current_pos).length()
-
-        # Преследование только если близко
-        if dist_to_player <= self.chase_radius:
-            direction = player_pos - current_pos
-            direction.setZ(0)
-            if direction.length() > 0.001:
-                direction.normalize()
-                
-            self.model.headsUp(player_pos)
-            self.model.setP(0); self.model.setR(0)
-
-            if dist_to_player > self.attack_range:
-                # Движение
-                new_pos = current_pos + (direction * self.speed * dt)
-                # Привязка к рельефу
-                terrain_z = self.game.get_terrain_height(new_pos.x, new_pos.y)
-                self.model.setPos(new_pos.x, new_pos.y, terrain_z + 1.0)
-            
-            else:
-                # Атака (Удар по таймеру)
-                if self.attack_timer <= 0:
-                    self.attack_timer = self.attack_cooldown
-                    self.game.player.take_damage(15)
-                    self.model.setZ(self.model.getZ() + 0.5) # Визуальный "прыжок" при ударе
-    
+        self.manager.add(self, pos[0], pos[1], z, speed)
+        self.manager.batch.show(self.model)
+
     # --- НОВОЕ: Получение урона ---
     def take_damage(self):
         # Для простоты - умирают с одного удара
-        self.cleanup()
-        if self in self.game.enemy_manager.enemies:
-            self.game.enemy_manager.enemies.remove(self)
+        self.manager.kill(self)
 
-    def cleanup(self):
+    def despawn(self):
+        self.manager.remove(self)
+        self.manager.batch.hide(self.model)
+
+    def destroy(self):
         self.model.removeNode()
 
 class EnemyManager:
     def __init__(self, game):
         self.game = game
-        self.enemies = []
         self.base_speed = 4.0
         self.current_speed = 4.0
         self.spawn_timer = 0
         self.max_enemies = 15
+        self.attack_damage = 15
+        # Тело врага (сфера 1.2) против игрока (0.5 x 0.5 x 1): ближе - отталкивает игрока
+        self.body_radius = 1.7
+        self.body_height = 2.2
+
+        # Все состояние врагов - столбцы таблицы (см. ecs.py), поведение -
+        # EnemySimulation над ними; enemies - ручки в порядке строк
+        prewarm, max_size = game.pool_sizes["enemy"]
+        self.table = ComponentTable("enemies", ENEMY_COLUMNS, max_size)
+        self.enemies = self.table.owners
+        self.dying = {}  # убитые, ждущие результата worker (dict как упорядоченное множество)
+        if game.enemy_worker:
+            # Симуляция в отдельном процессе; здесь таблица - копия ее
+            # позиций для отрисовки, попаданий и столкновений с игроком
+            self.sim = None
+            self.worker = EnemyWorker(max_size, self.worker_heights())
+        else:
+            self.sim = EnemySimulation(self.table, game.get_terrain_heights)
+            self.worker = None
+
+        # Все враги под одним узлом (RigidBodyCombiner в режиме батчинга)
+        self.batch = BatchGroup(game.render, "Enemies", game.batch_rendering)
+
+        # Текстура врага
+        tex = game.assets.texture("enemy")
+        if tex:
+            self.batch.root.setTexture(tex, 1)
+            self.batch.root.setColor(1, 1, 1, 1) # Белый, чтобы текстура была видна
+        else:
+            self.batch.root.setColor(1, 0, 0, 1) # Красный если нет файла или ошибка
+
+        self.pool = ObjectPool("enemy", lambda: Enemy(game, self), prewarm, max_size, game.assets, Enemy.model_name)
+
+    def worker_heights(self):
+        """
+        Высоты для процесса worker: сетка карты (та же, что в игре) или,
+        для мира из чанков, аналитическая функция - чанки подгружаются здесь.
+        """
+        grid = getattr(self.game.terrain, "grid", None)
+        return grid.get_heights if grid else terrain_heights
 
     def set_difficulty(self, speed_mult):
         self.current_speed = self.base_speed * speed_mult
-            
-    def start_spawning(self):
-        self.game.taskMgr.add(self.update, "EnemySpawn")
 
-    def update(self, task):
-        dt = globalClock.getDt()
+    def spawn_at(self, x, y):
+        # Лимит карты +/- world_limit (в мире из чанков лимита нет)
+        limit = self.game.world_limit
+        if limit is not None:
+            x = max(-limit, min(limit, x))
+            y = max(-limit, min(limit, y))
+
+        return self.pool.acquire((x, y, 0), self.current_speed)
+
+    def add(self, enemy, x, y, z, speed):
+        if self.worker:
+            xyz = (x, y, z)
+            self.table.add(enemy, pos=xyz, prev=xyz, shown=np.nan, speed=speed, tier=TIER_DORMANT)
+            self.worker.spawn(x, y, z, speed)
+        else:
+            self.sim.add(enemy, x, y, z, speed)
+
+    def remove(self, enemy):
+        if self.worker:
+            self.worker.kill(enemy.row)
+        self.table.remove(enemy)
+
+    def kill(self, enemy):
+        if enemy.row is None or enemy in self.dying:
+            return
+        if self.worker:
+            # Пока worker считает тик, строки трогать нельзя: враг исчезает
+            # сразу, а из таблицы уходит после сбора результата
+            self.batch.hide(enemy.model)
+            self.dying[enemy] = None
+        else:
+            self.pool.release(enemy)
+
+    def update(self, dt):
         self.spawn_timer += dt
-        
+
         # Спавн чуть чаще, карта большая
-        if self.spawn_timer > 3.0 and len(self.enemies) < self.max_enemies:
+        if self.spawn_timer > 3.0 and len(self.enemies) + self.pool.waiting < self.max_enemies:
             self.spawn_timer = 0
             angle = random.uniform(0, 3.14 * 2)
             dist = random.uniform(30, 80) # Враги появляются вокруг игрока
             p_pos = self.game.player.model.getPos()
-            
-            x = p_pos.x + math.cos(angle) * dist
-            y = p_pos.y + math.sin(angle) * dist
-            
-            # Лимит карты +/- 120
-            x = max(-120, min(120, x))
-            y = max(-120, min(120, y))
-            
-            enemy = Enemy(self.game, (x, y, 0), self.current_speed)
-            self.enemies.append(enemy)
-
-        if hasattr(self.game, 'player') and self.game.player:
-            # Создаем копию списка, так как враги могут удаляться в процессе (смерть)
-            for e in self.enemies[:]:
-                e.update(self.game.player.model, dt)
-            
-        return task.cont
+
+            self.spawn_at(p_pos.x + math.cos(angle) * dist, p_pos.y + math.sin(angle) * dist)
+
+        player = self.game.player if hasattr(self.game, 'player') else None
+        p_pos = tuple(player.model.getPos()) if player else None
+        if self.worker:
+            self.table.save_prev()
+            result = self.worker.collect()
+            attacks = 0
+            if result:
+                pos, heading, timer, tier, attacks = result
+                n = len(pos)
+                self.table.pos[:n] = pos
+                self.table.heading[:n] = heading
+                self.table.attack_timer[:n] = timer
+                self.table.tier[:n] = tier
+            for enemy in self.dying:
+                self.pool.release(enemy)
+            self.dying.clear()
+            self.worker.submit(dt, p_pos)
+        else:
+            attacks = self.sim.step(dt, p_pos)
+
+        if player:
+            for _ in range(attacks):
+                player.take_damage(self.attack_damage)
+            self.push_player()
+
+    def push_player(self):
+        """Выталкивает игрока из тел ближних врагов (по плоскости)."""
+        table = self.table
+        near = np.flatnonzero(table.tier[:table.count] == TIER_NEAR)
+        if not len(near):
+            return
+        pos = table.pos[near]
+        player = self.game.player.model
+        p = player.getPos()
+        dx = p.x - pos[:, 0]
+        dy = p.y - pos[:, 1]
+        dist = np.hypot(dx, dy)
+        touching = (dist < self.body_radius) & (dist > 1e-6) & (np.abs(p.z - pos[:, 2]) < self.body_height)
+        if not touching.any():
+            return
+        push = (self.body_radius - dist[touching]) / dist[touching]
+        player.setPos(p.x + float((dx[touching] * push).sum()), p.y + float((dy[touching] * push).sum()), p.z)
+
+    def first_hits(self, points, radius):
+        """
+        Попадания пачки точек (n, 3): для каждой - ближайший враг строго
+        ближе radius, каждый враг поражается не больше одного раза.
+        Кандидаты - враги из 3x3 соседних клеток
+        размером radius, найденные по отсортированным ключам клеток.
+        Возвращает список пар (индекс точки, враг).
+        """
+        table = self.table
+        n = table.count
+        if not n or not len(points):
+            return []
+        pos = table.pos[:n]
+        # С worker убитые ждут результата тика в таблице - в них уже не попасть
+        candidates = np.flatnonzero(self.alive_mask()) if self.dying else np.arange(n)
+        cells = np.floor(pos[candidates, :2] / radius).astype(np.int64)
+        keys = cells[:, 0] * KEY_STRIDE + cells[:, 1]
+        by_key = np.argsort(keys, kind="stable")
+        sorted_keys = keys[by_key]
+        order = candidates[by_key]  # строки таблицы в порядке ключей
+
+        point_cells = np.floor(points[:, :2] / radius).astype(np.int64)
+        offsets = np.array([dx * KEY_STRIDE + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+        queries = ((point_cells[:, 0] * KEY_STRIDE + point_cells[:, 1])[:, None] + offsets).ravel()
+        lo = np.searchsorted(sorted_keys, queries, "left")
+        counts = np.searchsorted(sorted_keys, queries, "right") - lo
+        total = int(counts.sum())
+        if not total:
+            return []
+        # Пары (точка, враг) для всех непустых клеток
+        point_idx = np.repeat(np.repeat(np.arange(len(points)), len(offsets)), counts)
+        starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        rows = order[np.arange(total) + starts]
+        d_sq = ((points[point_idx] - pos[rows]) ** 2).sum(axis=1)
+        close = d_sq < radius * radius
+        if not close.any():
+            return []
+
+        # По точкам в порядке, у каждой - от ближнего врага к дальнему
+        point_idx, rows, d_sq = point_idx[close], rows[close], d_sq[close]
+        by_point = np.lexsort((d_sq, point_idx))
+        hits = []
+        done_points = set()
+        hit_rows = set()
+        owners = table.owners
+        for i, row in zip(point_idx[by_point].tolist(), rows[by_point].tolist()):
+            if i in done_points or row in hit_rows:
+                continue
+            done_points.add(i)
+            hit_rows.add(row)
+            hits.append((i, owners[row]))
+        return hits
+
+    def alive_mask(self):
+        """Строки таблицы, кроме убитых, ждущих результата worker (self.dying)."""
+        alive = np.ones(self.table.count, bool)
+        alive[[enemy.row for enemy in self.dying]] = False
+        return alive
+
+    def snapshot(self):
+        """
+        Состояние врагов для сохранения (savestate.py): столбец -> массив по
+        строкам, номер тика AI LOD и позиция игрока на прошлом тике. С worker
+        счетчики LOD остаются в его процессе, а убитые еще в таблице.
+        """
+        n = self.table.count
+        state = {column: getattr(self.table, column)[:n] for column in SAVED_COLUMNS}
+        if self.dying:
+            alive = self.alive_mask()
+            state = {column: values[alive] for column, values in state.items()}
+        if self.sim:
+            return state, self.sim.lod_tick, self.sim.lod_origin
+        return state, 0, None
+
+    def restore(self, state, lod_tick, lod_origin):
+        """
+        Заменяет всех врагов сохраненными (см. snapshot). Ручки взаимозаменяемы:
+        живые враги получают строки сохранения, спавнятся и убираются только
+        лишние или недостающие.
+        """
+        if self.worker:
+            self.worker.collect()  # результат старых врагов уже не нужен
+        else:
+            self.sim.lod_origin = None  # уровни новых строк - из сохранения
+        for enemy in self.dying:
+            self.pool.release(enemy)
+        self.dying.clear()
+        self.pool.cancel_deferred()
+        for e in reversed(self.enemies[len(state["pos"]):]):
+            self.pool.release(e)
+        have = len(self.enemies)
+        for (x, y, _), speed in zip(state["pos"][have:].tolist(), state["speed"][have:].tolist()):
+            self.pool.acquire((x, y, 0), speed)
+        if self.worker:
+            load_rows(self.table, state)
+            self.worker.restore(state, lod_tick, lod_origin)
+        else:
+            self.sim.restore(state, lod_tick, lod_origin)
+
+    def tier_counts(self):
+        """Сколько врагов на каждом уровне AI LOD: [ближние, спящие]."""
+        return np.bincount(self.table.tier[:self.table.count], minlength=2).tolist()
+
+    def clear(self):
+        """
+        Конец игры: враги возвращаются в пул, таймеры и AI LOD сбрасываются;
+        пул, батч и процесс worker остаются для следующей.
+        """
+        self.restore({column: getattr(self.table, column)[:0] for column in SAVED_COLUMNS}, 0, None)
+        self.spawn_timer = 0
+        self.current_speed = self.base_speed
 
     def cleanup(self):
-        for e in self.enemies:
-            e.cleanup()
-        self.enemies = []
\ No newline at end of file
+        """Выход из программы (Game.destroy): процесс worker, пул и батч."""
+        if self.worker:
+            self.worker.close()
+            self.worker = None
+        self.dying.clear()
+        for e in list(self.enemies):
+            self.pool.release(e)
+        self.pool.clear()
+        self.batch.remove()
\ No newline at end of file
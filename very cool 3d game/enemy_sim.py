@@ -0,0 +1,304 @@
+"""
+Симуляция врагов без сцены: преследование, перезарядка атак, привязка к
+рельефу и два уровня детализации AI (ближние и спящие, TIER_*) над
+столбцами ComponentTable (см. ecs.py).
+
+EnemyManager гоняет ее у себя или, в режиме enemy_worker, в отдельном
+процессе (EnemyWorker): потоки Python не помогут - GIL. Тогда состояние
+врагов живет в процессе worker, а основному через общую память приходят
+позиции, курсы, перезарядки и уровни, через pipe - число ударов по игроку.
+Передача двойная: на тике t основной процесс забирает результат тика
+t-1 из слота (t-1) % 2 и отправляет команды (спавн, смерть) и позицию
+игрока для тика t, а worker считает его в слот t % 2, пока основной
+процесс занят остальными системами и отрисовкой. Враги отстают на тик,
+но прогон детерминирован: worker получает те же входы в том же порядке.
+"""
+from multiprocessing import shared_memory
+import multiprocessing
+import atexit
+import math
+import time
+
+import numpy as np
+
+from ecs import ComponentTable, TRANSFORM
+from navigation import FlowField
+
+# Уровни детализации ИИ (см. EnemySimulation.step)
+TIER_NEAR = 0     # каждый тик
+TIER_DORMANT = 1  # только перезарядка атаки, пока игрок не подойдет
+
+# Состояние врага - строка таблицы
+ENEMY_COLUMNS = dict(TRANSFORM,
+                     speed=(np.float64, 1),
+                     attack_timer=(np.float64, 1),
+                     tier=(np.int8, 1))
+
+# Что из состояния врага попадает в сохранение (savestate.py)
+SAVED_COLUMNS = ("pos", "heading", "speed", "attack_timer", "tier")
+
+# Слот результата worker на врага: позиция, курс, перезарядка атаки, уровень
+SLOT_FIELDS = ((np.float64, 3), (np.float64, 1), (np.float64, 1), (np.int8, 1))
+
+
+def load_rows(table, state):
+    """Строки 0..n-1 таблицы (уже добавленные) - из сохранения: столбец -> массив."""
+    n = len(state["pos"])
+    for column, values in state.items():
+        getattr(table, column)[:n] = values
+    table.prev[:n] = table.pos[:n]
+    table.shown[:n] = np.nan
+
+
+class EnemySimulation:
+    """
+    Поведение всех врагов таблицы table. heights(xs, ys) - высоты рельефа
+    пачкой, по ним же строится поле потока.
+    """
+    def __init__(self, table, heights):
+        self.table = table
+        self.heights = heights
+        # Направления к игроку, общие для всех врагов (см. navigation.py)
+        self.flow = FlowField(heights)
+
+        # Логика поведения (общая для всех врагов)
+        self.chase_radius = 40.0
+        self.attack_range = 2.0
+        self.attack_cooldown = 1.5
+
+        # AI LOD: ближние обновляются каждый тик, дальние стоят (дальше
+        # chase_radius враг и так никуда не идет). Уровень пересчитывается
+        # по доле врагов за тик (без всплесков); запас near_radius над
+        # радиусом преследования больше, чем игрок пробегает между
+        # пересчетами, а после рывка (blink) пересчитываются все сразу.
+        self.near_radius = 55.0   # chase_radius (40) + запас
+        self.lod_interval = 4
+        self.retier_jump = 7.5    # игрок сместился за тик дальше - пересчет всех
+        self.lod_tick = 0
+        self.lod_origin = None    # (x, y, z) игрока на прошлом тике
+
+    def add(self, owner, x, y, z, speed):
+        xyz = (x, y, z)
+        # shown = nan: модель встанет на место при ближайшей синхронизации;
+        # уровень - до первого пересчета (на первом тике пересчитываются все)
+        row = self.table.add(owner, pos=xyz, prev=xyz, shown=np.nan, speed=speed, tier=TIER_DORMANT)
+        if self.lod_origin is not None:
+            self.retier(np.array([row]), self.lod_origin)
+        return row
+
+    def step(self, dt, player):
+        """Тик; player - (x, y, z) игрока или None. Возвращает число ударов по игроку."""
+        table = self.table
+        n = table.count
+        table.save_prev()
+        # Перезарядка атак - у всех сразу, уровень детализации ей не нужен
+        timers = table.attack_timer[:n]
+        timers -= dt
+        np.maximum(timers, 0.0, out=timers)
+        if player is None or not n:
+            return 0
+
+        self.flow.update(player[0], player[1])
+        # Доля врагов за тик: пересчет уровня. Если игрок прыгнул
+        # дальше запаса - пересчитываем всех
+        self.lod_tick += 1
+        origin = self.lod_origin
+        self.lod_origin = player
+        if origin is None or math.dist(player, origin) > self.retier_jump:
+            self.retier(np.arange(n), player)
+        else:
+            self.retier(np.arange(self.lod_tick % self.lod_interval, n, self.lod_interval), player)
+
+        near = np.flatnonzero(table.tier[:n] == TIER_NEAR)
+        if not len(near):
+            return 0
+        return self.chase(near, player, dt)
+
+    def restore(self, state, lod_tick, lod_origin):
+        """
+        После добавления строк из сохранения: их столбцы и счетчики AI LOD.
+        Поле потока перестроится на ближайшем тике.
+        """
+        load_rows(self.table, state)
+        self.lod_tick = lod_tick
+        self.lod_origin = lod_origin
+        self.flow.center = None
+
+    def retier(self, rows, player):
+        """Уровни детализации строк rows по расстоянию до игрока на плоскости."""
+        pos = self.table.pos
+        d_sq = (pos[rows, 0] - player[0]) ** 2 + (pos[rows, 1] - player[1]) ** 2
+        self.table.tier[rows] = np.where(d_sq <= self.near_radius ** 2, TIER_NEAR, TIER_DORMANT)
+
+    def chase(self, rows, player, dt):
+        """Движение, привязка к рельефу и атаки врагов rows одной пачкой."""
+        table = self.table
+        to_player = np.array(player) - table.pos[rows]
+        dist = np.sqrt((to_player ** 2).sum(axis=1))
+        # Преследование только если близко
+        chasing = dist <= self.chase_radius
+        rows, to_player, dist = rows[chasing], to_player[chasing], dist[chasing]
+        if not len(rows):
+            return 0
+
+        # Путь в обход крутых склонов - из общего поля потока; рядом с
+        # игроком (и вне поля) - напрямую
+        flow, has_flow = self.flow.sample_many(table.pos[rows, 0], table.pos[rows, 1])
+        flat = to_player[:, :2]
+        length = np.hypot(flat[:, 0], flat[:, 1])
+        straight = flat / np.where(length > 0.001, length, 1.0)[:, None]
+        direction = np.where(has_flow[:, None], flow[:, :2], straight)
+        table.heading[rows] = np.where(has_flow, flow[:, 2], np.degrees(np.arctan2(-straight[:, 0], straight[:, 1])))
+
+        # Движение с привязкой к рельефу: высоты - одним запросом на всех
+        moving = dist > self.attack_range
+        step = rows[moving]
+        if len(step):
+            xy = table.pos[step, :2] + direction[moving] * (table.speed[step] * dt)[:, None]
+            table.pos[step, :2] = xy
+            table.pos[step, 2] = self.heights(xy[:, 0], xy[:, 1]) + 1.0
+
+        # Атака (Удар по таймеру)
+        attackers = rows[~moving]
+        attackers = attackers[table.attack_timer[attackers] <= 0]
+        if len(attackers):
+            table.attack_timer[attackers] = self.attack_cooldown
+            table.pos[attackers, 2] += 0.5 # Визуальный "прыжок" при ударе
+        return len(attackers)
+
+
+def slot_arrays(buf, capacity, slot):
+    """Массивы слота slot (0 или 1) поверх общей памяти: позиции, курсы, перезарядки, уровни."""
+    arrays = []
+    offset = 0
+    for s in range(2):
+        for dtype, width in SLOT_FIELDS:
+            shape = (capacity,) if width == 1 else (capacity, width)
+            array = np.ndarray(shape, dtype, buf, offset)
+            offset += array.nbytes
+            if s == slot:
+                arrays.append(array)
+    return arrays
+
+
+def slot_bytes(capacity):
+    return 2 * capacity * sum(np.dtype(dtype).itemsize * width for dtype, width in SLOT_FIELDS)
+
+
+class WorkerRow:
+    """Владелец строки в таблице worker (модели там нет)."""
+    __slots__ = ("row",)
+
+
+def worker_main(conn, shm_name, capacity, heights):
+    """Процесс worker: применяет команды, считает тик, пишет результат в слот тика."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = [slot_arrays(shm.buf, capacity, slot) for slot in range(2)]
+    table = ComponentTable("enemies", ENEMY_COLUMNS, capacity)
+    sim = EnemySimulation(table, heights)
+    pos = heading = timer = tier = None
+    try:
+        while True:
+            job = conn.recv()
+            if job is None:
+                break
+            tick, commands, player, dt = job
+            for command in commands:
+                if command[0] == "spawn":
+                    sim.add(WorkerRow(), *command[1:])
+                elif command[0] == "kill":
+                    table.remove(table.owners[command[1]])
+                else:
+                    # restore: все враги заменяются сохраненными
+                    state, lod_tick, lod_origin = command[1:]
+                    while table.count:
+                        table.remove(table.owners[-1])
+                    for (x, y, z), speed in zip(state["pos"].tolist(), state["speed"].tolist()):
+                        sim.add(WorkerRow(), x, y, z, speed)
+                    sim.restore(state, lod_tick, lod_origin)
+            attacks = sim.step(dt, player)
+            n = table.count
+            pos, heading, timer, tier = slots[tick % 2]
+            pos[:n] = table.pos[:n]
+            heading[:n] = table.heading[:n]
+            timer[:n] = table.attack_timer[:n]
+            tier[:n] = table.tier[:n]
+            conn.send((tick, n, attacks))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        # Виды numpy держат буфер: без них close() не пройдет
+        del slots, pos, heading, timer, tier
+        shm.close()
+
+
+class EnemyWorker:
+    """
+    Основная сторона worker. Тик: collect() - результат прошлого тика,
+    потом spawn()/kill() в том же порядке, что и в таблице основного
+    процесса, потом submit(). capacity - максимум врагов (размер пула).
+    """
+    def __init__(self, capacity, heights):
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_bytes(capacity))
+        self.slots = [slot_arrays(self.shm.buf, capacity, slot) for slot in range(2)]
+        # spawn, а не fork: в процессе уже есть Panda3D с ее потоками
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child, self.shm.name, capacity, heights),
+                                       name="EnemyWorker", daemon=True)
+        self.process.start()
+        child.close()
+        atexit.register(self.close)
+
+        self.commands = []    # команды для следующего submit
+        self.tick = 0         # номер следующего отправляемого тика
+        self.pending = False  # тик отправлен, результат еще не забран
+        self.wait_time = 0.0  # сколько основной процесс прождал worker, с
+
+    def spawn(self, x, y, z, speed):
+        self.commands.append(("spawn", x, y, z, speed))
+
+    def kill(self, row):
+        self.commands.append(("kill", row))
+
+    def restore(self, state, lod_tick, lod_origin):
+        """Замена всех врагов сохраненными; команды, накопленные до нее, уже не нужны."""
+        self.commands = [("restore", state, lod_tick, lod_origin)]
+
+    def submit(self, dt, player):
+        self.conn.send((self.tick, self.commands, player, dt))
+        self.commands = []
+        self.pending = True
+        self.tick += 1
+
+    def collect(self):
+        """
+        Ждет отправленный тик: (позиции, курсы, перезарядки, уровни, число
+        ударов) с видами на слот, до следующего submit. None - ждать нечего.
+        """
+        if not self.pending:
+            return None
+        started = time.perf_counter()
+        tick, count, attacks = self.conn.recv()
+        self.wait_time += time.perf_counter() - started
+        self.pending = False
+        pos, heading, timer, tier = self.slots[tick % 2]
+        return pos[:count], heading[:count], timer[:count], tier[:count], attacks
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+        self.conn.close()
+        self.slots = None
+        self.shm.close()
+        self.shm.unlink()
+        atexit.unregister(self.close)
@@ -0,0 +1,88 @@
+"""
+Retained-mode HUD: виджеты создаются один раз и обновляются только
+когда меняется привязанное к ним значение. Всплывающие элементы
+(вспышка урона, уведомление) переиспользуются, а их таймеры скрытия
+отменяются при повторном показе.
+"""
+
+
+class Observable:
+    """Значение, которое сообщает подписчикам о своем изменении."""
+    __slots__ = ("value", "subscribers")
+
+    def __init__(self, value=None):
+        self.value = value
+        self.subscribers = []
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        if value == self.value:
+            return
+        self.value = value
+        for fn in self.subscribers:
+            fn(value)
+
+    def subscribe(self, fn, call_now=True):
+        self.subscribers.append(fn)
+        if call_now:
+            fn(self.value)
+        return fn
+
+    def unsubscribe(self, fn):
+        if fn in self.subscribers:
+            self.subscribers.remove(fn)
+
+
+class Binding:
+    """
+    Связь значения с текстом виджета: text = fmt(value). Текст ставится
+    только если он действительно другой (HP 99.6 и 99.2 - одно и то же "99").
+    """
+    def __init__(self, source, widget, fmt=str):
+        self.source = source
+        self.widget = widget
+        self.fmt = fmt
+        self.text = None
+        source.subscribe(self.refresh)
+
+    def refresh(self, value):
+        text = self.fmt(value)
+        if text != self.text:
+            self.text = text
+            self.widget['text'] = text
+
+    def unbind(self):
+        self.source.unsubscribe(self.refresh)
+
+
+class TimedWidget:
+    """
+    Виджет, который показывается на время. Создается один раз; повторный
+    show() продлевает показ, отменяя прежний таймер скрытия.
+    """
+    def __init__(self, game, widget, name):
+        self.game = game
+        self.widget = widget
+        self.task_name = f"hud-{name}-{id(self)}"
+        widget.hide()
+
+    def show(self, duration, text=None):
+        if text is not None and self.widget['text'] != text:
+            self.widget['text'] = text
+        self.widget.show()
+        self.game.taskMgr.remove(self.task_name)
+        self.game.taskMgr.doMethodLater(duration, self.expire, self.task_name)
+
+    def expire(self, task):
+        self.widget.hide()
+        return task.done
+
+    def cancel(self):
+        self.game.taskMgr.remove(self.task_name)
+        self.widget.hide()
+
+    def destroy(self):
+        self.game.taskMgr.remove(self.task_name)
+        self.widget.destroy()
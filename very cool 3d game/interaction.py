@@ -0,0 +1,64 @@
+from spatial import SpatialHash
+import math
+
+# Событие messenger: аргумент - новая цель или None
+TARGET_CHANGED = "interaction-target-changed"
+
+
+class InteractionSystem:
+    """
+    Всё, с чем можно взаимодействовать клавишей E. Объекты регистрируются
+    в сетке со своей позицией; каждый кадр проверяются только те, что
+    ближе reach и попадают в конус взгляда. Смена цели рассылается
+    событием TARGET_CHANGED, поэтому UI трогается только при смене.
+
+    Интерактивный объект - любой объект с методом interact() и
+    атрибутом interact_prompt (текст подсказки).
+    """
+    def __init__(self, game, reach=15.0, view_angle=10.0, cell_size=8.0):
+        self.game = game
+        self.reach = reach
+        self.min_cos = math.cos(math.radians(view_angle))
+        self.grid = SpatialHash(cell_size)
+        self.target = None
+
+    def register(self, obj, pos):
+        self.grid.insert(obj, pos[0], pos[1], pos[2])
+
+    def unregister(self, obj):
+        self.grid.remove(obj)
+        if obj is self.target:
+            self.set_target(None)
+
+    def update(self, eye, forward):
+        """Выбирает цель: ближайшую к центру взгляда в пределах reach."""
+        ex, ey, ez = eye
+        fx, fy, fz = forward
+        reach_sq = self.reach * self.reach
+        best = None
+        best_cos = self.min_cos
+        positions = self.grid.positions
+        for obj in self.grid.query(ex, ey, self.reach):
+            ox, oy, oz = positions[obj]
+            dx, dy, dz = ox - ex, oy - ey, oz - ez
+            dist_sq = dx * dx + dy * dy + dz * dz
+            if dist_sq > reach_sq or dist_sq == 0.0:
+                continue
+            cos = (dx * fx + dy * fy + dz * fz) / math.sqrt(dist_sq)
+            if cos > best_cos:
+                best, best_cos = obj, cos
+        self.set_target(best)
+        return best
+
+    def set_target(self, obj):
+        if obj is not self.target:
+            self.target = obj
+            self.game.messenger.send(TARGET_CHANGED, [obj])
+
+    def interact(self):
+        if self.target:
+            self.target.interact()
+
+    def clear(self):
+        self.grid.clear()
+        self.set_target(None)
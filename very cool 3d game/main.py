@@ -1,188 +1,240 @@
 from direct.showbase.ShowBase import ShowBase
-from panda3d.core import WindowProperties, AmbientLight, DirectionalLight, Vec4, Fog
-from panda3d.core import CollisionTraverser, CollisionHandlerPusher, GeomVertexFormat, GeomVertexData, Geom, GeomTriangles, GeomNode, GeomVertexWriter
-from panda3d.core import BitMask32, CollisionNode, CollisionSphere
-from direct.gui.DirectGui import *
-import sys
-import math
+from panda3d.core import WindowProperties, AmbientLight, DirectionalLight, Vec3, Vec4, Fog
+from panda3d.core import CollisionTraverser, CollisionHandlerPusher
+from panda3d.core import ClockObject, GraphicsWindow, PerspectiveLens, loadPrcFileData
 import random
 import os
+import numpy as np
+import argparse
+import atexit
+import time
 
 from player import Player
 from enemies import EnemyManager
 from book import BookManager
 from ui import UIManager
+from terrain import ProceduralTerrain, ChunkedTerrain, TerrainCache
+from pool import ObjectPool, POOL_DEFAULTS
+from assets import AssetRegistry
+from interaction import InteractionSystem
+from scheduler import SimScheduler
+from pilots import PILOTS
+from profiler import FrameProfiler
+from replay import InputRecorder, ReplayPilot, load_header, count_ticks
+import savestate
+from ecs import ComponentTable, TRANSFORM, sync_nodes
+
+PROJECTILE_HIT_RADIUS = 1.5
+
+# Состояние снаряда - строка в Game.projectile_table
+PROJECTILE_COLUMNS = dict(TRANSFORM,
+                          velocity=(np.float64, 3),
+                          lifetime=(np.float64, 1))
 
 # --- НОВОЕ: Класс снаряда ---
 class Projectile:
-    def __init__(self, game, pos, direction):
+    """Ручка снаряда для пула: модель и номер строки в Game.projectile_table."""
+    model_name = "smiley"
+
+    def __init__(self, game):
         self.game = game
         self.speed = 40.0
-        self.lifetime = 3.0
-        self.direction = direction
-        self.direction.normalize()
+        self.row = None
         
-        self.model = game.loader.loadModel("models/smiley")
+        self.model = game.assets.model(self.model_name)
         self.model.setScale(0.2)
         self.model.setColor(0, 1, 1, 1) # Cyan color
-        self.model.setPos(pos)
         self.model.reparentTo(game.render)
+        self.model.stash()
         
-        # Коллизия снаряда
-        c_node = CollisionNode('projectile')
-        c_node.addSolid(CollisionSphere(0, 0, 0, 1))
-        c_node.setIntoCollideMask(BitMask32.allOff())
-        # Бьет по маске 0 (Враги)
-        c_node.setFromCollideMask(BitMask32.bit(0)) 
-        
-        self.collider = self.model.attachNewNode(c_node)
-        self.collider.setPythonTag("projectile", self)
-        
-        # Мы проверяем попадания вручную в update, чтобы не усложнять хендлеры
-        
-    def update(self, dt):
-        self.lifetime -= dt
-        if self.lifetime <= 0: return False
-        
-        self.model.setPos(self.model.getPos() + self.direction * self.speed * dt)
-        
-        # Простая проверка попаданий по врагам
-        for enemy in self.game.enemy_manager.enemies:
-            if (enemy.model.getPos() - self.model.getPos()).length() < 1.5:
-                enemy.take_damage()
-                return False # Снаряд уничтожен
-                
-        return True
+        # Полет и попадания считаются пачкой в Game.update
+
+    def spawn(self, pos, direction):
+        direction = Vec3(direction)
+        direction.normalize()
+        pos = tuple(pos)
+        self.game.projectile_table.add(self, pos=pos, prev=pos, shown=np.nan,
+                                       velocity=tuple(direction * self.speed), lifetime=3.0)
+        self.model.unstash()
+
+    def despawn(self):
+        self.game.projectile_table.remove(self)
+        self.model.stash()
 
     def destroy(self):
         self.model.removeNode()
 
-class ProceduralTerrain:
-    def __init__(self, game, size=256, scale=2.0):
-        self.game = game
-        self.size = size 
-        self.scale = scale 
-        self.root = game.render.attachNewNode("Terrain")
-        self.generate()
-        self.apply_texture() 
-
-    def get_height(self, x, y):
-        val = 0
-        val += 6.0 * math.sin(x / 15.0) * math.cos(y / 15.0)
-        val += 2.0 * math.sin(x / 5.0 + y / 5.0)
-        
-        dist_sq = x*x + y*y
-        if dist_sq < 100:
-            val *= (dist_sq / 100.0)
-        return val
-
-    def generate(self):
-        format = GeomVertexFormat.getV3n3t2()
-        vdata = GeomVertexData('terrain', format, Geom.UHStatic)
-        
-        vertex = GeomVertexWriter(vdata, 'vertex')
-        normal = GeomVertexWriter(vdata, 'normal')
-        texcoord = GeomVertexWriter(vdata, 'texcoord')
-        
-        offset = (self.size * self.scale) / 2
-        
-        for y in range(self.size):
-            for x in range(self.size):
-                px = (x * self.scale) - offset
-                py = (y * self.scale) - offset
-                pz = self.get_height(px, py)
-                
-                vertex.addData3(px, py, pz)
-                normal.addData3(0, 0, 1)
-                texcoord.addData2(x / 10.0, y / 10.0)
-
-        prim = GeomTriangles(Geom.UHStatic)
-        
-        for y in range(self.size - 1):
-            for x in range(self.size - 1):
-                v1 = y * self.size + x
-                v2 = y * self.size + (x + 1)
-                v3 = (y + 1) * self.size + (x + 1)
-                v4 = (y + 1) * self.size + x
-                
-                prim.addVertices(v1, v2, v3)
-                prim.addVertices(v1, v3, v4)
-                
-        geom = Geom(vdata)
-        geom.addPrimitive(prim)
-        node = GeomNode('TerrainMesh')
-        node.addGeom(geom)
-        
-        self.mesh_np = self.root.attachNewNode(node)
-        self.mesh_np.setCollideMask(BitMask32.bit(2))
-
-    def apply_texture(self):
-        if os.path.exists("textures/floor.png"):
-            try:
-                tex = self.game.loader.loadTexture("textures/floor.png")
-                self.mesh_np.setTexture(tex)
-                self.mesh_np.setColor(1, 1, 1, 1)
-            except:
-                self.mesh_np.setColor(0.3, 0.5, 0.3)
-        else:
-            self.mesh_np.setColor(0.3, 0.5, 0.3)
+# Настройки Panda3D для режимов без дисплея и GPU
+HEADLESS_PRC = {
+    "offscreen": "window-type offscreen\nload-display p3tinydisplay\nwin-size 320 240\n",
+    "none": "window-type none\n",
+}
 
 class Game(ShowBase):
-    def __init__(self):
+    def __init__(self, chunked_terrain=False, batch_rendering=True, pool_sizes=None,
+                 headless=None, seed=None, terrain_size=256, terrain_cache=False, record=None,
+                 enemy_worker=False, load=None, autosave=None):
+        # headless: None - обычное окно, "offscreen" - программный рендер
+        # в буфер, "none" - без рендера вообще. Меню пропускается.
+        self.headless = headless
+        if headless:
+            loadPrcFileData("headless", HEADLESS_PRC[headless] + "audio-library-name null\n")
+        # record: путь, куда писать ввод первой игровой сессии (replay.py);
+        # для записи зерно нужно всегда, иначе ее не воспроизвести
+        self.record_path = record
+        self.input_recorder = None
+        # load: сохранение (savestate.py), с которого начнется первая сессия;
+        # autosave: куда сохранять сессию по таймеру
+        self.load_path = load
+        self.autosave = None
+        self.autosave_path = autosave
+        if seed is None and record:
+            seed = random.randrange(2 ** 31)
+        self.seed = seed
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
         ShowBase.__init__(self)
+        if self.camera is None:
+            # Без окна ShowBase не создает камеру, а игроку она нужна как точка взгляда
+            self.camera = self.render.attachNewNode("camera")
+            self.camLens = PerspectiveLens()
 
-        props = WindowProperties()
-        props.setTitle("The Void of Ignorance")
-        props.setCursorHidden(False)
-        self.win.requestProperties(props)
+        # Размеры пулов: имя -> (заранее, максимум), см. pool.POOL_DEFAULTS
+        self.pool_sizes = dict(POOL_DEFAULTS, **(pool_sizes or {}))
+
+        # Враги и книги рисуются пачками через RigidBodyCombiner
+        self.batch_rendering = batch_rendering
+        # Симуляция врагов в отдельном процессе (см. enemy_sim.py)
+        self.enemy_worker = enemy_worker
+
+        # Бесконечный мир из чанков или классическая карта 256x256
+        self.chunked_terrain = chunked_terrain
+        self.terrain_size = terrain_size
+        # Граница карты для спавна; None - без ограничений
+        self.world_limit = None if chunked_terrain else 120
+
+        if self.has_window():
+            props = WindowProperties()
+            props.setTitle("The Void of Ignorance")
+            props.setCursorHidden(False)
+            self.win.requestProperties(props)
         
         self.cTrav = CollisionTraverser()
         self.pusher = CollisionHandlerPusher()
+        # Коллизии - шаг симуляции (см. traverse_collisions), а не кадра
+        self.taskMgr.remove("collisionLoop")
+        self.scheduler = SimScheduler(self)
+        # F3 - HUD профайлера, F4 - запись трассы (см. profiler.py)
+        self.profiler = FrameProfiler(self)
         
+        # Все модели и текстуры - через реестр; грузятся, пока открыто меню
+        self.assets = AssetRegistry(self)
+
         self.ui = UIManager(self)
-        self.ui.show_main_menu(self.start_game)
+        if not headless:
+            self.ui.show_main_menu(self.start_game)
+            self.assets.preload()
         self.is_game_running = False
         
-        self.projectiles = [] # Список снарядов
+        # Снаряды: состояние - столбцы таблицы, projectiles - ручки по строкам
+        self.projectile_table = ComponentTable("projectiles", PROJECTILE_COLUMNS, self.pool_sizes["projectile"][1])
+        self.projectiles = self.projectile_table.owners
+        # Заполняется в start_game, когда реестр ассетов уже загрузил модели
+        self.projectile_pool = ObjectPool("projectile", lambda: Projectile(self), 0, self.pool_sizes["projectile"][1],
+                                          self.assets, Projectile.model_name)
+        self.terrain = None
+        # Кэш .bam по умолчанию выключен: чтение файла не быстрее пересборки
+        # (см. bench_terrain_cache), включать только для проверки
+        self.terrain_cache = TerrainCache() if terrain_cache else None
+        self.terrain_time = 0.0  # сколько заняло создание террейна, с
 
-    def start_game(self):
-        self.ui.hide_all_menus()
-        
+        if headless:
+            self.start_game()
+
+    def has_window(self):
+        """Настоящее окно (не offscreen-буфер и не режим без окна)."""
+        return isinstance(self.win, GraphicsWindow)
+
+    def set_mouse_captured(self, captured):
+        """Скрытый курсор + относительная мышь в игре, обычный курсор в меню."""
+        if not self.has_window(): return
         props = WindowProperties()
-        props.setCursorHidden(True)
-        props.setMouseMode(WindowProperties.M_relative)
+        props.setCursorHidden(captured)
+        props.setMouseMode(WindowProperties.M_relative if captured else WindowProperties.M_absolute)
         self.win.requestProperties(props)
+
+    def start_game(self):
+        self.ui.hide_all_menus()
+        self.set_mouse_captured(True)
         self.is_game_running = True
+        if self.headless or self.record_path:
+            # Прогон без окна и запись не должны зависеть от того, когда
+            # догрузились модели: отложенный спавн сдвинул бы игру на кадры
+            self.assets.finish()
 
-        self.setup_environment()
+        # Теплый рестарт: рельеф, небо, свет, туман, игрок и пулы остаются
+        # с прошлой игры, сбрасывается только игровое состояние
+        if self.terrain is None:
+            self.setup_environment()
+        else:
+            self.terrain.show()
+            self.skybox.unstash()
+        self.projectile_pool.prewarm(self.pool_sizes["projectile"][0])
         
-        self.player = Player(self)
-        self.book_manager = BookManager(self)
-        self.enemy_manager = EnemyManager(self)
+        if hasattr(self, 'player'):
+            self.player.reset()
+        else:
+            self.interaction = InteractionSystem(self)
+            self.player = Player(self)
+            self.book_manager = BookManager(self)
+            self.enemy_manager = EnemyManager(self)
         
         self.ui.setup_game_ui(self.player)
 
         self.book_manager.start_spawning()
-        self.enemy_manager.start_spawning()
-        self.taskMgr.add(self.update, "MainUpdate")
+
+        # Порядок систем внутри тика фиксирован
+        self.scheduler.add("abilities", self.player.abilities.update)
+        self.scheduler.add("player", self.player.update)
+        self.scheduler.add("books", self.book_manager.update)
+        self.scheduler.add("enemies", self.enemy_manager.update)
+        self.scheduler.add("projectiles", self.update)
+        self.scheduler.add("collisions", self.traverse_collisions)
+        if self.record_path:
+            self.input_recorder = InputRecorder(self, self.record_path)
+            self.record_path = None
+            self.scheduler.add("recorder", self.input_recorder, before="player")
+        if self.autosave_path:
+            self.autosave = savestate.AutoSave(self, self.autosave_path)
+            self.scheduler.add("autosave", self.autosave)
+        if self.load_path:
+            savestate.load(self, self.load_path)
+            self.load_path = None
+        self.scheduler.paused = False
+        self.scheduler.start()
+        # После интерполяции, перед отрисовкой (igLoop = 50)
+        self.taskMgr.add(self.render_update, "RenderUpdate", sort=45)
 
     def setup_environment(self):
-        self.terrain = ProceduralTerrain(self)
+        started = time.perf_counter()
+        if self.chunked_terrain:
+            self.terrain = ChunkedTerrain(self)
+        else:
+            self.terrain = ProceduralTerrain(self, size=self.terrain_size, cache=self.terrain_cache)
+        self.terrain_time = time.perf_counter() - started
         
-        self.skybox = self.loader.loadModel("models/box")
+        self.skybox = self.assets.model("box")
         self.skybox.setScale(500)
         self.skybox.setBin('background', 0)
         self.skybox.setDepthWrite(False)
         self.skybox.setLightOff()
         self.skybox.reparentTo(self.render)
 
-        if os.path.exists("textures/skybox.jpg"):
-            try:
-                sky_tex = self.loader.loadTexture("textures/skybox.jpg")
-                self.skybox.setTexture(sky_tex)
-                self.skybox.setColor(1, 1, 1, 1)
-            except:
-                self.skybox.setColor(0.1, 0.1, 0.15, 1)
+        sky_tex = self.assets.texture("skybox")
+        if sky_tex:
+            self.skybox.setTexture(sky_tex)
+            self.skybox.setColor(1, 1, 1, 1)
         else:
             self.skybox.setColor(0.1, 0.1, 0.15, 1)
 
@@ -202,66 +254,205 @@ class Game(ShowBase):
         self.render.setFog(myFog)
 
     def get_terrain_height(self, x, y):
-        if hasattr(self, 'terrain'):
+        if self.terrain:
             return self.terrain.get_height(x, y)
         return 0.0
 
-    # --- НОВОЕ: Спавн снаряда ---
-    def spawn_projectile(self, pos, direction):
-        p = Projectile(self, pos, direction)
-        self.projectiles.append(p)
+    def get_terrain_heights(self, xs, ys):
+        """Высоты рельефа для массивов координат (один вызов на всю пачку)."""
+        if self.terrain:
+            return self.terrain.get_heights(xs, ys)
+        return np.zeros(np.shape(xs))
 
-    def update(self, task):
-        if not self.is_game_running: return task.cont
+    def traverse_collisions(self, dt):
+        self.cTrav.traverse(self.render)
+
+    def render_update(self, task):
         if hasattr(self, 'skybox'): 
             self.skybox.setPos(self.camera.getPos())
+        # Между тиками состояние целое - здесь и сохраняемся
+        if self.autosave:
+            self.autosave.write()
+        # Узлы врагов и снарядов - раз в кадр, по столбцам таблиц
+        sync_nodes(self.enemy_manager.table, self.scheduler.alpha)
+        sync_nodes(self.projectile_table, self.scheduler.alpha)
+        self.enemy_manager.batch.flush()
+        self.book_manager.regions.flush()
+        return task.cont
+
+    # --- НОВОЕ: Спавн снаряда ---
+    def spawn_projectile(self, pos, direction):
+        # Строку в projectile_table снаряд занимает сам (Projectile.spawn)
+        return self.projectile_pool.acquire(pos, direction)
+
+    def quick_save(self):
+        if not self.is_game_running: return
+        seconds = savestate.save(self, savestate.QUICKSAVE)
+        self.ui.show_notification(f"Saved ({seconds * 1000:.1f} ms)")
+
+    def quick_load(self):
+        if not self.is_game_running or not os.path.exists(savestate.QUICKSAVE): return
+        try:
+            seconds = savestate.load(self, savestate.QUICKSAVE)
+        except (OSError, ValueError) as e:
+            self.ui.show_notification(f"Load failed: {e}")
+            return
+        self.ui.show_notification(f"Loaded ({seconds * 1000:.1f} ms)")
+
+    def pool_stats(self):
+        """Статистика всех пулов: имя -> dict (hits, misses, high_water, ...)."""
+        pools = [self.projectile_pool]
+        if hasattr(self, 'enemy_manager'): pools.append(self.enemy_manager.pool)
+        if hasattr(self, 'book_manager'): pools.append(self.book_manager.pool)
+        return {p.name: p.stats() for p in pools}
+
+    def update(self, dt):
+        if not self.is_game_running: return
         
         if self.player.health <= 0:
             self.game_over()
-            return task.done
+            return
 
         # --- НОВОЕ: Обновление снарядов ---
-        active_projs = []
-        for p in self.projectiles:
-            if p.update(globalClock.getDt()):
-                active_projs.append(p)
-            else:
-                p.destroy()
-        self.projectiles = active_projs
-
-        self.ui.update(globalClock.getDt())
-        return task.cont
+        table = self.projectile_table
+        n = table.count
+        if not n: return
+        table.save_prev()
+        lifetime = table.lifetime[:n]
+        lifetime -= dt
+        table.pos[:n] += table.velocity[:n] * dt
+        # Удаление переставляет строки, поэтому сначала собираем ручки
+        for p in [table.owners[row] for row in np.flatnonzero(lifetime <= 0).tolist()]:
+            self.projectile_pool.release(p)
+
+        # Попадания: каждый снаряд смотрит только соседние клетки
+        hits = self.enemy_manager.first_hits(table.pos[:table.count], PROJECTILE_HIT_RADIUS)
+        for p, enemy in [(table.owners[i], enemy) for i, enemy in hits]:
+            enemy.take_damage()
+            self.projectile_pool.release(p)
+
+    def simulate(self, ticks, pilot=None, ticks_per_frame=1):
+        """
+        Прогон ticks тиков быстрее реального времени: часы переводятся в
+        режим non-real-time, каждый кадр - ровно ticks_per_frame тиков
+        (больше - реже рисуем offscreen). pilot(dt) - скрипт игрока,
+        вызывается первой системой тика (до записи ввода, если она идет).
+        Останавливается раньше, если игрок погиб.
+        """
+        clock = ClockObject.getGlobalClock()
+        clock.setMode(ClockObject.MNonRealTime)
+        clock.setFrameRate(1.0 / (self.scheduler.dt * ticks_per_frame))
+        self.scheduler.max_steps = max(self.scheduler.max_steps, ticks_per_frame)
+        if pilot:
+            self.scheduler.add("pilot", pilot, before="abilities")
+
+        start_tick = self.scheduler.tick
+        started = time.perf_counter()
+        while self.scheduler.tick - start_tick < ticks and self.is_game_running:
+            self.taskMgr.step()
+        wall = time.perf_counter() - started
+
+        done = self.scheduler.tick - start_tick
+        return {
+            "ticks": done,
+            "sim_seconds": done * self.scheduler.dt,
+            "wall_seconds": wall,
+            "ticks_per_second": done / wall if wall else 0.0,
+            "player_alive": self.player.health > 0,
+        }
 
     def game_over(self):
         self.is_game_running = False
-        props = WindowProperties()
-        props.setCursorHidden(False)
-        props.setMouseMode(WindowProperties.M_absolute)
-        self.win.requestProperties(props)
+        self.scheduler.paused = True
+        self.set_mouse_captured(False)
         self.ui.show_game_over()
         
     def exit_to_menu(self):
         self.is_game_running = False
-        self.taskMgr.remove("MainUpdate")
-        self.taskMgr.remove("PlayerUpdate")
-        self.taskMgr.remove("EnemySpawn")
-        self.taskMgr.remove("BookSpawn")
-        self.taskMgr.remove("InitialUnlock")
+        self.scheduler.stop()
+        self.scheduler.clear()
+        self.taskMgr.remove("RenderUpdate")
         
-        if hasattr(self, 'player'): self.player.cleanup()
-        if hasattr(self, 'enemy_manager'): self.enemy_manager.cleanup()
-        if hasattr(self, 'book_manager'): self.book_manager.cleanup()
-        if hasattr(self, 'terrain'): self.terrain.root.removeNode()
-        if hasattr(self, 'skybox'): self.skybox.removeNode()
+        if self.input_recorder:
+            self.input_recorder.close()
+        # Сущности - обратно в пулы; мир и сами объекты ждут следующей игры
+        if hasattr(self, 'player'): self.player.suspend()
+        if hasattr(self, 'enemy_manager'): self.enemy_manager.clear()
+        if hasattr(self, 'book_manager'): self.book_manager.clear()
+        if hasattr(self, 'interaction'): self.interaction.clear()
+        if self.terrain: self.terrain.hide()
+        if hasattr(self, 'skybox'): self.skybox.stash()
         
-        for p in self.projectiles: p.destroy()
-        self.projectiles = []
+        for p in list(self.projectiles): self.projectile_pool.release(p)
+        self.projectile_pool.cancel_deferred()
         
-        props = WindowProperties()
-        props.setCursorHidden(False)
-        props.setMouseMode(WindowProperties.M_absolute)
-        self.win.requestProperties(props)
+        self.set_mouse_captured(False)
         self.ui.show_main_menu(self.start_game)
 
-game = Game()
-game.run()
+    def destroy(self):
+        # Выход из программы (ShowBase вызывает и при выходе интерпретатора):
+        # то, что переживает рестарты, освобождается здесь
+        if hasattr(self, 'enemy_manager'):
+            self.enemy_manager.cleanup()
+            del self.enemy_manager
+        ShowBase.destroy(self)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="The Void of Ignorance")
+    parser.add_argument("--chunked", action="store_true", help="бесконечный террейн из чанков")
+    parser.add_argument("--no-batching", action="store_true", help="рисовать врагов и книги по одному")
+    parser.add_argument("--enemy-worker", action="store_true", help="считать врагов в отдельном процессе")
+    parser.add_argument("--headless", choices=sorted(HEADLESS_PRC), help="без окна: offscreen-рендер или без рендера")
+    parser.add_argument("--seed", type=int, help="зерно для всех генераторов случайных чисел")
+    parser.add_argument("--ticks", type=int, default=3600, help="сколько тиков прогнать в headless-режиме")
+    parser.add_argument("--pilot", choices=sorted(PILOTS), default="idle", help="скрипт игрока в headless-режиме")
+    parser.add_argument("--ticks-per-frame", type=int, default=1, help="тиков симуляции на один кадр отрисовки")
+    parser.add_argument("--profile", action="store_true", help="включить профайлер (HUD, в headless - отчет в конце)")
+    parser.add_argument("--trace", metavar="PATH", help="записать трассу Chrome Trace Event в PATH при выходе")
+    parser.add_argument("--pstats", action="store_true", help="подключиться к серверу PStats")
+    parser.add_argument("--record", metavar="PATH", help="записать ввод первой игры в PATH")
+    parser.add_argument("--replay", metavar="PATH", help="воспроизвести запись без окна (или с --headless offscreen)")
+    parser.add_argument("--load", metavar="PATH", help="начать игру с сохранения PATH")
+    parser.add_argument("--autosave", metavar="PATH", help="сохранять сессию в PATH каждые 30 с симуляции")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.replay:
+        # Мир и зерно - из заголовка записи
+        header = load_header(args.replay)
+        game = Game(chunked_terrain=header["chunked"], batch_rendering=not args.no_batching,
+                    headless=args.headless or "none", seed=header["seed"],
+                    terrain_size=header["terrain_size"], pool_sizes=header["pool_sizes"],
+                    enemy_worker=header.get("enemy_worker", False))
+    else:
+        game = Game(chunked_terrain=args.chunked, batch_rendering=not args.no_batching,
+                    headless=args.headless, seed=args.seed, record=args.record,
+                    enemy_worker=args.enemy_worker, load=args.load, autosave=args.autosave)
+        if game.input_recorder:
+            atexit.register(game.input_recorder.close)
+    if args.pstats and not game.profiler.connect_pstats():
+        print("PStats server not found")
+    if args.profile:
+        game.profiler.enable(hud=not (args.headless or args.replay))
+    if args.trace:
+        game.profiler.start_trace()
+        atexit.register(game.profiler.dump_trace, args.trace)
+    if args.replay:
+        result = game.simulate(count_ticks(args.replay), ReplayPilot(game, args.replay), args.ticks_per_frame)
+        # По этим значениям удобно сверять, что запись воспроизвелась
+        result["player_pos"] = tuple(round(v, 4) for v in game.player.model.getPos())
+        result["player_health"] = game.player.health
+    elif args.headless:
+        result = game.simulate(args.ticks, PILOTS[args.pilot](game), args.ticks_per_frame)
+    if args.replay or args.headless:
+        result["pools"] = game.pool_stats()
+        if game.autosave and game.autosave.timings:
+            result["autosave_max_ms"] = round(max(game.autosave.timings) * 1000, 2)
+        for key, value in result.items():
+            print(f"{key}: {value}")
+        if game.profiler.enabled:
+            print(game.profiler.report())
+    else:
+        game.run()
+
@@ -0,0 +1,121 @@
+"""
+Навигация врагов: одно поле потока (flow field) вокруг игрока на всех.
+
+Окно сетки с центром в клетке игрока пересчитывается, только когда игрок
+переходит в другую клетку. Стоимость шага между соседними клетками растет
+с крутизной склона по карте высот, слишком крутые шаги запрещены. Из поля
+стоимостей до игрока получается направление в каждой клетке, и враг
+просто читает его в своей точке - O(1) на врага при любом их числе.
+"""
+import numpy as np
+import math
+
+# 8 соседей: (dx, dy) в клетках
+NEIGHBORS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+
+class FlowField:
+    """heights(xs, ys) - высоты рельефа пачкой (как Game.get_terrain_heights)."""
+    def __init__(self, heights, cell_size=3.0, radius=45.0, slope_cost=4.0, max_slope=1.0):
+        self.heights = heights
+        self.cell_size = cell_size
+        self.inv_cell = 1.0 / cell_size
+        self.half = int(math.ceil(radius / cell_size))
+        self.size = 2 * self.half + 1  # клеток по стороне, игрок в центральной
+        self.slope_cost = slope_cost   # добавка к длине шага за единицу уклона
+        self.max_slope = max_slope     # круче - непроходимо
+
+        self.center = None     # клетка игрока, для которой посчитано поле
+        self.origin = (0.0, 0.0)
+        # По клеткам (строка = y): (dx, dy, курс) и где он есть
+        self.flow_array = np.zeros((self.size * self.size, 3))
+        self.valid = np.zeros(self.size * self.size, bool)
+        self.rebuilds = 0
+
+    def cell_of(self, x, y):
+        return (math.floor(x * self.inv_cell), math.floor(y * self.inv_cell))
+
+    def update(self, x, y):
+        """Пересчитывает поле, если игрок (x, y) ушел из клетки-цели."""
+        if self.center is not None:
+            # Запас в четверть клетки: топтание на границе не пересчитывает поле
+            cx = (self.center[0] + 0.5) * self.cell_size
+            cy = (self.center[1] + 0.5) * self.cell_size
+            if max(abs(x - cx), abs(y - cy)) <= 0.75 * self.cell_size:
+                return
+        self.rebuild(self.cell_of(x, y))
+
+    def rebuild(self, cell):
+        self.center = cell
+        self.rebuilds += 1
+        size = self.size
+        cs = self.cell_size
+        # Центры клеток окна
+        x0 = (cell[0] - self.half + 0.5) * cs
+        y0 = (cell[1] - self.half + 0.5) * cs
+        self.origin = (x0, y0)
+        coords = np.arange(size) * cs
+        xs, ys = np.meshgrid(x0 + coords, y0 + coords)
+        heights = self.heights(xs.ravel(), ys.ravel()).reshape(size, size)
+
+        # Стоимость шага из клетки в соседа k; за краем окна и на крутизне - inf
+        steps = []
+        padded_h = np.pad(heights, 1, mode="edge")
+        for dx, dy in NEIGHBORS:
+            length = cs * math.hypot(dx, dy)
+            neighbor_h = padded_h[1 + dy:1 + dy + size, 1 + dx:1 + dx + size]
+            slope = np.abs(neighbor_h - heights) / length
+            step = length * (1.0 + self.slope_cost * slope)
+            step[slope > self.max_slope] = np.inf
+            steps.append(step)
+
+        # Стоимость пути до игрока: волна от центральной клетки (итерации
+        # Беллмана-Форда целиком по массиву, пока что-то меняется)
+        cost = np.full((size, size), np.inf)
+        cost[self.half, self.half] = 0.0
+        padded = np.full((size + 2, size + 2), np.inf)
+        for _ in range(size * 2):
+            padded[1:-1, 1:-1] = cost
+            best = cost
+            for (dx, dy), step in zip(NEIGHBORS, steps):
+                best = np.minimum(best, padded[1 + dy:1 + dy + size, 1 + dx:1 + dx + size] + step)
+            if np.array_equal(best, cost):
+                break
+            cost = best
+
+        # Направление - в соседа с наименьшей итоговой стоимостью
+        padded[1:-1, 1:-1] = cost
+        totals = np.stack([padded[1 + dy:1 + dy + size, 1 + dx:1 + dx + size] + step
+                           for (dx, dy), step in zip(NEIGHBORS, steps)])
+        choice = totals.argmin(axis=0)
+        reachable = np.isfinite(totals.min(axis=0)) & (cost > 0)
+        units = np.array([(dx / math.hypot(dx, dy), dy / math.hypot(dx, dy)) for dx, dy in NEIGHBORS])
+        flow = units[choice] * reachable[..., None]
+
+        # Сглаживание 3x3: вместо восьми направлений - плавные, и враг
+        # берет готовое значение своей клетки без интерполяции
+        padded_flow = np.pad(flow, ((1, 1), (1, 1), (0, 0)))
+        smooth = sum(padded_flow[1 + dy:1 + dy + size, 1 + dx:1 + dx + size]
+                     for dx, dy in NEIGHBORS + ((0, 0),))
+        length = np.hypot(smooth[..., 0], smooth[..., 1])
+        valid = reachable & (length > 1e-6)
+        length[~valid] = 1.0
+        fx = smooth[..., 0] / length
+        fy = smooth[..., 1] / length
+        heading = np.degrees(np.arctan2(-fx, fy))
+        self.flow_array = np.stack([fx, fy, heading], axis=-1).reshape(-1, 3)
+        self.valid = valid.ravel()
+
+    def sample_many(self, xs, ys):
+        """
+        (dx, dy, курс) движения к игроку из клеток точек (xs, ys): массив
+        (n, 3) и маска, где направление есть. Его нет вне окна, в клетке
+        игрока и без пути - тогда враг идет напрямую.
+        """
+        size = self.size
+        # origin - центр клетки 0, поэтому +0.5
+        gx = np.floor((xs - self.origin[0]) * self.inv_cell + 0.5).astype(np.int64)
+        gy = np.floor((ys - self.origin[1]) * self.inv_cell + 0.5).astype(np.int64)
+        inside = (gx >= 0) & (gx < size) & (gy >= 0) & (gy < size)
+        index = np.where(inside, gy * size + gx, 0)
+        return self.flow_array[index], inside & self.valid[index]
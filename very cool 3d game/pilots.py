@@ -0,0 +1,57 @@
+"""
+Скрипты игрока для headless-прогонов (main.py --headless --pilot ...).
+Пилот вызывается планировщиком первой системой тика: pilot(dt).
+Действия - через Player.queue_action, как с клавиатуры, чтобы их
+можно было записать (--record).
+"""
+from direct.showbase.InputStateGlobal import inputState
+import random
+
+PILOT_INPUT = "pilot"
+
+
+class IdlePilot:
+    """Игрок стоит на месте; мир живет своей жизнью."""
+    def __init__(self, game):
+        self.game = game
+
+    def __call__(self, dt):
+        pass
+
+
+class WanderPilot:
+    """
+    Нагрузочный бот: сразу знает все способности, бежит вперед, время
+    от времени поворачивает, стреляет и читает книги, на которые смотрит.
+    """
+    def __init__(self, game, turn_every=2.0, shoot_every=0.25):
+        self.game = game
+        self.turn_every = turn_every
+        self.shoot_every = shoot_every
+        self.turn_timer = 0.0
+        self.shoot_timer = 0.0
+        for key in game.player.abilities.abilities:
+            game.player.abilities.unlock(key)
+        inputState.set("forward", True, inputSource=PILOT_INPUT)
+
+    def __call__(self, dt):
+        player = self.game.player
+        self.turn_timer -= dt
+        if self.turn_timer <= 0:
+            self.turn_timer = self.turn_every
+            player.camera_heading += random.uniform(-120, 120)
+            player.model.setH(player.camera_heading)
+
+        self.shoot_timer -= dt
+        if self.shoot_timer <= 0:
+            self.shoot_timer = self.shoot_every
+            player.queue_action("shoot")
+
+        if self.game.interaction.target:
+            player.queue_action("interact")
+
+
+PILOTS = {
+    "idle": IdlePilot,
+    "wander": WanderPilot,
+}
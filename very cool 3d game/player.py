@@ -2,28 +2,35 @@ from panda3d.core import Vec3, CollisionRay, CollisionNode, CollisionHandlerQueu
 from panda3d.core import WindowProperties, CollisionSphere
 from direct.showbase.InputStateGlobal import inputState
 from abilities import AbilitySystem
+from hud import Observable
 import random
 
+# Действия с клавиш не выполняются сразу, а копятся до ближайшего тика
+# (Player.update): тогда результат не зависит от частоты кадров, и запись
+# ввода (replay.py) воспроизводится один в один. Индекс - номер бита.
+ACTIONS = ("interact", "shoot", "use_ability_blink", "use_ability_shield")
+ACTION_BITS = {name: 1 << i for i, name in enumerate(ACTIONS)}
+
 class Player:
+    """
+    Игрок создается один раз на всю жизнь Game: модель, коллизии и
+    подписки на клавиши переживают выход в меню, а reset() в начале каждой
+    игры возвращает только состояние (позиция, здоровье, способности).
+    """
     def __init__(self, game):
         self.game = game
         self.speed = 15
-        self.health = 100
-        self.vertical_velocity = 0
-        self.is_grounded = False
+        self.hp = Observable(100)  # HUD подписан на изменения
         
-        self.abilities = AbilitySystem()
+        # Перезарядки идут по времени симуляции, а не по настенным часам
+        self.abilities = AbilitySystem(clock=lambda: game.scheduler.time)
         
         # Загрузка модели (Box)
-        self.model = game.loader.loadModel("models/box")
+        self.model = game.assets.model("box")
         self.model.setScale(0.5, 0.5, 1)
-        
-        # Стартовая позиция над землей
-        z = game.get_terrain_height(0, 0) + 5
-        self.model.setPos(0, 0, z)
         self.model.reparentTo(game.render)
 
-        # 1. Физика тела (Стены/Враги) - Bit 0
+        # 1. Физика тела (Стены) - Bit 0; из врагов игрока выталкивает EnemyManager.push_player
         self.collider = self.model.attachNewNode(CollisionNode('player'))
         self.collider.node().addSolid(CollisionSphere(0, 0, 0, 1))
         # Collide with Bit 0 (Walls/Enemies), ignore Bit 2 (Terrain) to prevent sliding
@@ -46,48 +53,74 @@ class Player:
         # Камера
         game.camera.reparentTo(self.model)
         game.camera.setPos(0, 0, 0.6)
-        self.camera_pitch = 0.0
-        self.camera_heading = 0.0
         self.mouse_sensitivity = 0.2
 
-        # 3. Луч для взаимодействия (Книги) - Bit 1
-        self.picker_ray = CollisionRay(0, 0, 0, 0, 1, 0) 
-        self.picker_node = CollisionNode('mouseRay')
-        self.picker_node.addSolid(self.picker_ray)
-        self.picker_node.setFromCollideMask(BitMask32.bit(1))
-        self.picker_node.setIntoCollideMask(BitMask32.allOff())
-        self.picker_np = game.camera.attachNewNode(self.picker_node)
-        self.picker_handler = CollisionHandlerQueue()
-        game.cTrav.addCollider(self.picker_np, self.picker_handler)
+        # Клавиши движения - опрашиваемые состояния inputState, их хватает
+        # на все игры; события клавиш подключает reset
+        for name, key in (('forward', 'w'), ('backward', 's'), ('left', 'a'), ('right', 'd'), ('jump', 'space')):
+            inputState.watchWithModifiers(name, key)
+        self.reset()
+
+    def reset(self):
+        """Начало игры: игрок на старте, здоровье полное, способности закрыты."""
+        game = self.game
+        self.health = 100
+        self.vertical_velocity = 0
+        self.is_grounded = False
+        self.abilities.reset()
+
+        # Стартовая позиция над землей
+        z = game.get_terrain_height(0, 0) + 5
+        self.model.setPos(0, 0, z)
+        self.model.setH(0)
+        game.camera.setP(0)
+        self.camera_pitch = 0.0
+        self.camera_heading = 0.0
+        self.model.unstash()
 
+        self.actions = 0  # маска действий до следующего тика, см. ACTIONS
         self.setup_controls()
         
-        # ХАРДКОР: Через 5 секунд пробуждается одно действие
-        game.taskMgr.doMethodLater(5.0, self.initial_awakening, "InitialUnlock")
-        game.taskMgr.add(self.update, "PlayerUpdate")
-        self.hovered_book = None
+        # ХАРДКОР: Через 5 секунд (времени симуляции) пробуждается одно действие
+        self.awakening_timer = 5.0
+        # Мышь - каждый кадр, движение - в тиках симуляции (Game.scheduler)
+        game.taskMgr.add(self.look, "PlayerLook")
+        game.scheduler.track(self.model)
 
-    def initial_awakening(self, task):
+    @property
+    def health(self):
+        return self.hp.value
+
+    @health.setter
+    def health(self, value):
+        self.hp.set(value)
+
+    def initial_awakening(self):
         movements = ["move_forward", "move_backward", "move_left", "move_right"]
         chosen = random.choice(movements)
-        self.abilities.abilities[chosen]["unlocked"] = True
-        self.game.ui.show_notification(f"SUDDENLY: You can {self.abilities.abilities[chosen]['name']}!")
-        return task.done
+        self.abilities.unlock(chosen)
+        self.game.ui.show_notification(f"SUDDENLY: You can {self.abilities.abilities[chosen].name}!")
 
     def setup_controls(self):
-        inputState.watchWithModifiers('forward', 'w')
-        inputState.watchWithModifiers('backward', 's')
-        inputState.watchWithModifiers('left', 'a')
-        inputState.watchWithModifiers('right', 'd')
-        inputState.watchWithModifiers('jump', 'space')
-        
-        self.game.accept('e', self.interact)
+        self.game.accept('e', self.queue_action, ["interact"])
         # --- НОВОЕ: Стрельба ---
-        self.game.accept('mouse1', self.shoot)
+        self.game.accept('mouse1', self.queue_action, ["shoot"])
         
-        self.game.accept('shift', self.use_ability_blink)
-        self.game.accept('q', self.use_ability_shield)
+        self.game.accept('shift', self.queue_action, ["use_ability_blink"])
+        self.game.accept('q', self.queue_action, ["use_ability_shield"])
         self.game.accept('escape', self.game.ui.toggle_book_ui)
+        self.game.accept('f3', self.game.profiler.toggle)
+        self.game.accept('f4', self.game.profiler.toggle_trace)
+        self.game.accept('f5', self.game.quick_save)
+        self.game.accept('f9', self.game.quick_load)
+
+    def queue_action(self, name):
+        self.actions |= ACTION_BITS[name]
+
+    def run_actions(self, actions):
+        for i, name in enumerate(ACTIONS):
+            if actions & (1 << i):
+                getattr(self, name)()
 
     # --- НОВОЕ: Функция стрельбы ---
     def shoot(self):
@@ -104,24 +137,23 @@ class Player:
         # Можно добавить else: звук "неудачи", но пока оставим тихо.
 
     def unlock_random_ability(self):
-        locked = [k for k, v in self.abilities.abilities.items() if not v["unlocked"]]
+        locked = self.abilities.locked()
         if not locked: return "Nothing (All Learned)"
         
         key = random.choice(locked)
-        self.abilities.abilities[key]["unlocked"] = True
-        return self.abilities.abilities[key]["name"]
+        self.abilities.unlock(key)
+        return self.abilities.abilities[key].name
 
-    def cleanup(self):
+    def suspend(self):
+        """Выход в меню: клавиши отключены, модель спрятана до следующего reset."""
         self.game.ignoreAll()
-        if self.model: self.model.removeNode()
-
-    def update(self, task):
-        if self.health <= 0: return task.cont
+        self.game.taskMgr.remove("PlayerLook")
+        self.model.stash()
 
-        dt = globalClock.getDt()
-        
+    def look(self, task):
         # Вращение камеры
-        if self.game.mouseWatcherNode.hasMouse() and not self.game.ui.is_menu_open:
+        watcher = self.game.mouseWatcherNode  # None в режиме без окна
+        if self.health > 0 and watcher and watcher.hasMouse() and not self.game.ui.is_menu_open:
             md = self.game.win.getPointer(0)
             x = md.getX()
             y = md.getY()
@@ -132,9 +164,22 @@ class Player:
                 self.camera_pitch = max(-90, min(90, self.camera_pitch))
                 self.model.setH(self.camera_heading)
                 self.game.camera.setP(self.camera_pitch)
+        return task.cont
+
+    def update(self, dt):
+        actions, self.actions = self.actions, 0
+        if self.health <= 0: return
+
+        if self.awakening_timer > 0:
+            self.awakening_timer -= dt
+            if self.awakening_timer <= 0:
+                self.initial_awakening()
 
         if self.game.ui.is_menu_open:
-            return task.cont
+            self.game.interaction.set_target(None)
+            return
+
+        if actions: self.run_actions(actions)
 
         # Расчет вектора движения (в локальных координатах)
         input_vec = Vec3(0, 0, 0)
@@ -194,23 +239,14 @@ class Player:
                 self.is_grounded = True
 
         self.check_interaction()
-        return task.cont
 
     def check_interaction(self):
-        self.hovered_book = None
-        if self.picker_handler.getNumEntries() > 0:
-            self.picker_handler.sortEntries()
-            entry = self.picker_handler.getEntry(0)
-            node = entry.getIntoNodePath()
-            if node.hasPythonTag("book"):
-                self.hovered_book = node.getPythonTag("book")
-                self.game.ui.show_interact_prompt(True)
-                return
-        self.game.ui.show_interact_prompt(False)
+        cam = self.game.camera
+        eye = cam.getPos(self.game.render)
+        self.game.interaction.update(eye, cam.getQuat(self.game.render).getForward())
 
     def interact(self):
-        if self.hovered_book:
-            self.hovered_book.interact()
+        self.game.interaction.interact()
 
     def take_damage(self, amount):
         if self.abilities.is_active("shield"): return
@@ -0,0 +1,145 @@
+"""
+Пулы игровых объектов. Объект пула создается один раз (модель, коллизии),
+а дальше только включается spawn(...) и выключается despawn() через
+stash/unstash - без loadModel и removeNode во время игры.
+
+Если модели для нового объекта еще нет (меню закрыли раньше, чем
+закончилась предзагрузка), пул не грузит ее синхронно: спавн ждет в
+deferred, модель запрашивается асинхронно, и объект появляется в кадре,
+где она загрузилась.
+"""
+import time
+
+# (сколько создать заранее, максимум объектов в пуле)
+POOL_DEFAULTS = {
+    "projectile": (32, 256),
+    "enemy": (15, 128),
+    "book": (30, 64),
+}
+
+
+class ObjectPool:
+    def __init__(self, name, factory, prewarm=0, max_size=None, assets=None, model=None):
+        self.name = name
+        self.factory = factory
+        self.max_size = max_size
+        self.free = []
+        self.created = 0
+        self.in_use = 0
+
+        # Модель из реестра assets, без которой factory не создать объект
+        self.assets = assets
+        self.model = model
+        self.deferred = []       # отложенные спавны: (время запроса, args, kwargs)
+        self.prewarm_target = 0  # сколько создать заранее, когда модель загрузится
+        self.requested = False   # ждем модель от реестра
+
+        # Статистика для подбора размеров пулов
+        self.hits = 0
+        self.misses = 0
+        self.refused = 0
+        self.high_water = 0
+        self.deferred_spawns = 0
+        self.max_deferred_wait = 0.0  # дольше всех ждал отложенный спавн, с
+
+        self.prewarm(prewarm)
+
+    @property
+    def ready(self):
+        """Можно создавать объекты (модель загружена или не нужна)."""
+        return self.model is None or self.assets.has_model(self.model)
+
+    @property
+    def waiting(self):
+        """Число отложенных спавнов."""
+        return len(self.deferred)
+
+    def prewarm(self, count):
+        if not self.ready:
+            self.prewarm_target = max(self.prewarm_target, count)
+            self.request()
+            return
+        while len(self.free) < count and self.can_grow():
+            self.free.append(self.create())
+
+    def can_grow(self):
+        return self.max_size is None or self.created + len(self.deferred) < self.max_size
+
+    def create(self):
+        self.created += 1
+        return self.factory()
+
+    def acquire(self, *args, **kwargs):
+        """
+        Берет свободный объект (или создает новый) и спавнит его. None -
+        пул исчерпан или спавн отложен до загрузки модели (см. waiting).
+        """
+        if self.free:
+            obj = self.free.pop()
+            self.hits += 1
+        elif self.can_grow():
+            if not self.ready:
+                self.deferred.append((time.perf_counter(), args, kwargs))
+                self.deferred_spawns += 1
+                self.request()
+                return None
+            obj = self.create()
+            self.misses += 1
+        else:
+            self.refused += 1
+            return None
+        return self.activate(obj, args, kwargs)
+
+    def activate(self, obj, args, kwargs):
+        self.in_use += 1
+        self.high_water = max(self.high_water, self.in_use)
+        obj.spawn(*args, **kwargs)
+        return obj
+
+    def request(self):
+        if not self.requested:
+            self.requested = True
+            self.assets.request(self.model, self.on_model_ready)
+
+    def on_model_ready(self):
+        """Модель загрузилась: отложенные спавны - по порядку, затем prewarm."""
+        self.requested = False
+        deferred, self.deferred = self.deferred, []
+        now = time.perf_counter()
+        for requested, args, kwargs in deferred:
+            self.max_deferred_wait = max(self.max_deferred_wait, now - requested)
+            self.misses += 1
+            self.activate(self.create(), args, kwargs)
+        self.prewarm(self.prewarm_target)
+        self.prewarm_target = 0
+
+    def cancel_deferred(self):
+        """Забывает отложенные спавны (сессия кончилась раньше, чем загрузилась модель)."""
+        self.deferred = []
+        self.prewarm_target = 0
+
+    def release(self, obj):
+        obj.despawn()
+        self.in_use -= 1
+        self.free.append(obj)
+
+    def clear(self):
+        """Уничтожает свободные объекты (занятые остаются на совести владельца)."""
+        self.cancel_deferred()
+        for obj in self.free:
+            obj.destroy()
+        self.created -= len(self.free)
+        self.free = []
+
+    def stats(self):
+        return {
+            "created": self.created,
+            "free": len(self.free),
+            "in_use": self.in_use,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refused": self.refused,
+            "high_water": self.high_water,
+            "deferred": self.deferred_spawns,
+            "max_deferred_wait_ms": round(self.max_deferred_wait * 1000, 2),
+        }
@@ -0,0 +1,203 @@
+"""
+Встроенный профайлер кадра: таймеры систем симуляции и задач taskMgr,
+HUD со скользящими средними и отметками пиков (F3), запись трассы в
+формате Chrome Trace Event (F4; открывается в chrome://tracing или
+Perfetto) и передача систем симуляции в PStats.
+"""
+from direct.gui.OnscreenText import OnscreenText
+from panda3d.core import PStatClient, PStatCollector, TextNode
+from collections import deque
+import json
+import os
+import time
+
+# Задачи taskMgr, которые оборачиваются таймерами (системы симуляции
+# замеряет сам планировщик через record)
+PROFILED_TASKS = ("SimStep", "PlayerLook", "RenderUpdate", "TerrainStream", "AssetPreload", "igLoop")
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+
+
+class RollingStat:
+    """Скользящее окно замеров с суммой и счетчиком пиков."""
+    __slots__ = ("values", "total", "spikes", "spike_at")
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.spikes = 0
+        self.spike_at = -1.0
+
+    def add(self, value, spike_factor, spike_min, now):
+        values = self.values
+        if len(values) == values.maxlen:
+            self.total -= values[0]
+        # Пик - заметно дольше среднего по окну (до добавления)
+        if len(values) >= 10 and value > spike_min and value * len(values) > spike_factor * self.total:
+            self.spikes += 1
+            self.spike_at = now
+        values.append(value)
+        self.total += value
+
+    @property
+    def average(self):
+        return self.total / len(self.values) if self.values else 0.0
+
+
+class FrameProfiler:
+    def __init__(self, game, window=120, spike_factor=3.0, spike_min=0.0005, hud_interval=0.25,
+                 trace_limit=500000):
+        self.game = game
+        self.window = window
+        self.spike_factor = spike_factor
+        self.spike_min = spike_min  # короче 0.5 мс пиками не считаем
+        self.hud_interval = hud_interval
+
+        self.enabled = False
+        self.stats = {}        # имя -> RollingStat
+        self.wrapped = {}      # имя задачи -> (задача, исходная функция)
+        self.trace = None      # deque событий трассы, пока идет запись
+        self.trace_limit = trace_limit
+        self.pstats = None     # имя системы -> PStatCollector
+        self.pstats_offset = 0.0
+        self.pstats_thread = None
+
+        self.hud = None
+        self.hud_timer = 0.0
+
+    # --- Включение ---
+    def toggle(self):
+        """F3: показать/скрыть HUD. Таймеры выключаются, если они больше никому не нужны."""
+        if self.hud is None:
+            self.enable(hud=True)
+            return
+        self.hud.destroy()
+        self.hud = None
+        if self.trace is None and self.pstats is None:
+            self.disable()
+
+    def enable(self, hud=True):
+        if not self.enabled:
+            self.enabled = True
+            self.game.scheduler.profile = self
+            self.wrap_tasks()
+            self.game.taskMgr.add(self.update, "Profiler", sort=60)
+        if hud and self.hud is None:
+            self.hud = OnscreenText(parent=self.game.a2dTopLeft, pos=(0.05, -0.1), scale=0.045,
+                                    fg=(0.6, 1, 0.6, 1), bg=(0, 0, 0, 0.5), align=TextNode.ALeft, mayChange=True)
+
+    def disable(self):
+        self.enabled = False
+        self.game.taskMgr.remove("Profiler")
+        if self.game.scheduler.profile is self:
+            self.game.scheduler.profile = None
+        for task, fn in self.wrapped.values():
+            task.setFunction(fn)
+        self.wrapped = {}
+        if self.hud:
+            self.hud.destroy()
+            self.hud = None
+
+    def wrap_tasks(self):
+        """Оборачивает задачи из PROFILED_TASKS; новые (после start_game) - при следующем вызове."""
+        for name in PROFILED_TASKS:
+            for task in self.game.taskMgr.getTasksNamed(name):
+                fn = task.getFunction()
+                # Питоновские обертки задач каждый раз новые - метим саму функцию
+                if getattr(fn, "profiled", False):
+                    continue
+                self.wrapped[name] = (task, fn)
+                task.setFunction(self.timed(name, fn))
+
+    def timed(self, name, fn):
+        clock = time.perf_counter
+        record = self.record
+
+        def run(*args):
+            started = clock()
+            result = fn(*args)
+            record(name, started, clock() - started, "task")
+            return result
+        run.profiled = True
+        return run
+
+    # --- Замеры ---
+    def record(self, name, started, elapsed, category="sim"):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = RollingStat(self.window)
+        stat.add(elapsed, self.spike_factor, self.spike_min, started)
+
+        if self.trace is not None:
+            self.trace.append((name, category, started, elapsed))
+        if self.pstats is not None and category == "sim":
+            collector = self.pstats.get(name)
+            if collector is None:
+                # Вложено в коллектор задачи SimStep, который ведет сам taskMgr
+                collector = self.pstats[name] = PStatCollector(f"App:Tasks:SimStep:{name}")
+            thread = self.pstats_thread
+            collector.start(thread, started + self.pstats_offset)
+            collector.stop(thread, started + elapsed + self.pstats_offset)
+
+    def update(self, task):
+        self.wrap_tasks()
+        now = time.perf_counter()
+        self.record("frame", now, globalClock.getDt(), "frame")
+        self.hud_timer -= globalClock.getDt()
+        if self.hud and self.hud_timer <= 0:
+            self.hud_timer = self.hud_interval
+            self.hud.setText(self.report(now))
+        return task.cont
+
+    def report(self, now=None):
+        now = time.perf_counter() if now is None else now
+        frame = self.stats.get("frame")
+        lines = []
+        if frame and frame.average > 0:
+            lines.append(f"{1.0 / frame.average:5.0f} fps")
+        lines.append(f"{'':<14}{'avg':>7}{'max':>7}  spikes")
+        for name, stat in self.stats.items():
+            recent = "!" if now - stat.spike_at < 1.0 else " "
+            lines.append(f"{name:<14}{stat.average * 1000:7.2f}{max(stat.values) * 1000:7.2f} {recent}{stat.spikes}")
+        return "\n".join(lines)
+
+    # --- Трасса ---
+    def start_trace(self):
+        self.enable(hud=False)
+        self.trace = deque(maxlen=self.trace_limit)
+
+    def dump_trace(self, path=None):
+        """Сохраняет записанную трассу (Chrome Trace Event JSON) и останавливает запись."""
+        if self.trace is None:
+            return None
+        if path is None:
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            path = os.path.join(TRACE_DIR, time.strftime("trace_%Y%m%d_%H%M%S.json"))
+        events = [{"name": name, "cat": category, "ph": "X", "pid": 1, "tid": 1,
+                   "ts": started * 1e6, "dur": elapsed * 1e6}
+                  for name, category, started, elapsed in self.trace if category != "frame"]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        self.trace = None
+        return path
+
+    def toggle_trace(self):
+        if self.trace is None:
+            self.start_trace()
+            self.game.ui.show_notification("Profiler: recording trace (F4 to save)")
+        else:
+            path = self.dump_trace()
+            self.game.ui.show_notification(f"Trace saved: {os.path.basename(path)}")
+
+    # --- PStats ---
+    def connect_pstats(self, host=None):
+        """Подключается к серверу PStats, если он запущен. Возвращает True при успехе."""
+        client = PStatClient.getGlobalPstats()
+        connected = client.isConnected() or (PStatClient.connect(host) if host else PStatClient.connect())
+        if not connected:
+            return False
+        # Системы пишем задним числом, поэтому нужен сдвиг от perf_counter к часам PStats
+        self.pstats_offset = client.getRealTime() - time.perf_counter()
+        self.pstats = {}
+        self.pstats_thread = client.getMainThread()
+        self.enable(hud=False)
+        return True
@@ -0,0 +1,167 @@
+"""
+Запись ввода игрока и детерминированное воспроизведение.
+
+Запись (main.py --record PATH) - система планировщика перед player: на
+каждом тике снимает клавиши движения, открытое меню, действия из очереди
+Player.actions, взгляд (курс модели и наклон камеры) и маску открытых
+способностей (пилоты и отладка открывают их мимо книг). В файл попадают
+только тики, на которых что-то изменилось, поток пишется через gzip.
+Зерно генераторов и параметры мира лежат в заголовке.
+
+Воспроизведение (main.py --replay PATH, scenarios.py --replay PATH) -
+пилот headless-игры, который подает записанное обратно тик в тик.
+Чанковый террейн подгружается по кадрам, поэтому его запись
+воспроизводится точно только если стриминг успевает за игроком.
+"""
+from direct.showbase.InputStateGlobal import inputState
+import gzip
+import json
+import struct
+
+MAGIC = b"VOIDREC1"
+VERSION = 1
+KEYS = ("forward", "backward", "left", "right", "jump")
+MENU_BIT = 1 << len(KEYS)
+# тиков после прошлой записи, клавиши (+ меню), действия, открытые способности, курс, наклон
+RECORD = struct.Struct("<HBBHff")
+MAX_WAIT = 0xFFFF
+REPLAY_INPUT = "replay"
+
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not an input recording")
+    size, = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(size))
+    if header["version"] != VERSION:
+        raise ValueError(f"unsupported recording version {header['version']}")
+    return header
+
+
+def read_record(f):
+    """Следующая запись или None в конце файла (в том числе оборванного вместе с игрой)."""
+    try:
+        data = f.read(RECORD.size)
+    except EOFError:
+        return None
+    if len(data) < RECORD.size:
+        return None
+    return RECORD.unpack(data)
+
+
+def load_header(path):
+    with gzip.open(path, "rb") as f:
+        return read_header(f)
+
+
+def count_ticks(path):
+    """Длина записи в тиках."""
+    ticks = 0
+    with gzip.open(path, "rb") as f:
+        read_header(f)
+        record = read_record(f)
+        while record:
+            ticks += record[0]
+            record = read_record(f)
+    return ticks + 1
+
+
+class InputRecorder:
+    def __init__(self, game, path, flush_every=600):
+        self.game = game
+        self.path = path
+        self.flush_every = flush_every  # тиков между сбросами на диск
+        self.file = gzip.open(path, "wb")
+        header = json.dumps({
+            "version": VERSION,
+            "seed": game.seed,
+            "tick_rate": round(1.0 / game.scheduler.dt),
+            "chunked": game.chunked_terrain,
+            "terrain_size": game.terrain_size,
+            "pool_sizes": game.pool_sizes,
+            # С worker враги отстают на тик - воспроизводить надо в том же режиме
+            "enemy_worker": game.enemy_worker,
+        }).encode()
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+        self.tick = 0
+        self.last_tick = 0
+        self.last = None   # (клавиши, способности, курс, наклон) последней записи
+        self.records = 0
+
+    def __call__(self, dt):
+        game = self.game
+        player = game.player
+        keys = 0
+        for i, name in enumerate(KEYS):
+            if inputState.isSet(name):
+                keys |= 1 << i
+        if game.ui.is_menu_open:
+            keys |= MENU_BIT
+        state = (keys, player.abilities.unlocked_mask, player.model.getH(), game.camera.getP())
+
+        wait = self.tick - self.last_tick
+        if player.actions or state != self.last or wait == MAX_WAIT or self.last is None:
+            self.write(wait, player.actions, state)
+        self.tick += 1
+        if self.tick % self.flush_every == 0:
+            self.file.flush()
+
+    def write(self, wait, actions, state):
+        keys, unlocked, heading, pitch = state
+        self.file.write(RECORD.pack(wait, keys, actions, unlocked, heading, pitch))
+        self.last_tick += wait
+        self.last = state
+        self.records += 1
+
+    def close(self):
+        """Дописывает последний тик (чтобы воспроизведение знало длину) и закрывает файл."""
+        if self.file is None:
+            return
+        if self.last is not None and self.tick - 1 > self.last_tick:
+            self.write(self.tick - 1 - self.last_tick, 0, self.last)
+        self.file.close()
+        self.file = None
+
+
+class ReplayPilot:
+    """Пилот, подающий записанный ввод. Записи читаются из файла по мере надобности."""
+    def __init__(self, game, path):
+        self.game = game
+        self.file = gzip.open(path, "rb")
+        self.header = read_header(self.file)
+        self.tick = 0
+        self.pending = read_record(self.file)
+        self.next_tick = self.pending[0] if self.pending else 0
+
+    @property
+    def done(self):
+        return self.pending is None
+
+    def __call__(self, dt):
+        if self.pending is not None and self.tick == self.next_tick:
+            wait, keys, actions, unlocked, heading, pitch = self.pending
+            self.apply(keys, actions, unlocked, heading, pitch)
+            self.pending = read_record(self.file)
+            if self.pending:
+                self.next_tick += self.pending[0]
+            else:
+                self.file.close()
+        self.tick += 1
+
+    def apply(self, keys, actions, unlocked, heading, pitch):
+        game = self.game
+        player = game.player
+        abilities = player.abilities
+        if unlocked & ~abilities.unlocked_mask:
+            for key, ability in abilities.abilities.items():
+                if unlocked & ability.bit:
+                    abilities.unlock(key)
+        for i, name in enumerate(KEYS):
+            inputState.set(name, bool(keys & (1 << i)), inputSource=REPLAY_INPUT)
+        game.ui.is_menu_open = bool(keys & MENU_BIT)
+        player.actions |= actions
+        player.camera_heading = heading
+        player.camera_pitch = pitch
+        player.model.setH(heading)
+        game.camera.setP(pitch)
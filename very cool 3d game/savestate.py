@@ -0,0 +1,268 @@
+"""
+Сохранение и восстановление игровой сессии целиком.
+
+Файл - заголовок (как у записи ввода, replay.py) и дальше подряд
+фиксированные структуры и столбцы numpy байтами: тик и время симуляции,
+игрок, способности, таймеры спавна, враги, книги, снаряды и состояние
+генераторов случайных чисел. Пишется и читается потоком, без pickle;
+мир (рельеф) не сохраняется - он строится заново из параметров заголовка,
+и восстанавливать можно только в игру с тем же миром.
+
+Сохранение (main.py --autosave PATH, F5) - пара миллисекунд даже на
+тысячах врагов, поэтому его можно делать по таймеру прямо в кадре.
+Только между тиками: внутри тика часть состояния уже новая, а номер
+тика и позиции узлов (scheduler.sim_pos) - еще прошлого.
+Восстановление (main.py --load PATH, F9) заменяет все сущности текущей
+сессии сохраненными, и игра продолжается тик в тик так же, как после
+сохранения. С enemy_worker - почти так же: счетчики AI LOD остаются в
+процессе worker и не сохраняются.
+"""
+from panda3d.core import Vec3
+import json
+import os
+import random
+import struct
+import time
+
+import numpy as np
+
+from abilities import ABILITY_LIST
+from enemy_sim import SAVED_COLUMNS
+
+MAGIC = b"VOIDSAV1"
+VERSION = 2  # 2: два уровня AI LOD вместо трех
+# тик, время симуляции
+WORLD = struct.Struct("<Qd")
+# позиция, курс, наклон камеры, вертикальная скорость, таймер пробуждения, здоровье, на земле
+PLAYER = struct.Struct("<3dffddi?")
+# открытые, действующие, число открытых (дальше их id по порядку), число способностей
+ABILITIES = struct.Struct("<IIBB")
+# таймер спавна врагов, их текущая скорость, таймер спавна книг
+SPAWNING = struct.Struct("<ddd")
+COUNT = struct.Struct("<I")
+# тик AI LOD, есть ли позиция игрока на прошлом тике, она сама
+ENEMY_LOD = struct.Struct("<q?3d")
+# Mersenne Twister модуля random: 624 слова и индекс, затем кэш gauss
+PY_RANDOM = struct.Struct("<625I?d")
+# То же для numpy.random: слова, индекс, кэш gauss
+NP_RANDOM = struct.Struct("<624Iiid")
+
+QUICKSAVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saves", "quick.sav")
+
+BOOK_COLUMNS = {"book": (np.float64, 4)}  # x, y, курс, наклон
+PROJECTILE_SAVED = ("pos", "velocity", "lifetime")
+
+
+def write_arrays(f, arrays, count):
+    f.write(COUNT.pack(count))
+    for values in arrays:
+        f.write(np.ascontiguousarray(values, values.dtype.newbyteorder("<")).tobytes())
+
+
+def read_struct(f, layout):
+    """layout.unpack следующих байт файла; ValueError, если файл кончился."""
+    data = f.read(layout.size)
+    if len(data) < layout.size:
+        raise ValueError("truncated save file")
+    return layout.unpack(data)
+
+
+def read_arrays(f, columns, names):
+    """Столбцы names (описание - как у ComponentTable): имя -> массив из count строк."""
+    count, = read_struct(f, COUNT)
+    arrays = {}
+    for name in names:
+        dtype, width = columns[name]
+        dtype = np.dtype(dtype).newbyteorder("<")
+        shape = (count,) if width == 1 else (count, width)
+        size = count * width * dtype.itemsize
+        data = f.read(size)
+        if len(data) < size:
+            raise ValueError("truncated save file")
+        arrays[name] = np.frombuffer(data, dtype).reshape(shape).astype(dtype.newbyteorder("="))
+    return arrays
+
+
+def world_header(game):
+    return {
+        "version": VERSION,
+        "seed": game.seed,
+        "tick_rate": round(1.0 / game.scheduler.dt),
+        "chunked": game.chunked_terrain,
+        "terrain_size": game.terrain_size,
+    }
+
+
+def write_snapshot(game, f):
+    header = json.dumps(world_header(game)).encode()
+    f.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    scheduler = game.scheduler
+    f.write(WORLD.pack(scheduler.tick, scheduler.time))
+
+    player = game.player
+    x, y, z = scheduler.sim_pos(player.model)
+    f.write(PLAYER.pack(x, y, z, player.model.getH(), game.camera.getP(), player.vertical_velocity,
+                        player.awakening_timer, player.health, player.is_grounded))
+
+    abilities = player.abilities
+    ids = bytes(abilities.abilities[key].id for key in abilities.unlocked)
+    f.write(ABILITIES.pack(abilities.unlocked_mask, abilities.active_mask, len(ids), len(ABILITY_LIST)) + ids)
+    f.write(np.array(abilities.ready_at + abilities.active_until, "<f8").tobytes())
+
+    enemies = game.enemy_manager
+    books = game.book_manager
+    f.write(SPAWNING.pack(enemies.spawn_timer, enemies.current_speed, books.spawn_timer))
+
+    state, lod_tick, lod_origin = enemies.snapshot()
+    write_arrays(f, [state[name] for name in SAVED_COLUMNS], len(state["pos"]))
+    f.write(ENEMY_LOD.pack(lod_tick, lod_origin is not None, *(lod_origin or (0.0, 0.0, 0.0))))
+
+    book_rows = books.snapshot()
+    write_arrays(f, [book_rows], len(book_rows))
+
+    table = game.projectile_table
+    n = table.count
+    write_arrays(f, [getattr(table, name)[:n] for name in PROJECTILE_SAVED], n)
+
+    _, key, gauss = random.getstate()
+    f.write(PY_RANDOM.pack(*key, gauss is not None, gauss or 0.0))
+    _, key, pos, has_gauss, cached = np.random.get_state()
+    f.write(NP_RANDOM.pack(*key.tolist(), pos, has_gauss, cached))
+
+
+def read_snapshot(game, f):
+    """Читает файл целиком в dict; сессию не трогает (битый файл ее не испортит)."""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a save file")
+    size, = read_struct(f, COUNT)
+    header = json.loads(f.read(size))
+    if header["version"] != VERSION:
+        raise ValueError(f"unsupported save version {header['version']}")
+    current = world_header(game)
+    for key in ("chunked", "terrain_size", "tick_rate"):
+        if header[key] != current[key]:
+            raise ValueError(f"save is for another world: {key}={header[key]}, game has {current[key]}")
+
+    snapshot = {"header": header}
+    snapshot["world"] = read_struct(f, WORLD)
+    snapshot["player"] = read_struct(f, PLAYER)
+    unlocked_mask, active_mask, unlocked, count = read_struct(f, ABILITIES)
+    if count != len(ABILITY_LIST):
+        raise ValueError(f"save has {count} abilities, game has {len(ABILITY_LIST)}")
+    ids = f.read(unlocked)
+    times = f.read(16 * count)
+    if len(ids) < unlocked or len(times) < 16 * count:
+        raise ValueError("truncated save file")
+    if any(i >= count for i in ids):
+        raise ValueError(f"save has unknown ability id {max(ids)}")
+    times = np.frombuffer(times, "<f8").tolist()
+    snapshot["abilities"] = ([ABILITY_LIST[i].key for i in ids], active_mask, times[:count], times[count:])
+    snapshot["spawning"] = read_struct(f, SPAWNING)
+    snapshot["enemies"] = read_arrays(f, game.enemy_manager.table.columns, SAVED_COLUMNS)
+    lod_tick, has_origin, *origin = read_struct(f, ENEMY_LOD)
+    snapshot["enemy_lod"] = (lod_tick, tuple(origin) if has_origin else None)
+    snapshot["books"] = read_arrays(f, BOOK_COLUMNS, ("book",))["book"]
+    snapshot["projectiles"] = read_arrays(f, game.projectile_table.columns, PROJECTILE_SAVED)
+    *key, has_gauss, gauss = read_struct(f, PY_RANDOM)
+    snapshot["random"] = (3, tuple(key), gauss if has_gauss else None)
+    *key, pos, has_gauss, cached = read_struct(f, NP_RANDOM)
+    snapshot["np_random"] = ("MT19937", np.array(key, np.uint32), pos, has_gauss, cached)
+
+    for name, rows in (("enemy", snapshot["enemies"]["pos"]), ("book", snapshot["books"]),
+                       ("projectile", snapshot["projectiles"]["pos"])):
+        max_size = game.pool_sizes[name][1]
+        if max_size is not None and len(rows) > max_size:
+            raise ValueError(f"save has {len(rows)} of {name}, the pool holds {max_size}")
+    return snapshot
+
+
+def apply_snapshot(game, snapshot):
+    # Сущности создаются из пулов прямо сейчас, без ожидания моделей
+    game.assets.finish()
+
+    scheduler = game.scheduler
+    scheduler.tick, scheduler.time = snapshot["world"]
+
+    player = game.player
+    x, y, z, heading, pitch, player.vertical_velocity, player.awakening_timer, health, player.is_grounded = snapshot["player"]
+    player.model.setPos(x, y, z)
+    player.model.setH(heading)
+    game.camera.setP(pitch)
+    player.camera_heading = heading
+    player.camera_pitch = pitch
+    player.health = health
+    player.actions = 0
+    player.abilities.restore(*snapshot["abilities"])
+    game.ui.spells_dirty = True
+
+    enemies = game.enemy_manager
+    books = game.book_manager
+    enemies.spawn_timer, enemies.current_speed, books.spawn_timer = snapshot["spawning"]
+    enemies.restore(snapshot["enemies"], *snapshot["enemy_lod"])
+    books.restore(snapshot["books"])
+
+    projectiles = snapshot["projectiles"]
+    for p in list(game.projectiles):
+        game.projectile_pool.release(p)
+    game.projectile_pool.cancel_deferred()
+    for pos, velocity in zip(projectiles["pos"].tolist(), projectiles["velocity"].tolist()):
+        game.projectile_pool.acquire(pos, Vec3(*velocity))
+    table = game.projectile_table
+    n = table.count
+    for name, values in projectiles.items():
+        getattr(table, name)[:n] = values
+    table.prev[:n] = table.pos[:n]
+
+    random.setstate(snapshot["random"])
+    np.random.set_state(snapshot["np_random"])
+    # Очереди коллизий (земля под игроком) - для восстановленных позиций
+    game.cTrav.traverse(game.render)
+
+
+def save(game, path):
+    """Сохраняет сессию в path (через временный файл). Возвращает секунды."""
+    started = time.perf_counter()
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write_snapshot(game, f)
+    os.replace(tmp, path)
+    return time.perf_counter() - started
+
+
+def load(game, path):
+    """Заменяет текущую сессию сохраненной в path. Возвращает секунды."""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        snapshot = read_snapshot(game, f)
+    apply_snapshot(game, snapshot)
+    return time.perf_counter() - started
+
+
+class AutoSave:
+    """
+    Сохраняет сессию каждые interval секунд симуляции. Сам объект - система
+    планировщика, она только отсчитывает время; пишет файл write() после
+    тиков кадра (Game.render_update).
+    """
+    def __init__(self, game, path, interval=30.0):
+        self.game = game
+        self.path = path
+        self.interval = interval
+        self.timer = interval
+        self.due = False
+        self.timings = []  # секунды на каждое сохранение
+
+    def __call__(self, dt):
+        self.timer -= dt
+        if self.timer <= 0:
+            self.timer = self.interval
+            self.due = True
+
+    def write(self):
+        if self.due:
+            self.due = False
+            self.timings.append(save(self.game, self.path))
@@ -0,0 +1,216 @@
+"""
+Сценарные бенчмарки: фиксированный мир, Game в headless-режиме, времена
+систем планировщика по тикам (p50/p95/p99).
+
+Запуск: python scenarios.py [имя ...] [--json results.json]   (без имен - все)
+        python scenarios.py --replay game.rec   (запись ввода, см. replay.py)
+
+Каждый сценарий идет в отдельном процессе: ShowBase в процессе один.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# имя -> параметры мира
+SCENARIOS = {
+    "baseline": dict(terrain_size=256, enemies=15, projectiles=0),
+    "crowd": dict(terrain_size=256, enemies=100, projectiles=50),
+    "swarm": dict(terrain_size=256, enemies=300, projectiles=200),
+    "big_terrain": dict(terrain_size=512, enemies=15, projectiles=20),
+    "chunked": dict(chunked=True, enemies=50, projectiles=50),
+    # Толпа по всей карте: большинство далеко от игрока (AI LOD)
+    "horde": dict(terrain_size=256, enemies=2000, projectiles=0, spawn_radius=(10, 170)),
+    # Толпа впятеро больше; *_worker - с симуляцией врагов в отдельном процессе
+    "horde_worker": dict(terrain_size=256, enemies=2000, projectiles=0, spawn_radius=(10, 170), enemy_worker=True),
+    "legion": dict(terrain_size=256, enemies=10000, projectiles=0, spawn_radius=(10, 170), frames=600),
+    "legion_worker": dict(terrain_size=256, enemies=10000, projectiles=0, spawn_radius=(10, 170), enemy_worker=True,
+                          frames=600),
+}
+DEFAULTS = dict(terrain_size=256, chunked=False, enemies=15, projectiles=0, spawn_radius=(10, 35),
+                enemy_worker=False, frames=1200, warmup=60, headless="none", seed=1)
+RESULT_PREFIX = "SCENARIO_RESULT "
+# Задачи taskMgr вне тиков симуляции, время которых тоже пишем
+FRAME_TASKS = ("SimStep", "RenderUpdate", "TerrainStream", "igLoop")
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+class ScenarioPilot:
+    """
+    Держит мир в заданном составе: enemies врагов вокруг игрока (кольцо
+    spawn_radius) и projectiles снарядов в полете. Игрок стоит на месте.
+    """
+    def __init__(self, game, enemies, projectiles, vec, spawn_radius=(10, 35)):
+        self.game = game
+        self.enemies = enemies
+        self.projectiles = projectiles
+        self.vec = vec
+        self.spawn_radius = spawn_radius
+
+    def __call__(self, dt):
+        game = self.game
+        manager = game.enemy_manager
+        center = game.player.model.getPos()
+        # Убитых заменяем новыми в кольце (по умолчанию ближе радиуса преследования, 40)
+        while len(manager.enemies) < self.enemies:
+            angle = random.uniform(0, 2 * math.pi)
+            dist = random.uniform(*self.spawn_radius)
+            if not manager.spawn_at(center.x + math.cos(angle) * dist, center.y + math.sin(angle) * dist):
+                break  # пул исчерпан
+
+        origin = center + (0, 0, 1)
+        while len(game.projectiles) < self.projectiles:
+            angle = random.uniform(0, 2 * math.pi)
+            before = len(game.projectiles)
+            game.spawn_projectile(origin, self.vec(math.cos(angle), math.sin(angle), random.uniform(-0.1, 0.1)))
+            if len(game.projectiles) == before:
+                break  # пул исчерпан
+
+
+def run_scenario(name, replay=None):
+    """Выполняется в дочернем процессе; возвращает dict с результатами."""
+    from main import Game, Vec3
+    from scheduler import SystemTimes
+    from replay import ReplayPilot, load_header, count_ticks
+
+    if replay:
+        # Мир, зерно и длина - из записи; игра идет как у игрока, без подпорок
+        header = load_header(replay)
+        params = dict(DEFAULTS, chunked=header["chunked"], terrain_size=header["terrain_size"],
+                      seed=header["seed"], enemy_worker=header.get("enemy_worker", False),
+                      frames=count_ticks(replay), warmup=0, replay=os.path.basename(replay))
+        game = Game(chunked_terrain=params["chunked"], headless=params["headless"], seed=params["seed"],
+                    terrain_size=params["terrain_size"], terrain_cache=False, pool_sizes=header["pool_sizes"],
+                    enemy_worker=params["enemy_worker"])
+        manager = game.enemy_manager
+        game.simulate(0, ReplayPilot(game, replay))
+    else:
+        params = dict(DEFAULTS, **SCENARIOS[name])
+        game = Game(chunked_terrain=params["chunked"], headless=params["headless"], seed=params["seed"],
+                    terrain_size=params["terrain_size"], terrain_cache=False, enemy_worker=params["enemy_worker"],
+                    pool_sizes={"enemy": (params["enemies"], params["enemies"]),
+                                "projectile": (params["projectiles"], max(params["projectiles"], 1))})
+
+        player = game.player
+        player.health = 10 ** 9
+        manager = game.enemy_manager
+        manager.max_enemies = params["enemies"]
+
+        pilot = ScenarioPilot(game, params["enemies"], params["projectiles"], Vec3, params["spawn_radius"])
+        game.simulate(params["warmup"], pilot)
+
+    game.scheduler.profile = SystemTimes()
+    tasks = {name: game.taskMgr.getTasksNamed(name) for name in FRAME_TASKS}
+    tasks = {name: found[0] for name, found in tasks.items() if found}
+    task_times = {name: [] for name in tasks}
+    frame_times = []
+    clock = time.perf_counter
+    started = clock()
+    for _ in range(params["frames"]):
+        if not game.is_game_running:
+            break  # игрок из записи погиб
+        t0 = clock()
+        game.taskMgr.step()
+        frame_times.append(clock() - t0)
+        for name, task in tasks.items():
+            task_times[name].append(task.dt)
+    wall = clock() - started
+
+    return {
+        "params": params,
+        "terrain_ms": game.terrain_time * 1000.0,
+        "wall_s": wall,
+        "ticks_per_s": len(frame_times) / wall,
+        "enemies": len(manager.enemies),
+        "enemy_tiers": manager.tier_counts() if hasattr(manager, "tier_counts") else None,
+        "enemy_worker_wait_s": manager.worker.wait_time if getattr(manager, "worker", None) else None,
+        "projectiles": len(game.projectiles),
+        "frame": percentiles(frame_times),
+        "systems": {sys_name: percentiles(samples) for sys_name, samples in game.scheduler.profile.items()},
+        "tasks": {name: percentiles(samples) for name, samples in task_times.items()},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn_scenario(name, replay=None):
+    extra = ["--replay", os.path.abspath(replay)] if replay else []
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name] + extra,
+                          capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"scenario {name} failed:\n{proc.stderr[-2000:]}")
+
+
+def print_result(name, result):
+    print(f"== {name} ==  terrain {result['terrain_ms']:.1f} ms, "
+          f"{result['ticks_per_s']:.0f} ticks/s, {result['enemies']} enemies, {result['projectiles']} projectiles")
+    print(f"  {'system':<12} {'p50, ms':>8} {'p95, ms':>8} {'p99, ms':>8} {'max, ms':>8}")
+    rows = list(result["systems"].items()) + list(result["tasks"].items()) + [("frame", result["frame"])]
+    for sys_name, stats in rows:
+        print(f"  {sys_name:<12} {stats['p50_ms']:>8.3f} {stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f} {stats['max_ms']:>8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сценарные бенчмарки игры")
+    parser.add_argument("names", nargs="*", help=f"сценарии: {', '.join(SCENARIOS)}")
+    parser.add_argument("--json", help="куда сохранить результаты")
+    parser.add_argument("--replay", action="append", default=[], metavar="PATH",
+                        help="прогнать запись ввода как сценарий (можно несколько раз)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(RESULT_PREFIX + json.dumps(run_scenario(args.child, args.replay[0] if args.replay else None)))
+        return
+
+    unknown = [n for n in args.names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scenarios": {},
+    }
+    runs = [(name, None) for name in args.names or ([] if args.replay else list(SCENARIOS))]
+    runs += [(f"replay:{os.path.basename(path)}", path) for path in args.replay]
+    for name, replay in runs:
+        result = spawn_scenario(name, replay)
+        report["scenarios"][name] = result
+        print_result(name, result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Планировщик симуляции с фиксированным шагом. Все игровые системы
+вызываются как fn(dt) в порядке регистрации с одним и тем же dt,
+а отрисовка интерполирует позиции между двумя последними тиками.
+"""
+from panda3d.core import PandaNode
+import time
+
+
+class SystemTimes(dict):
+    """Простейший приемник замеров: имя системы -> список длительностей, с."""
+    def record(self, name, started, elapsed):
+        self.setdefault(name, []).append(elapsed)
+
+
+class SimScheduler:
+    def __init__(self, game, tick_rate=60, max_steps=5):
+        self.game = game
+        self.dt = 1.0 / tick_rate
+        self.max_steps = max_steps  # больше шагов за кадр не догоняем
+        self.systems = []           # (имя, fn) в порядке выполнения
+        self.paused = False
+
+        self.accumulator = 0.0
+        self.tick = 0          # номер текущего тика
+        self.time = 0.0        # время симуляции, с
+        self.alpha = 0.0       # доля шага между прошлым и текущим тиком
+        self.dropped = 0.0     # время, выброшенное из-за лимита шагов
+        # Приемник замеров с методом record(имя, начало, длительность)
+        # (SystemTimes, profiler.FrameProfiler); None - не замеряем
+        self.profile = None
+
+        # NodePath -> [позиция на прошлом тике, на текущем, показанная на экране]
+        self.tracked = {}
+
+    # --- Системы ---
+    def add(self, name, fn, before=None):
+        """Добавляет систему в конец или перед системой before."""
+        self.remove(name)
+        names = [s[0] for s in self.systems]
+        index = names.index(before) if before in names else len(names)
+        self.systems.insert(index, (name, fn))
+
+    def remove(self, name):
+        self.systems = [s for s in self.systems if s[0] != name]
+
+    def clear(self):
+        self.systems = []
+        self.tracked = {}
+        self.accumulator = 0.0
+
+    # --- Интерполяция ---
+    def track(self, np_):
+        """Позиция узла будет сглаживаться между тиками."""
+        pos = np_.getPos()
+        self.tracked[np_] = [pos, pos, pos]
+
+    def sim_pos(self, np_):
+        """Позиция узла на текущем тике, без интерполяции кадра."""
+        state = self.tracked.get(np_)
+        return state[1] if state else np_.getPos()
+
+    def restore(self):
+        """Возвращает узлы в состояние симуляции перед тиками."""
+        for np_, state in self.tracked.items():
+            pos = np_.getPos()
+            if pos != state[2]:
+                # Узел переставили вне тика (телепорт, спавн) - без сглаживания
+                state[0] = state[1] = pos
+            else:
+                np_.setPos(state[1])
+
+    def blend(self):
+        alpha = self.alpha
+        for np_, state in self.tracked.items():
+            prev, cur = state[0], state[1]
+            state[2] = prev + (cur - prev) * alpha
+            np_.setPos(state[2])
+
+    # --- Шаг ---
+    def start(self):
+        self.game.taskMgr.add(self.run, "SimStep", sort=10)
+
+    def stop(self):
+        self.game.taskMgr.remove("SimStep")
+
+    def run(self, task):
+        self.advance(globalClock.getDt())
+        return task.cont
+
+    def run_profiled(self):
+        profile = self.profile
+        clock = time.perf_counter
+        for name, fn in self.systems:
+            started = clock()
+            fn(self.dt)
+            profile.record(name, started, clock() - started)
+
+    def advance(self, frame_dt):
+        """Прогоняет столько тиков, сколько накопилось за frame_dt (не больше max_steps)."""
+        if self.paused:
+            return 0
+        self.restore()
+        self.accumulator += frame_dt
+        steps = 0
+        while self.accumulator >= self.dt and steps < self.max_steps:
+            for state in self.tracked.values():
+                state[0] = state[1]
+            # setFluidPos ведет отсчет от позиции на начало тика, а не кадра:
+            # иначе при нескольких тиках за кадр коллизии считаются иначе
+            PandaNode.resetAllPrevTransform()
+            if self.profile is None:
+                for name, fn in self.systems:
+                    fn(self.dt)
+            else:
+                self.run_profiled()
+            for np_, state in self.tracked.items():
+                state[1] = np_.getPos()
+            self.accumulator -= self.dt
+            self.tick += 1
+            self.time += self.dt
+            steps += 1
+            if self.paused:
+                break
+        if self.accumulator >= self.dt:
+            # Не успеваем - замедляем игру, а не копим отставание
+            self.dropped += self.accumulator - self.accumulator % self.dt
+            self.accumulator %= self.dt
+        self.alpha = self.accumulator / self.dt
+        self.blend()
+        return steps
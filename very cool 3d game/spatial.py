@@ -0,0 +1,67 @@
+import math
+
+
+class SpatialHash:
+    """
+    Равномерная сетка по XY для быстрых запросов "кто рядом".
+    Объекты сами сообщают о перемещении через move().
+    """
+    def __init__(self, cell_size=4.0):
+        self.cell_size = cell_size
+        self.inv_cell = 1.0 / cell_size
+        self.cells = {}      # (cx, cy) -> set объектов
+        self.positions = {}  # объект -> (x, y, z)
+        self.keys = {}       # объект -> (cx, cy)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def cell_key(self, x, y):
+        return (math.floor(x * self.inv_cell), math.floor(y * self.inv_cell))
+
+    def insert(self, obj, x, y, z=0.0):
+        key = self.cell_key(x, y)
+        self.cells.setdefault(key, set()).add(obj)
+        self.positions[obj] = (x, y, z)
+        self.keys[obj] = key
+
+    def move(self, obj, x, y, z=0.0):
+        old_key = self.keys.get(obj)
+        if old_key is None:
+            self.insert(obj, x, y, z)
+            return
+        self.positions[obj] = (x, y, z)
+        key = self.cell_key(x, y)
+        if key != old_key:
+            cell = self.cells[old_key]
+            cell.discard(obj)
+            if not cell:
+                del self.cells[old_key]
+            self.cells.setdefault(key, set()).add(obj)
+            self.keys[obj] = key
+
+    def remove(self, obj):
+        key = self.keys.pop(obj, None)
+        if key is None:
+            return
+        del self.positions[obj]
+        cell = self.cells[key]
+        cell.discard(obj)
+        if not cell:
+            del self.cells[key]
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+        self.keys.clear()
+
+    def query(self, x, y, radius):
+        """Кандидаты из клеток, задетых кругом radius (без точной проверки)."""
+        cx0, cy0 = self.cell_key(x - radius, y - radius)
+        cx1, cy1 = self.cell_key(x + radius, y + radius)
+        cells = self.cells
+        for cy in range(cy0, cy1 + 1):
+            for cx in range(cx0, cx1 + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    yield from cell
@@ -0,0 +1,539 @@
+from panda3d.core import GeomVertexFormat, GeomVertexData, Geom, GeomTriangles, GeomNode, GeomEnums
+from panda3d.core import BitMask32, Filename, Loader, LoaderOptions, NodePath, PandaNode
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import functools
+import hashlib
+import inspect
+import math
+import os
+
+# Меняйте при любых правках генерации, влияющих на результат
+TERRAIN_CACHE_VERSION = 2
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+
+def analytic_height(x, y):
+    """Исходная функция рельефа. Меш строится из ее значений в узлах сетки."""
+    val = 0
+    val += 6.0 * math.sin(x / 15.0) * math.cos(y / 15.0)
+    val += 2.0 * math.sin(x / 5.0 + y / 5.0)
+
+    dist_sq = x*x + y*y
+    if dist_sq < 100:
+        val *= (dist_sq / 100.0)
+    return val
+
+
+def terrain_heights(xs, ys):
+    """Векторная версия analytic_height для массивов координат."""
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    val = 6.0 * np.sin(xs / 15.0) * np.cos(ys / 15.0)
+    val += 2.0 * np.sin(xs / 5.0 + ys / 5.0)
+
+    dist_sq = xs * xs + ys * ys
+    return np.where(dist_sq < 100, val * (dist_sq / 100.0), val)
+
+
+def grid_indices(cols, rows):
+    """Индексы треугольников сетки cols x rows (по два на клетку, как в исходном цикле)."""
+    x = np.arange(cols - 1, dtype=np.uint32)
+    y = np.arange(rows - 1, dtype=np.uint32)[:, None]
+    v1 = y * cols + x
+    v2 = v1 + 1
+    v3 = v1 + cols + 1
+    v4 = v1 + cols
+    return np.stack((v1, v2, v3, v1, v3, v4), axis=-1).reshape(-1)
+
+
+def grid_perimeter(cols, rows):
+    """Индексы граничных вершин сетки, обход по кругу."""
+    top = np.arange(cols)
+    right = np.arange(1, rows) * cols + cols - 1
+    bottom = (rows - 1) * cols + np.arange(cols - 2, -1, -1)
+    left = np.arange(rows - 2, 0, -1) * cols
+    return np.concatenate((top, right, bottom, left)).astype(np.uint32)
+
+
+def grid_triangles(indices):
+    """GeomTriangles с uint32-индексами, записанными напрямую в память."""
+    prim = GeomTriangles(Geom.UHStatic)
+    prim.setIndexType(GeomEnums.NT_uint32)
+    handle = prim.modifyVertices()
+    handle.uncleanSetNumRows(len(indices))
+    memoryview(handle).cast('B')[:] = np.ascontiguousarray(indices, dtype=np.uint32).tobytes()
+    return prim
+
+
+def build_grid_node(name, xs, ys, us, vs, heights=None, skirt=0.0):
+    """
+    Собирает GeomNode сетки высот, записывая вершины и индексы напрямую
+    в память GeomVertexArrayData / GeomPrimitive.
+    xs/us - координаты и UV по столбцам, ys/vs - по строкам.
+    skirt > 0 добавляет "юбку" вниз по краю, чтобы закрыть щели между
+    соседними чанками разного LOD.
+    Возвращает (GeomNode, heights), heights имеет форму (rows, cols).
+    """
+    cols, rows = len(xs), len(ys)
+    if heights is None:
+        heights = terrain_heights(np.asarray(xs)[None, :], np.asarray(ys)[:, None])
+
+    # Формат V3N3T2: один массив, 8 float32 на вершину (vertex, normal, texcoord)
+    verts = np.empty((rows, cols, 8), dtype=np.float32)
+    verts[..., 0] = np.asarray(xs, dtype=np.float32)[None, :]
+    verts[..., 1] = np.asarray(ys, dtype=np.float32)[:, None]
+    verts[..., 2] = heights
+    verts[..., 3:5] = 0
+    verts[..., 5] = 1
+    verts[..., 6] = np.asarray(us, dtype=np.float32)[None, :]
+    verts[..., 7] = np.asarray(vs, dtype=np.float32)[:, None]
+
+    verts = verts.reshape(-1, 8)
+    indices = grid_indices(cols, rows)
+
+    if skirt > 0:
+        ring = grid_perimeter(cols, rows)
+        skirt_verts = verts[ring]
+        skirt_verts[:, 2] -= skirt
+        lower = np.arange(len(ring), dtype=np.uint32) + len(verts)
+        a, b = ring, np.roll(ring, -1)
+        a2, b2 = lower, np.roll(lower, -1)
+        # Обе стороны, чтобы юбку было видно при любом отсечении граней
+        skirt_tris = np.stack((a, a2, b2, a, b2, b, a, b2, a2, a, b, b2), axis=-1).reshape(-1)
+        verts = np.concatenate((verts, skirt_verts))
+        indices = np.concatenate((indices, skirt_tris))
+
+    vdata = GeomVertexData(name, GeomVertexFormat.getV3n3t2(), Geom.UHStatic)
+    vdata.uncleanSetNumRows(len(verts))
+    memoryview(vdata.modifyArray(0)).cast('B')[:] = verts.tobytes()
+
+    geom = Geom(vdata)
+    geom.addPrimitive(grid_triangles(indices))
+    node = GeomNode(name)
+    node.addGeom(geom)
+    return node, heights
+
+
+def build_collision_tree(name, mesh, cols, rows, leaf_cells=4):
+    """
+    Коллизия земли (Bit 2) в виде квадродерева: листья - GeomNode по
+    leaf_cells x leaf_cells клеток, узлы выше - PandaNode. Листья делят
+    GeomVertexData меша mesh (сетка cols x rows из build_grid_node), свой
+    у каждого только срез индексов, поэтому сборка - это numpy-срезы без
+    объекта на каждый треугольник. Траверсер отсекает ветки по их bounds,
+    и луч гравитации проверяет только пару сотен треугольников под игроком.
+    Дерево скрыто: для коллизий это не важно, а меш уже рисует mesh.
+    """
+    vdata = mesh.getGeom(0).getVertexData()
+    cells = grid_indices(cols, rows).reshape(rows - 1, cols - 1, 6)
+    into = BitMask32.bit(2)
+
+    def build(x0, y0, x1, y1):
+        if x1 - x0 <= leaf_cells and y1 - y0 <= leaf_cells:
+            geom = Geom(vdata)
+            geom.addPrimitive(grid_triangles(cells[y0:y1, x0:x1].reshape(-1)))
+            node = GeomNode(f"{name}_{x0}_{y0}")
+            node.addGeom(geom)
+            node.setIntoCollideMask(into)
+            return node
+
+        node = PandaNode(f"{name}_{x0}_{y0}_{x1}_{y1}")
+        xm = (x0 + x1) // 2 if x1 - x0 > leaf_cells else x1
+        ym = (y0 + y1) // 2 if y1 - y0 > leaf_cells else y1
+        for cx0, cx1 in ((x0, xm), (xm, x1)):
+            for cy0, cy1 in ((y0, ym), (ym, y1)):
+                if cx1 > cx0 and cy1 > cy0:
+                    node.addChild(build(cx0, cy0, cx1, cy1))
+        return node
+
+    root = build(0, 0, cols - 1, rows - 1)
+    root.setName(name)
+    NodePath(root).hide()
+    return root
+
+
+class HeightGrid:
+    """
+    Кэш высот сетки с origin в вершине (0, 0) и шагом spacing. Высота
+    считается по тем же треугольникам, что и в меше: клетка делится
+    диагональю (x, y)-(x+1, y+1). За краем сетки берется ближайший край.
+    """
+    def __init__(self, heights, origin, spacing):
+        self.heights = np.ascontiguousarray(heights, dtype=np.float64)
+        self.rows, self.cols = self.heights.shape
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.spacing = float(spacing)
+        self.inv_spacing = 1.0 / self.spacing
+        # Одиночный запрос - замыкание над плоским list: без numpy-индексации
+        # и без поиска атрибутов self на каждом вызове
+        self.get_height = self._height_lookup()
+
+    # Сетка уходит в процесс worker (get_heights), а замыкание не pickle-ится
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["get_height"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.get_height = self._height_lookup()
+
+    def _height_lookup(self, floor=math.floor):
+        flat = self.heights.ravel().tolist()
+        cols, rows = self.cols, self.rows
+        inv = self.inv_spacing
+        bx = self.origin[0] * inv
+        by = self.origin[1] * inv
+        last_x, last_y = cols - 1.0, rows - 1.0
+        up = cols + 1
+
+        def get_height(x, y):
+            gx = x * inv - bx
+            gy = y * inv - by
+            x0 = floor(gx)
+            y0 = floor(gy)
+            # Быстрый путь - точка внутри сетки; иначе прижимаем к краю
+            if not (0 <= x0 < cols - 1 and 0 <= y0 < rows - 1):
+                gx = min(max(gx, 0.0), last_x)
+                gy = min(max(gy, 0.0), last_y)
+                x0 = min(floor(gx), cols - 2)
+                y0 = min(floor(gy), rows - 2)
+            fx = gx - x0
+            fy = gy - y0
+            i = y0 * cols + x0
+            h00 = flat[i]
+            h11 = flat[i + up]
+            if fx >= fy:
+                h10 = flat[i + 1]
+                return h00 + fx * (h10 - h00) + fy * (h11 - h10)
+            h01 = flat[i + cols]
+            return h00 + fy * (h01 - h00) + fx * (h11 - h01)
+
+        return get_height
+
+    def get_heights(self, xs, ys):
+        """Высоты для массивов координат за один вызов."""
+        gx = np.clip((np.asarray(xs, dtype=np.float64) - self.origin[0]) / self.spacing, 0.0, self.cols - 1.0)
+        gy = np.clip((np.asarray(ys, dtype=np.float64) - self.origin[1]) / self.spacing, 0.0, self.rows - 1.0)
+        x0 = np.minimum(gx.astype(np.intp), self.cols - 2)
+        y0 = np.minimum(gy.astype(np.intp), self.rows - 2)
+        fx = gx - x0
+        fy = gy - y0
+
+        h = self.heights
+        h00 = h[y0, x0]
+        h11 = h[y0 + 1, x0 + 1]
+        upper = fx >= fy
+        # В "верхнем" треугольнике третья вершина (x+1, y), в нижнем - (x, y+1)
+        corner = np.where(upper, h[y0, x0 + 1], h[y0 + 1, x0])
+        fa = np.where(upper, fx, fy)
+        fb = np.where(upper, fy, fx)
+        return h00 + fa * (corner - h00) + fb * (h11 - corner)
+
+
+@functools.lru_cache(maxsize=None)
+def terrain_code_digest():
+    """Хэш исходников функций, из которых строится меш (считается один раз)."""
+    h = hashlib.sha1(str(TERRAIN_CACHE_VERSION).encode())
+    for fn in (analytic_height, terrain_heights, grid_indices, grid_triangles, build_grid_node, build_collision_tree):
+        h.update(inspect.getsource(fn).encode())
+    return h.hexdigest()
+
+
+def terrain_cache_key(**params):
+    """Ключ кэша: параметры генерации + версия кода."""
+    h = hashlib.sha1(terrain_code_digest().encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()[:16]
+
+
+def vertex_heights(node):
+    """Высоты из Z-колонки вершин GeomNode (без копирования буфера)."""
+    array = node.getGeom(0).getVertexData().getArray(0)
+    return np.frombuffer(memoryview(array), dtype=np.float32).reshape(-1, 8)[:, 2]
+
+
+class TerrainCache:
+    """
+    Готовые меши террейна в .bam-файлах. Имя файла содержит ключ, поэтому
+    после изменения параметров или кода старый файл просто не находится.
+    Хранятся max_entries последних использованных файлов (по mtime, его
+    обновляет load): карты разных размеров не вытесняют друг друга, а
+    устаревшие по коду со временем уходят.
+
+    Теплое чтение .bam оказалось не быстрее сборки numpy-кодом ни на одном
+    из размеров 256-1024 (bench_terrain_cache), поэтому Game создает кэш
+    только по явному terrain_cache=True.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=8):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"terrain_{key}.bam")
+
+    def load(self, key):
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        options = LoaderOptions(LoaderOptions.LF_no_cache | LoaderOptions.LF_report_errors)
+        node = Loader.getGlobalPtr().loadSync(Filename.fromOsSpecific(path), options)
+        if node is None or node.getTag("cache_key") != key or not isinstance(node, GeomNode):
+            # Битый или чужой файл - пересоберем
+            os.remove(path)
+            return None
+        os.utime(path)
+        return node
+
+    def entries(self):
+        """Файлы кэша от давно использованных к недавним."""
+        paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                 if name.startswith("terrain_") and name.endswith(".bam")]
+        return sorted(paths, key=os.path.getmtime)
+
+    def store(self, key, node):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path_for(key)
+        old = [p for p in self.entries() if p != path]
+        for stale in old[:max(0, len(old) - self.max_entries + 1)]:
+            os.remove(stale)
+
+        node.setTag("cache_key", key)
+        tmp_path = path + ".tmp"
+        if not NodePath(node).writeBamFile(Filename.fromOsSpecific(tmp_path)):
+            return False
+        os.replace(tmp_path, path)
+        return True
+
+
+def load_or_build_terrain(size, scale, cache=None):
+    """
+    Возвращает (GeomNode, heights, collision) для карты size x size, беря
+    меш и коллизию из кэша, если они есть. heights имеет форму (size, size).
+    """
+    key = terrain_cache_key(size=size, scale=scale)
+    node = cache.load(key) if cache else None
+    if node is not None and node.getNumChildren() == 1:
+        # Дерево коллизий хранится в том же .bam дочерним узлом меша
+        collision = node.getChild(0)
+        node.removeChild(collision)
+        return node, vertex_heights(node).reshape(size, size), collision
+
+    offset = (size * scale) / 2
+    idx = np.arange(size)
+    coords = idx * scale - offset
+    uvs = idx / 10.0
+    node, heights = build_grid_node('TerrainMesh', coords, coords, uvs, uvs)
+    collision = build_collision_tree('TerrainCollision', node, size, size)
+    if cache:
+        node.addChild(collision)
+        cache.store(key, node)
+        node.removeChild(collision)
+    return node, heights, collision
+
+
+def apply_floor_texture(game, np_):
+    tex = game.assets.texture("floor")
+    if tex:
+        np_.setTexture(tex)
+        np_.setColor(1, 1, 1, 1)
+    else:
+        np_.setColor(0.3, 0.5, 0.3)
+
+
+class ProceduralTerrain:
+    def __init__(self, game, size=256, scale=2.0, cache=None):
+        self.game = game
+        self.size = size
+        self.scale = scale
+        self.cache = cache
+        self.root = game.render.attachNewNode("Terrain")
+        self.generate()
+        self.apply_texture()
+
+    def get_height(self, x, y):
+        return self.grid.get_height(x, y)
+
+    def get_heights(self, xs, ys):
+        return self.grid.get_heights(xs, ys)
+
+    def generate(self):
+        offset = (self.size * self.scale) / 2
+        node, heights, collision = load_or_build_terrain(self.size, self.scale, self.cache)
+        # Сетка хранит те же float32 высоты, что ушли в вершины меша
+        self.grid = HeightGrid(heights.astype(np.float32), (-offset, -offset), self.scale)
+
+        # Сам меш в коллизиях не участвует - только квадродерево
+        self.mesh_np = self.root.attachNewNode(node)
+        self.mesh_np.setCollideMask(BitMask32.allOff())
+        self.collision_np = self.root.attachNewNode(collision)
+
+    def apply_texture(self):
+        apply_floor_texture(self.game, self.mesh_np)
+
+    # Между играми рельеф не пересоздается, а прячется (теплый рестарт)
+    def show(self):
+        self.root.unstash()
+
+    def hide(self):
+        self.root.stash()
+
+    def cleanup(self):
+        self.root.removeNode()
+
+
+def build_chunk(key, lod, cells, scale, skirt):
+    """Строит геометрию одного чанка. Вызывается из рабочего потока."""
+    cx, cy = key
+    step = 1 << lod
+    chunk_world = cells * scale
+    idx = np.arange(0, cells + 1, step)
+    xs = cx * chunk_world + idx * scale
+    ys = cy * chunk_world + idx * scale
+    node, heights = build_grid_node(f'TerrainChunk_{cx}_{cy}_{lod}', xs, ys,
+                                    xs / (scale * 10.0), ys / (scale * 10.0), skirt=skirt)
+    collision = build_collision_tree(f'TerrainChunkCollision_{cx}_{cy}', node, len(xs), len(ys))
+    return key, lod, node, heights, collision
+
+
+class TerrainChunk(HeightGrid):
+    def __init__(self, key, lod, node_path, heights, origin, spacing):
+        HeightGrid.__init__(self, heights.astype(np.float32), origin, spacing)
+        self.key = key
+        self.lod = lod
+        self.node_path = node_path
+
+
+class ChunkedTerrain:
+    """
+    Бесконечный террейн из чанков вокруг игрока. Чанки строятся в фоновом
+    потоке и подключаются к сцене в задаче TerrainStream; дальние чанки
+    получают более грубый LOD (шаг сетки 2^lod).
+    """
+    def __init__(self, game, chunk_cells=32, scale=2.0, view_radius=4, lod_radius=1.5,
+                 max_lod=2, attach_per_frame=2):
+        self.game = game
+        self.chunk_cells = chunk_cells
+        self.scale = scale
+        self.chunk_world = chunk_cells * scale
+        self.view_radius = view_radius  # в чанках
+        self.lod_radius = lod_radius    # в чанках, дальше каждый радиус - следующий LOD
+        self.max_lod = max_lod
+        self.attach_per_frame = attach_per_frame
+        self.skirt = 4.0 * scale
+
+        self.root = game.render.attachNewNode("Terrain")
+        apply_floor_texture(game, self.root)
+
+        self.chunks = {}   # (cx, cy) -> TerrainChunk, то что сейчас на экране
+        self.pending = {}  # (cx, cy) -> (lod, Future)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="TerrainWorker")
+        self.show()
+
+    def show(self):
+        """Начало игры: чанки под стартовой точкой строим сразу, чтобы было на чем стоять, дальше - стриминг."""
+        for key, lod in self.wanted_chunks(0.0, 0.0).items():
+            chunk = self.chunks.get(key)
+            if lod == 0 and not (chunk and chunk.lod == 0):
+                self.attach(*build_chunk(key, lod, self.chunk_cells, self.scale, self.skirt))
+        self.root.unstash()
+        self.game.taskMgr.add(self.update, "TerrainStream")
+
+    def hide(self):
+        """Между играми: чанки остаются (теплый рестарт), стриминг стоит."""
+        self.game.taskMgr.remove("TerrainStream")
+        self.root.stash()
+
+    def chunk_key(self, x, y):
+        return (math.floor(x / self.chunk_world), math.floor(y / self.chunk_world))
+
+    def lod_for(self, dist):
+        return min(self.max_lod, int(dist // self.lod_radius))
+
+    def wanted_chunks(self, x, y):
+        pcx, pcy = self.chunk_key(x, y)
+        # Расстояние считаем от центра чанка до игрока, в чанках
+        fx = x / self.chunk_world - 0.5
+        fy = y / self.chunk_world - 0.5
+        r = self.view_radius
+        wanted = {}
+        for cy in range(pcy - r, pcy + r + 1):
+            for cx in range(pcx - r, pcx + r + 1):
+                dist = math.hypot(cx - fx, cy - fy)
+                if dist <= r + 0.5:
+                    wanted[(cx, cy)] = self.lod_for(dist)
+        return wanted
+
+    def attach(self, key, lod, node, heights, collision):
+        origin = (key[0] * self.chunk_world, key[1] * self.chunk_world)
+        np_ = self.root.attachNewNode(node)
+        np_.setCollideMask(BitMask32.allOff())
+        # Коллизия - дочерний узел чанка, удаляется вместе с ним
+        np_.attachNewNode(collision)
+        old = self.chunks.get(key)
+        self.chunks[key] = TerrainChunk(key, lod, np_, heights, origin, self.scale * (1 << lod))
+        if old:
+            old.node_path.removeNode()
+
+    def update(self, task):
+        focus = self.game.camera.getPos(self.game.render)
+        wanted = self.wanted_chunks(focus.x, focus.y)
+
+        # Готовые чанки подключаем понемногу, чтобы не было скачка кадра
+        attached = 0
+        for key, (lod, future) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[key]
+            if wanted.get(key) != lod:
+                continue
+            self.attach(*future.result())
+            attached += 1
+            if attached >= self.attach_per_frame:
+                break
+
+        for key, lod in wanted.items():
+            chunk = self.chunks.get(key)
+            if chunk and chunk.lod == lod:
+                continue
+            if key in self.pending and self.pending[key][0] == lod:
+                continue
+            future = self.executor.submit(build_chunk, key, lod, self.chunk_cells, self.scale, self.skirt)
+            self.pending[key] = (lod, future)
+
+        for key in [k for k in self.chunks if k not in wanted]:
+            self.chunks.pop(key).node_path.removeNode()
+
+        return task.cont
+
+    def get_height(self, x, y):
+        # Высота по той геометрии, которая сейчас показана; если чанк еще
+        # не подгружен - по аналитической функции
+        chunk = self.chunks.get(self.chunk_key(x, y))
+        if chunk:
+            return chunk.get_height(x, y)
+        return analytic_height(x, y)
+
+    def get_heights(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        cx = np.floor(xs / self.chunk_world).astype(np.int64)
+        cy = np.floor(ys / self.chunk_world).astype(np.int64)
+        out = terrain_heights(xs, ys)
+        # Группируем запросы по чанкам - их немного, точек может быть много
+        for key in set(zip(cx.tolist(), cy.tolist())):
+            chunk = self.chunks.get(key)
+            if chunk:
+                mask = (cx == key[0]) & (cy == key[1])
+                out[mask] = chunk.get_heights(xs[mask], ys[mask])
+        return out
+
+    def cleanup(self):
+        self.game.taskMgr.remove("TerrainStream")
+        for _, future in self.pending.values():
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        self.pending = {}
+        self.chunks = {}
+        self.root.removeNode()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from main import PROJECTILE_HIT_RADIUS
+
+
+def brute_first_hits(pos, points, radius):
+    """Эталон: точки по порядку, каждой - ближайший еще не пораженный враг ближе radius."""
+    hits = []
+    taken = set()
+    for i, p in enumerate(points):
+        d_sq = ((pos - p) ** 2).sum(axis=1)
+        rows = [r for r in np.argsort(d_sq, kind="stable") if d_sq[r] < radius * radius and r not in taken]
+        if rows:
+            taken.add(rows[0])
+            hits.append((i, rows[0]))
+    return hits
+
+
+def spawn_crowd(game, monkeypatch, n, seed):
+    manager = game.enemy_manager
+    monkeypatch.setattr(manager, "max_enemies", 0)  # только свои враги
+    rng = np.random.default_rng(seed)
+    for x, y in rng.uniform(-15, 15, (n, 2)).tolist():
+        manager.spawn_at(x, y)
+    assert len(manager.enemies) == n
+    return manager, rng
+
+
+def test_first_hits_matches_brute_force(game, monkeypatch):
+    manager, rng = spawn_crowd(game, monkeypatch, 100, seed=4)
+    table = manager.table
+    pos = table.pos[:table.count].copy()
+    for radius in (0.5, PROJECTILE_HIT_RADIUS, 4.0):
+        points = np.concatenate((pos[rng.choice(len(pos), 150)] + rng.uniform(-2, 2, (150, 3)),
+                                 rng.uniform(-20, 20, (50, 3))))
+        expected = [(i, table.owners[row]) for i, row in brute_first_hits(pos, points, radius)]
+        assert expected
+        assert manager.first_hits(points, radius) == expected
+
+
+def test_first_hits_skips_dying(game, monkeypatch):
+    manager, _ = spawn_crowd(game, monkeypatch, 20, seed=5)
+    table = manager.table
+    target = manager.enemies[7]
+    point = table.pos[target.row][None, :].copy()
+    assert manager.first_hits(point, 0.5) == [(0, target)]
+
+    # С worker убитый ждет результата тика в таблице (EnemyManager.kill)
+    monkeypatch.setitem(manager.dying, target, None)
+    assert all(enemy is not target for _, enemy in manager.first_hits(point, 5.0))
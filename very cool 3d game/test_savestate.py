@@ -0,0 +1,73 @@
+import struct
+
+import numpy as np
+import pytest
+from panda3d.core import Vec3
+
+import savestate
+
+
+def test_autosave_matches_save_between_ticks(game, tmp_path, monkeypatch):
+    # Как в start_game с autosave=PATH; за 10 с появятся враги (спавн раз в 3 с)
+    autosave = savestate.AutoSave(game, str(tmp_path / "auto.sav"), interval=10.0)
+    monkeypatch.setattr(game, "autosave", autosave)
+    game.scheduler.add("autosave", autosave)
+    while not autosave.timings:
+        game.taskMgr.step()
+
+    savestate.save(game, str(tmp_path / "manual.sav"))
+    assert game.enemy_manager.enemies
+    assert (tmp_path / "auto.sav").read_bytes() == (tmp_path / "manual.sav").read_bytes()
+
+
+def test_load_rejects_broken_files(game, tmp_path):
+    abilities = game.player.abilities
+    abilities.unlock(abilities.locked()[0])
+    for _ in range(30):
+        game.taskMgr.step()
+    path = tmp_path / "broken.sav"
+    savestate.save(game, str(path))
+    good = path.read_bytes()
+    tick = game.scheduler.tick
+
+    # Обрезанный где угодно файл
+    for cut in range(0, len(good), 61):
+        path.write_bytes(good[:cut])
+        with pytest.raises(ValueError):
+            savestate.load(game, str(path))
+
+    # id способности за пределами ABILITY_LIST
+    header_size, = struct.unpack_from("<I", good, len(savestate.MAGIC))
+    at = len(savestate.MAGIC) + 4 + header_size + savestate.WORLD.size + savestate.PLAYER.size + savestate.ABILITIES.size
+    broken = bytearray(good)
+    broken[at] = 200
+    path.write_bytes(bytes(broken))
+    with pytest.raises(ValueError, match="ability id"):
+        savestate.load(game, str(path))
+
+    # Сессия не тронута
+    assert game.scheduler.tick == tick
+
+
+def test_save_load_round_trip(game, tmp_path):
+    rng = np.random.default_rng(3)
+    for d in rng.normal(size=(20, 3)).tolist():
+        game.spawn_projectile((0, 0, 2), Vec3(*d))
+    while len(game.enemy_manager.enemies) < 3:
+        game.taskMgr.step()
+    path = str(tmp_path / "start.sav")
+    savestate.save(game, path)
+    start = open(path, "rb").read()
+
+    def run_and_save(name):
+        for _ in range(120):
+            game.taskMgr.step()
+        savestate.save(game, str(tmp_path / name))
+        return (tmp_path / name).read_bytes()
+
+    first = run_and_save("first.sav")
+    savestate.load(game, path)
+    savestate.save(game, str(tmp_path / "again.sav"))
+    assert (tmp_path / "again.sav").read_bytes() == start
+    # После загрузки игра идет тик в тик так же, как после сохранения
+    assert run_and_save("second.sav") == first
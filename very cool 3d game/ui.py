@@ -1,7 +1,18 @@
 from direct.gui.DirectGui import *
-from panda3d.core import TextNode, WindowProperties
+from panda3d.core import TextNode
+from interaction import TARGET_CHANGED
+from hud import Binding, TimedWidget
+from abilities import ABILITY_UNLOCKED
 import sys
 
+SPELL_ROWS = 8  # строк в списке заклинаний на одной странице книги
+
+
+def set_text(widget, text):
+    """Меняет текст виджета, только если он другой (иначе DirectGui пересобирает текст зря)."""
+    if widget['text'] != text:
+        widget['text'] = text
+
 class UIManager:
     def __init__(self, game):
         self.game = game
@@ -11,10 +22,18 @@ class UIManager:
         self.game_over_frame = None  # Добавлено для хранения окна смерти
         self.player_ref = None
         self.is_menu_open = False
-        self.notification_label = None
+
+        # HUD игры создается один раз (build_game_ui) и дальше только
+        # перепривязывается к новому игроку
+        self.health_label = None
+        self.health_binding = None
+        self.prompt = None
+        self.notification = None
+        self.flash = None
         
         self.current_tab = "spells" 
         self.current_spell_idx = 0
+        self.spells_dirty = True
 
     def hide_all_menus(self):
         if self.main_menu_frame: self.main_menu_frame.hide()
@@ -26,6 +45,7 @@ class UIManager:
     def show_main_menu(self, start_callback):
         self.is_menu_open = True
         if self.game_ui_frame: self.game_ui_frame.hide()
+        if self.book_frame: self.book_frame.hide()
         if self.main_menu_frame: self.main_menu_frame.destroy()
         if self.game_over_frame: self.game_over_frame.destroy() # Удаляем окно смерти при переходе в меню
         
@@ -35,9 +55,7 @@ class UIManager:
         DirectButton(parent=self.main_menu_frame, text="Enter", scale=0.1, pos=(0, 0, 0), command=start_callback)
         DirectButton(parent=self.main_menu_frame, text="Quit", scale=0.1, pos=(0, 0, -0.2), command=sys.exit)
 
-    def setup_game_ui(self, player):
-        self.player_ref = player
-        if self.game_ui_frame: self.game_ui_frame.destroy()
+    def build_game_ui(self):
         self.game_ui_frame = DirectFrame(frameColor=(0,0,0,0), frameSize=(-1, 1, -1, 1))
         
         self.health_label = DirectLabel(parent=self.game_ui_frame, text="HP: 100", scale=0.07, pos=(-1.1, 0, 0.9), text_align=TextNode.ALeft, text_fg=(1,0,0,1))
@@ -46,50 +64,64 @@ class UIManager:
         self.prompt = DirectLabel(parent=self.game_ui_frame, text="[E] Read", scale=0.07, pos=(0, 0, -0.2), text_fg=(1, 1, 1, 1))
         self.prompt.hide()
         
-        self.notification_label = DirectLabel(parent=self.game_ui_frame, text="", scale=0.06, pos=(0, 0, 0.7), text_fg=(1, 1, 0, 1), frameColor=(0,0,0,0))
-        self.notification_label.hide()
+        notification_label = DirectLabel(parent=self.game_ui_frame, text="", scale=0.06, pos=(0, 0, 0.7), text_fg=(1, 1, 0, 1), frameColor=(0,0,0,0))
+        self.notification = TimedWidget(self.game, notification_label, "notify")
+
+        flash_frame = DirectFrame(parent=self.game_ui_frame, frameColor=(1, 0, 0, 0.3), frameSize=(-2, 2, -2, 2))
+        flash_frame.setTransparency(True)
+        self.flash = TimedWidget(self.game, flash_frame, "flash")
+
+    def setup_game_ui(self, player):
+        self.player_ref = player
+        if self.game_ui_frame is None:
+            self.build_game_ui()
+        self.prompt.hide()
+        self.notification.cancel()
+        self.flash.cancel()
+
+        # Надпись HP меняется только когда меняется здоровье игрока
+        if self.health_binding: self.health_binding.unbind()
+        self.health_binding = Binding(player.hp, self.health_label, lambda hp: f"HP: {int(hp)}")
+        self.game.accept(TARGET_CHANGED, self.show_interact_prompt)
+
+        # Книга остается прежней - у нового игрока свой список способностей
+        self.current_spell_idx = 0
+        self.spells_dirty = True
+        self.game.accept(ABILITY_UNLOCKED, self.on_ability_unlocked)
 
     def show_notification(self, text):
-        if self.notification_label:
-            self.notification_label['text'] = text
-            self.notification_label.show()
-            self.game.taskMgr.doMethodLater(3.0, lambda t: self.notification_label.hide(), 'hidenotify')
+        if self.notification:
+            self.notification.show(3.0, text)
 
-    def show_interact_prompt(self, show):
+    def show_interact_prompt(self, target):
+        # Вызывается только при смене цели (событие TARGET_CHANGED)
         if not self.prompt: return
-        if show: self.prompt.show()
+        if target:
+            self.prompt['text'] = target.interact_prompt
+            self.prompt.show()
         else: self.prompt.hide()
 
-    def update(self, dt):
-        if not self.player_ref or not self.health_label: return
-        self.health_label['text'] = f"HP: {int(self.player_ref.health)}"
-
     def flash_damage(self):
-        f = DirectFrame(frameColor=(1, 0, 0, 0.3), frameSize=(-2, 2, -2, 2))
-        f.setTransparency(True)
-        self.game.taskMgr.doMethodLater(0.2, lambda t: f.destroy(), 'flash')
+        if self.flash:
+            self.flash.show(0.2)
 
     # --- КНИГА (ESC) ---
+    # Книга строится один раз и между открытиями только прячется. Страницы
+    # вкладок создаются при первом показе; дальше меняются лишь тексты
+    # уже созданных виджетов, когда открывается новая способность.
     def toggle_book_ui(self):
         if self.book_frame and not self.book_frame.isHidden():
             self.book_frame.hide()
             self.is_menu_open = False
-            props = WindowProperties()
-            props.setCursorHidden(True)
-            props.setMouseMode(WindowProperties.M_relative)
-            self.game.win.requestProperties(props)
+            self.game.set_mouse_captured(True)
         else:
-            self.build_book_ui()
+            if self.book_frame is None: self.build_book_ui()
+            self.show_tab(self.current_tab)
             self.book_frame.show()
             self.is_menu_open = True
-            props = WindowProperties()
-            props.setCursorHidden(False)
-            props.setMouseMode(WindowProperties.M_absolute)
-            self.game.win.requestProperties(props)
+            self.game.set_mouse_captured(False)
 
     def build_book_ui(self):
-        if self.book_frame: self.book_frame.destroy()
-        
         self.book_frame = DirectFrame(frameColor=(0.4, 0.25, 0.1, 1), frameSize=(-1.2, 1.2, -0.8, 0.8))
         self.page_left = DirectFrame(parent=self.book_frame, frameColor=(0.9, 0.85, 0.7, 1), frameSize=(-1.1, -0.1, -0.7, 0.7))
         self.page_right = DirectFrame(parent=self.book_frame, frameColor=(0.9, 0.85, 0.7, 1), frameSize=(0.1, 1.1, -0.7, 0.7))
@@ -97,58 +129,107 @@ class UIManager:
         DirectButton(parent=self.page_left, text="Spells", scale=0.06, pos=(-0.8, 0, 0.6), command=self.set_tab, extraArgs=["spells"])
         DirectButton(parent=self.page_left, text="System", scale=0.06, pos=(-0.5, 0, 0.6), command=self.set_tab, extraArgs=["system"])
         
-        self.content_node = DirectFrame(parent=self.book_frame, frameColor=(0,0,0,0))
-        self.refresh_book_content()
+        self.tab_pages = {}  # вкладка -> DirectFrame со своими виджетами
+        self.book_frame.hide()
 
     def set_tab(self, tab):
         self.current_tab = tab
-        self.refresh_book_content()
-
-    def refresh_book_content(self):
-        self.content_node.destroy()
-        self.content_node = DirectFrame(parent=self.book_frame, frameColor=(0,0,0,0))
-        
-        if self.current_tab == "spells":
-            self.draw_spells_tab()
-        elif self.current_tab == "system":
-            self.draw_system_tab()
+        self.show_tab(tab)
+
+    def show_tab(self, tab):
+        page = self.tab_pages.get(tab)
+        if page is None:
+            page = self.tab_pages[tab] = DirectFrame(parent=self.book_frame, frameColor=(0,0,0,0))
+            if tab == "spells":
+                self.build_spells_tab(page)
+            elif tab == "system":
+                self.build_system_tab(page)
+        for name, other in self.tab_pages.items():
+            if name != tab: other.hide()
+        page.show()
+
+        if tab == "spells":
+            if self.spells_dirty: self.refresh_spells()
+        elif tab == "system":
+            self.sync_system_tab()
+
+    def build_spells_tab(self, page):
+        self.spell_empty = DirectLabel(parent=page, text="Empty...", scale=0.1, pos=(-0.6, 0, 0), text_fg=(0.5,0.5,0.5,1))
+        self.spell_name = DirectLabel(parent=page, text="", scale=0.12, pos=(-0.6, 0, 0.3), text_fg=(0,0,0,1))
+        self.spell_description = DirectLabel(parent=page, text="", scale=0.06, pos=(-0.6, 0, 0.1), text_fg=(0.2,0.2,0.2,1), text_wordwrap=12)
+        self.spell_next = DirectButton(parent=page, text="Next >", scale=0.08, pos=(0.6, 0, -0.5), command=self.next_spell)
+        self.spell_counter = DirectLabel(parent=page, text="", scale=0.05, pos=(0.6, 0, -0.6), text_fg=(0,0,0,1))
+        # Список открытых заклинаний постранично: строк столько, сколько
+        # влезает на страницу, сколько бы способностей ни было открыто
+        self.spell_rows = [
+            DirectButton(parent=page, text="", scale=0.05, pos=(0.6, 0, 0.55 - i * 0.1), relief=None,
+                         text_fg=(0.2, 0.1, 0, 1), command=self.select_spell, extraArgs=[i])
+            for i in range(SPELL_ROWS)
+        ]
+        self.spells_dirty = True
+
+    def refresh_spells(self):
+        """Переставляет тексты вкладки заклинаний под текущий список открытых способностей."""
+        self.spells_dirty = False
+        abilities = self.player_ref.abilities
+        unlocked = abilities.unlocked
+        widgets = (self.spell_name, self.spell_description, self.spell_next, self.spell_counter)
 
-    def draw_spells_tab(self):
-        unlocked = [k for k, v in self.player_ref.abilities.abilities.items() if v["unlocked"]]
-        
         if not unlocked:
-            DirectLabel(parent=self.content_node, text="Empty...", scale=0.1, pos=(-0.6, 0, 0), text_fg=(0.5,0.5,0.5,1))
+            self.spell_empty.show()
+            for widget in widgets + tuple(self.spell_rows): widget.hide()
             return
+        self.spell_empty.hide()
+        for widget in widgets: widget.show()
 
         if self.current_spell_idx >= len(unlocked): self.current_spell_idx = 0
-            
-        key = unlocked[self.current_spell_idx]
-        data = self.player_ref.abilities.abilities[key]
-        
-        DirectLabel(parent=self.content_node, text=data["name"], scale=0.12, pos=(-0.6, 0, 0.3), text_fg=(0,0,0,1))
-        DirectLabel(parent=self.content_node, text=data["description"], scale=0.06, pos=(-0.6, 0, 0.1), text_fg=(0.2,0.2,0.2,1), text_wordwrap=12)
-        
-        if len(unlocked) > 1:
-            DirectButton(parent=self.content_node, text="Next >", scale=0.08, pos=(0.6, 0, -0.5), command=self.next_spell)
-            
-        DirectLabel(parent=self.content_node, text=f"{self.current_spell_idx + 1}/{len(unlocked)}", scale=0.05, pos=(0.6, 0, -0.6), text_fg=(0,0,0,1))
+        data = abilities.abilities[unlocked[self.current_spell_idx]]
+        set_text(self.spell_name, data.name)
+        set_text(self.spell_description, data.description)
+        set_text(self.spell_counter, f"{self.current_spell_idx + 1}/{len(unlocked)}")
+        if len(unlocked) < 2: self.spell_next.hide()
+
+        first = self.current_spell_idx - self.current_spell_idx % SPELL_ROWS
+        for i, row in enumerate(self.spell_rows):
+            idx = first + i
+            if idx >= len(unlocked):
+                row.hide()
+                continue
+            name = abilities.abilities[unlocked[idx]].name
+            set_text(row, f"> {name}" if idx == self.current_spell_idx else name)
+            row.show()
 
     def next_spell(self):
-        unlocked = [k for k, v in self.player_ref.abilities.abilities.items() if v["unlocked"]]
-        self.current_spell_idx = (self.current_spell_idx + 1) % len(unlocked)
-        self.refresh_book_content()
+        self.current_spell_idx = (self.current_spell_idx + 1) % len(self.player_ref.abilities.unlocked)
+        self.refresh_spells()
 
-    def draw_system_tab(self):
+    def select_spell(self, row):
+        self.current_spell_idx += row - self.current_spell_idx % SPELL_ROWS
+        self.refresh_spells()
+
+    def on_ability_unlocked(self, abilities, key):
+        if not self.player_ref or abilities is not self.player_ref.abilities: return
+        # Закрытая книга обновится при следующем открытии
+        self.spells_dirty = True
+        if self.book_frame and not self.book_frame.isHidden() and self.current_tab == "spells":
+            self.refresh_spells()
+
+    def build_system_tab(self, page):
         # Настройка чувствительности
-        DirectLabel(parent=self.content_node, text="Mouse Sens", scale=0.05, pos=(-0.6, 0, 0.1), text_fg=(0,0,0,1))
-        self.sens_slider = DirectSlider(parent=self.content_node, range=(0.05, 1.0), value=self.player_ref.mouse_sensitivity, pageSize=0.1, pos=(-0.6, 0, 0), scale=0.3, command=self.update_sens)
+        DirectLabel(parent=page, text="Mouse Sens", scale=0.05, pos=(-0.6, 0, 0.1), text_fg=(0,0,0,1))
+        self.sens_slider = DirectSlider(parent=page, range=(0.05, 1.0), value=self.player_ref.mouse_sensitivity, pageSize=0.1, pos=(-0.6, 0, 0), scale=0.3, command=self.update_sens)
         
         # Настройка FOV
-        DirectLabel(parent=self.content_node, text="FOV", scale=0.05, pos=(-0.6, 0, -0.1), text_fg=(0,0,0,1))
+        DirectLabel(parent=page, text="FOV", scale=0.05, pos=(-0.6, 0, -0.1), text_fg=(0,0,0,1))
         current_fov = self.game.camLens.getFov()[0]
-        self.fov_slider = DirectSlider(parent=self.content_node, range=(60, 110), value=current_fov, pageSize=5, pos=(-0.6, 0, -0.2), scale=0.3, command=self.update_fov)
+        self.fov_slider = DirectSlider(parent=page, range=(60, 110), value=current_fov, pageSize=5, pos=(-0.6, 0, -0.2), scale=0.3, command=self.update_fov)
         
-        DirectButton(parent=self.content_node, text="Exit to Menu", scale=0.08, pos=(-0.6, 0, -0.4), command=self.game.exit_to_menu)
+        DirectButton(parent=page, text="Exit to Menu", scale=0.08, pos=(-0.6, 0, -0.4), command=self.game.exit_to_menu)
+
+    def sync_system_tab(self):
+        # Игрок мог смениться после рестарта - ползунки показывают его настройки
+        if self.sens_slider['value'] != self.player_ref.mouse_sensitivity:
+            self.sens_slider['value'] = self.player_ref.mouse_sensitivity
 
     def update_sens(self):
         if self.player_ref: